@@ -9,10 +9,12 @@ import 'package:image_picker/image_picker.dart';
 class ProductClassifier {
   Interpreter? _interpreter;
   List<String>? _labels;
+  // class ID ของสินค้าที่ถูกลบ (ยังมี output อยู่แต่ต้องไม่ตอบกลับ)
+  Set<int> _retiredIds = {};
   bool _isModelLoaded = false;
 
-  // ขนาดภาพที่โมเดลต้องการ
-  static const int inputSize = 224;
+  // ขนาดภาพที่โมเดลต้องการ (อ่านจาก input tensor ของโมเดลตอนโหลด)
+  int inputSize = 224;
 
   /// โหลดโมเดลและ labels
   Future<bool> loadModel() async {
@@ -20,6 +22,7 @@ class ProductClassifier {
       // โหลดโมเดล .tflite
       _interpreter = await Interpreter.fromAsset(
           'assets/models/product_classifier.tflite');
+      inputSize = _interpreter!.getInputTensor(0).shape[1];
 
       // โหลด class names
       String labelData =
@@ -27,6 +30,12 @@ class ProductClassifier {
       List<dynamic> labelList = json.decode(labelData);
       _labels = labelList.cast<String>();
 
+      // โหลด retired_ids จาก model_info.json
+      String infoData =
+          await rootBundle.loadString('assets/models/model_info.json');
+      Map<String, dynamic> info = json.decode(infoData);
+      _retiredIds = ((info['retired_ids'] ?? []) as List).cast<int>().toSet();
+
       _isModelLoaded = true;
       print('โหลดโมเดลสำเร็จ: ${_labels!.length} คลาส');
       return true;
@@ -73,6 +82,10 @@ class ProductClassifier {
       int maxIndex = 0;
 
       for (int i = 0; i < output[0].length; i++) {
+        if (_retiredIds.contains(i)) {
+          output[0][i] = 0.0;
+          continue;
+        }
         if (output[0][i] > maxConfidence) {
           maxConfidence = output[0][i];
           maxIndex = i;
@@ -1,12 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
-import json
-import shutil
-from datetime import datetime
+import queue
+import threading
+import multiprocessing
+from functools import partial
+from src.catalog_store import CatalogStore, catalog_path
+from src.image_store import ImageStore
+from src.thumbnail_cache import ThumbnailCache
 
 class ProductTrainerGUI:
+    PREVIEW_CELL = (130, 150)  # ขนาดช่องของรูปตัวอย่างแต่ละรูป (กว้าง, สูง)
+    PREVIEW_COLS = 5
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Product Image Trainer - สำหรับ Flutter TFLite")
@@ -18,10 +25,28 @@ class ProductTrainerGUI:
         self.selected_images = []
         self.data_dir = "data"
         self.products_json_path = os.path.join(self.data_dir, "products.json")
+        self.catalog = None
+        
+        # สถานะการเทรนที่รันบน worker thread
+        self.training_thread = None
+        self.training_queue = None
+        self.cancel_event = None
         
         # สร้างโฟลเดอร์ data หากยังไม่มี
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
+        
+        # รูปสินค้าเก็บแบบ content-addressed (คัดลอกเฉพาะรูปใหม่)
+        self.image_store = ImageStore(self.data_dir)
+        
+        # รูปตัวอย่าง: แคชภาพย่อบนดิสก์ + สร้างเฉพาะรูปที่มองเห็นบน canvas
+        self.thumbnail_cache = ThumbnailCache(os.path.join(self.data_dir, ".thumbnails"))
+        self.thumbnail_queue = queue.Queue()
+        self.thumbnail_polling = False
+        self.preview_generation = 0
+        self.preview_items = {}     # index ของรูป -> item บน canvas
+        self.preview_photos = {}    # index ของรูป -> PhotoImage (เก็บ reference)
+        self.preview_requests = {}  # index ของรูป -> Future ของภาพย่อที่กำลังโหลด
             
         # โหลดข้อมูลผลิตภัณฑ์ที่มีอยู่
         self.load_products_data()
@@ -89,16 +114,14 @@ class ProductTrainerGUI:
         
         # Canvas สำหรับแสดงรูปภาพ
         self.canvas = tk.Canvas(self.image_preview_frame, bg='white')
-        scrollbar_v = ttk.Scrollbar(self.image_preview_frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.preview_scrollbar_v = ttk.Scrollbar(self.image_preview_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         scrollbar_h = ttk.Scrollbar(self.image_preview_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-        self.canvas.configure(yscrollcommand=scrollbar_v.set, xscrollcommand=scrollbar_h.set)
+        self.canvas.configure(yscrollcommand=self.on_preview_scroll, xscrollcommand=scrollbar_h.set)
         
-        scrollbar_v.pack(side=tk.RIGHT, fill=tk.Y)
+        self.preview_scrollbar_v.pack(side=tk.RIGHT, fill=tk.Y)
         scrollbar_h.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        self.canvas_frame = ttk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.canvas_frame, anchor=tk.NW)
+        self.canvas.bind('<Configure>', lambda event: self.render_visible_previews())
         
     def setup_train_tab(self):
         # ข้อมูลสถิติ
@@ -112,8 +135,24 @@ class ProductTrainerGUI:
         train_button_frame = ttk.Frame(self.train_frame)
         train_button_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        ttk.Button(train_button_frame, text="เริ่มเทรนโมเดล", 
-                  command=self.start_training, style='Accent.TButton').pack(pady=10)
+        # เทรนต่อจากโมเดลเดิม: ใช้รูปของสินค้าใหม่ทั้งหมด + รูปเดิมบางส่วน แทนการเทรนใหม่ทั้งหมด
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(train_button_frame, text="เทรนต่อจากโมเดลเดิม (เร็วกว่า เมื่อเพิ่มสินค้าใหม่)",
+                        variable=self.incremental_var).pack()
+        
+        self.train_button = ttk.Button(train_button_frame, text="เริ่มเทรนโมเดล", 
+                  command=self.start_training, style='Accent.TButton')
+        self.train_button.pack(pady=(10, 5))
+        
+        self.cancel_button = ttk.Button(train_button_frame, text="ยกเลิกการเทรน",
+                  command=self.cancel_training, state=tk.DISABLED)
+        self.cancel_button.pack(pady=(0, 5))
+        
+        # ความคืบหน้าราย epoch
+        self.train_progress = ttk.Progressbar(train_button_frame, mode='determinate', maximum=1)
+        self.train_progress.pack(fill=tk.X, padx=10, pady=5)
+        self.train_progress_label = ttk.Label(train_button_frame, text="")
+        self.train_progress_label.pack()
         
         # Log การเทรน
         log_frame = ttk.LabelFrame(self.train_frame, text="Log การเทรน", padding=10)
@@ -252,51 +291,99 @@ class ProductTrainerGUI:
     
     def update_image_preview(self):
         """อัพเดทการแสดงตัวอย่างรูปภาพ"""
-        # ลบ widget เก่าทั้งหมด
-        for widget in self.canvas_frame.winfo_children():
-            widget.destroy()
-        
-        if not self.selected_images:
-            return
-        
-        # แสดงรูปภาพในแถว 5 รูปต่อแถว
-        row = 0
-        col = 0
-        max_cols = 5
+        # ยกเลิกภาพย่อของรายการเดิมที่ยังไม่เริ่มโหลด และลบรูปเดิมออกจาก canvas
+        for future in self.preview_requests.values():
+            future.cancel()
+        self.preview_requests = {}
+        self.preview_items = {}
+        self.preview_photos = {}
+        self.preview_generation += 1
+        self.canvas.delete('all')
+        
+        # แสดงรูปภาพในแถว 5 รูปต่อแถว (กำหนด scroll region จากจำนวนรูป ไม่ต้องสร้าง widget ทุกรูป)
+        cell_w, cell_h = self.PREVIEW_CELL
+        rows = (len(self.selected_images) + self.PREVIEW_COLS - 1) // self.PREVIEW_COLS
+        self.canvas.configure(scrollregion=(0, 0, self.PREVIEW_COLS * cell_w, rows * cell_h))
+        self.canvas.yview_moveto(0)
+        self.render_visible_previews()
+    
+    def on_preview_scroll(self, first, last):
+        """เมื่อเลื่อน canvas: อัพเดท scrollbar และสร้างรูปตัวอย่างของแถวที่เพิ่งมองเห็น"""
+        self.preview_scrollbar_v.set(first, last)
+        self.render_visible_previews()
+    
+    def render_visible_previews(self):
+        """สร้างรูปตัวอย่างเฉพาะแถวที่มองเห็น (เผื่อบน/ล่าง 1 แถว) และลบแถวที่เลื่อนออกไปแล้ว"""
+        cell_w, cell_h = self.PREVIEW_CELL
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first_row = max(int(top // cell_h) - 1, 0)
+        last_row = int(bottom // cell_h) + 1
+        start = first_row * self.PREVIEW_COLS
+        end = min((last_row + 1) * self.PREVIEW_COLS, len(self.selected_images))
+        
+        for index in list(self.preview_items):
+            if start <= index < end:
+                continue
+            for item in self.preview_items.pop(index):
+                self.canvas.delete(item)
+            self.preview_photos.pop(index, None)
+            future = self.preview_requests.pop(index, None)
+            if future is not None:
+                future.cancel()
+        
+        for index in range(start, end):
+            if index in self.preview_items:
+                continue
+            image_path = self.selected_images[index]
+            x = (index % self.PREVIEW_COLS) * cell_w + cell_w // 2
+            y = (index // self.PREVIEW_COLS) * cell_h
+            
+            # แสดงชื่อไฟล์
+            filename = os.path.basename(image_path)
+            if len(filename) > 15:
+                filename = filename[:12] + "..."
+            
+            frame_item = self.canvas.create_rectangle(x - 60, y + 5, x + 60, y + 125, outline='#dddddd')
+            image_item = self.canvas.create_image(x, y + 65)
+            text_item = self.canvas.create_text(x, y + 138, text=filename, font=('Arial', 8))
+            self.preview_items[index] = (frame_item, image_item, text_item)
+            
+            # โหลดภาพย่อบน thread pool แล้วแสดงเมื่อเสร็จ (ดู poll_thumbnail_queue)
+            self.preview_requests[index] = self.thumbnail_cache.request(
+                image_path, partial(self.queue_thumbnail, self.preview_generation, index)
+            )
         
-        for i, image_path in enumerate(self.selected_images):
-            try:
-                # โหลดและ resize รูปภาพ
-                image = Image.open(image_path)
-                image.thumbnail((120, 120))
+        if self.preview_requests and not self.thumbnail_polling:
+            self.thumbnail_polling = True
+            self.root.after(30, self.poll_thumbnail_queue)
+    
+    def queue_thumbnail(self, generation, index, image_path, image, error):
+        """เรียกจาก worker thread ของ ThumbnailCache: ส่งภาพย่อกลับมายัง main thread"""
+        self.thumbnail_queue.put((generation, index, image_path, image, error))
+    
+    def poll_thumbnail_queue(self):
+        """แสดงภาพย่อที่โหลดเสร็จแล้ว (ทำงานบน main thread ด้วย root.after)"""
+        try:
+            while True:
+                generation, index, image_path, image, error = self.thumbnail_queue.get_nowait()
+                # ข้ามผลของรายการเดิมหรือรูปที่เลื่อนออกนอกจอไปแล้ว
+                if generation != self.preview_generation or index not in self.preview_items:
+                    continue
+                self.preview_requests.pop(index, None)
+                if error is not None:
+                    print(f"Error loading image {image_path}: {error}")
+                    continue
                 photo = ImageTk.PhotoImage(image)
-                
-                # สร้าง frame สำหรับรูปภาพแต่ละรูป
-                img_frame = ttk.Frame(self.canvas_frame)
-                img_frame.grid(row=row, column=col, padx=5, pady=5)
-                
-                # แสดงรูปภาพ
-                label = ttk.Label(img_frame, image=photo)
-                label.image = photo  # เก็บ reference
-                label.pack()
-                
-                # แสดงชื่อไฟล์
-                filename = os.path.basename(image_path)
-                if len(filename) > 15:
-                    filename = filename[:12] + "..."
-                ttk.Label(img_frame, text=filename, font=('Arial', 8)).pack()
-                
-                col += 1
-                if col >= max_cols:
-                    col = 0
-                    row += 1
-                    
-            except Exception as e:
-                print(f"Error loading image {image_path}: {e}")
+                self.preview_photos[index] = photo  # เก็บ reference
+                self.canvas.itemconfig(self.preview_items[index][1], image=photo)
+        except queue.Empty:
+            pass
         
-        # อัพเดท scroll region
-        self.canvas_frame.update_idletasks()
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        if self.preview_requests:
+            self.root.after(30, self.poll_thumbnail_queue)
+        else:
+            self.thumbnail_polling = False
     
     def load_existing_images(self, barcode):
         """โหลดรูปภาพที่มีอยู่ของสินค้า"""
@@ -324,41 +411,11 @@ class ProductTrainerGUI:
             return
         
         try:
-            # สร้างโฟลเดอร์สำหรับสินค้านี้
-            product_dir = os.path.join(self.data_dir, barcode)
-            if not os.path.exists(product_dir):
-                os.makedirs(product_dir)
-            
-            # คลีนอัพรูปเก่า (ถ้ามี)
-            for file in os.listdir(product_dir):
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-                    os.remove(os.path.join(product_dir, file))
-            
-            # คัดลอกรูปภาพใหม่
-            saved_images = []
-            for i, image_path in enumerate(self.selected_images):
-                try:
-                    # สร้างชื่อไฟล์ใหม่
-                    ext = os.path.splitext(image_path)[1]
-                    new_filename = f"{barcode}_{i+1:03d}{ext}"
-                    new_path = os.path.join(product_dir, new_filename)
-                    
-                    # คัดลอกไฟล์
-                    shutil.copy2(image_path, new_path)
-                    saved_images.append(new_path)
-                    
-                except Exception as e:
-                    print(f"Error copying image {image_path}: {e}")
-            
-            # บันทึกข้อมูลใน JSON
-            self.products_data[barcode] = {
-                'name': product_name,
-                'images': saved_images,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
+            # บันทึกรูปภาพ: รูปที่มีอยู่แล้วใช้ path เดิม คัดลอกเฉพาะรูปใหม่ และลบเฉพาะรูปที่ถูกเอาออก
+            saved_images = self.image_store.save_product_images(barcode, self.selected_images)
             
-            self.save_products_data()
+            # บันทึกข้อมูลลงแคตตาล็อก (เขียนเฉพาะสินค้านี้)
+            self.products_data[barcode] = self.catalog.upsert_product(barcode, product_name, saved_images)
             
             messagebox.showinfo("สำเร็จ", f"บันทึกข้อมูลสินค้า '{product_name}' เรียบร้อย\\nจำนวนรูป: {len(saved_images)}")
             
@@ -376,24 +433,13 @@ class ProductTrainerGUI:
             messagebox.showerror("ข้อผิดพลาด", f"ไม่สามารถบันทึกข้อมูลได้: {str(e)}")
     
     def load_products_data(self):
-        """โหลดข้อมูลสินค้าจากไฟล์ JSON"""
-        if os.path.exists(self.products_json_path):
-            try:
-                with open(self.products_json_path, 'r', encoding='utf-8') as f:
-                    self.products_data = json.load(f)
-            except Exception as e:
-                print(f"Error loading products data: {e}")
-                self.products_data = {}
-        else:
-            self.products_data = {}
-    
-    def save_products_data(self):
-        """บันทึกข้อมูลสินค้าลงไฟล์ JSON"""
+        """โหลดข้อมูลสินค้าจากแคตตาล็อก SQLite (นำเข้าจาก products.json เดิมในครั้งแรก)"""
         try:
-            with open(self.products_json_path, 'w', encoding='utf-8') as f:
-                json.dump(self.products_data, f, ensure_ascii=False, indent=2)
+            self.catalog = CatalogStore(catalog_path(self.data_dir), import_json_path=self.products_json_path)
+            self.products_data = self.catalog.load_all()
         except Exception as e:
-            print(f"Error saving products data: {e}")
+            print(f"Error loading products data: {e}")
+            self.products_data = {}
     
     def update_stats(self):
         """อัพเดทสถิติข้อมูล"""
@@ -418,13 +464,11 @@ class ProductTrainerGUI:
         # เตรียมข้อมูลที่จะแสดง
         products_to_display = self.products_data.items()
         
-        # กรองข้อมูลถ้ามีคำค้นหา
+        # กรองข้อมูลถ้ามีคำค้นหา (ค้นหาในแคตตาล็อก SQLite)
         if search_term:
-            search_term = search_term.lower()
-            products_to_display = [
-                (barcode, product) for barcode, product in products_to_display
-                if search_term in barcode.lower() or search_term in product['name'].lower()
-            ]
+            for barcode, name, image_count in self.catalog.search(search_term):
+                self.products_tree.insert('', 'end', text=barcode, values=(name, image_count))
+            return
         
         # เพิ่มข้อมูลใหม่
         for barcode, product in products_to_display:
@@ -454,16 +498,14 @@ class ProductTrainerGUI:
 
         if confirm:
             try:
-                # 1. ลบโฟลเดอร์รูปภาพ
-                product_dir = os.path.join(self.data_dir, barcode)
-                if os.path.exists(product_dir):
-                    shutil.rmtree(product_dir)
+                # 1. ลบข้อมูลออกจากแคตตาล็อก
+                self.catalog.delete_product(barcode)
 
                 # 2. ลบข้อมูลออกจาก dictionary
                 del self.products_data[barcode]
 
-                # 3. บันทึกการเปลี่ยนแปลงลง JSON
-                self.save_products_data()
+                # 3. ลบโฟลเดอร์รูปภาพ (เฉพาะลิงก์ ไฟล์ใน objects/ ที่ไม่มีสินค้าใช้แล้วลบด้วย image_store.py gc)
+                self.image_store.remove_product(barcode)
 
                 # 4. อัปเดต UI
                 self.update_products_tree()
@@ -500,6 +542,10 @@ class ProductTrainerGUI:
     
     def start_training(self):
         """เริ่มเทรนโมเดล"""
+        if self.training_thread is not None and self.training_thread.is_alive():
+            messagebox.showwarning("กำลังเทรนอยู่", "กำลังเทรนโมเดลอยู่ กรุณารอให้เสร็จหรือยกเลิกก่อน")
+            return
+        
         if len(self.products_data) < 2:
             messagebox.showwarning("ข้อมูลไม่เพียงพอ", "ต้องมีข้อมูลสินค้าอย่างน้อย 2 รายการสำหรับการเทรน")
             return
@@ -516,42 +562,115 @@ class ProductTrainerGUI:
         self.log_text.insert(tk.END, f"จำนวนรูปภาพ: {total_images} รูป\\n")
         self.log_text.insert(tk.END, "="*50 + "\\n")
         
-        # เรียกใช้ฟังก์ชันเทรนจากไฟล์อื่น
-        from src.model_trainer import train_model
-        
-        try:
-            # เริ่มเทรนแบบ async (จะต้องสร้างไฟล์ model_trainer.py)
-            self.root.after(100, lambda: self.run_training())
-        except Exception as e:
-            self.log_text.insert(tk.END, f"ข้อผิดพลาด: {str(e)}\\n")
+        self.train_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.train_progress.config(value=0, maximum=1)
+        self.train_progress_label.config(text="")
+        
+        # เทรนบน worker thread แล้วส่งผลกลับผ่าน queue (Tk ต้องถูกเรียกจาก main thread เท่านั้น)
+        self.training_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.training_thread = threading.Thread(
+            target=self.run_training,
+            args=(self.training_queue, self.cancel_event, self.incremental_var.get()),
+            daemon=True
+        )
+        self.training_thread.start()
+        self.root.after(100, self.poll_training_queue)
     
-    def run_training(self):
-        """รันการเทรนจริง"""
-        def log_callback(message):
-            self.log_text.insert(tk.END, f"{message}\n")
+    def cancel_training(self):
+        """ยกเลิกการเทรนที่กำลังทำงาน (หยุดหลังจบ batch ปัจจุบัน)"""
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.log_text.insert(tk.END, "กำลังยกเลิกการเทรน...\n")
             self.log_text.see(tk.END)
-            self.root.update()
+    
+    def run_training(self, training_queue, cancel_event, incremental):
+        """รันการเทรนจริง (ทำงานบน worker thread ห้ามเรียก Tk โดยตรง)"""
+        def log_callback(message):
+            training_queue.put(('log', message))
+        
+        def progress_callback(epoch, epochs, metrics):
+            training_queue.put(('epoch', epoch, epochs, metrics))
         
         try:
             # เรียกใช้ model trainer จริง
             from src.model_trainer import train_model
             
             log_callback("เริ่มกระบวนการเทรนโมเดล...")
-            result = train_model(log_callback)
-            
-            if result['success']:
-                log_callback(f"เทรนโมเดลสำเร็จ!")
-                log_callback(f"ความแม่นยำ: {result['accuracy']:.4f}")
-                log_callback(f"ไฟล์ TFLite: {result['tflite_path']}")
-                messagebox.showinfo("สำเร็จ", f"เทรนโมเดลสำเร็จ!\nความแม่นยำ: {result['accuracy']:.4f}\nไฟล์ .tflite พร้อมใช้งานกับ Flutter")
-            else:
-                log_callback(f"เทรนโมเดลไม่สำเร็จ: {result['error']}")
-                messagebox.showerror("ข้อผิดพลาด", f"เทรนโมเดลไม่สำเร็จ:\n{result['error']}")
-                
+            result = train_model(
+                log_callback,
+                incremental=incremental,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+                resume=True  # เทรนต่อจาก checkpoint ถ้าครั้งก่อนถูกยกเลิกหรือปิดโปรแกรมกลางทาง
+            )
         except Exception as e:
-            error_msg = f"เกิดข้อผิดพลาด: {str(e)}"
-            log_callback(error_msg)
-            messagebox.showerror("ข้อผิดพลาด", error_msg)
+            result = {'success': False, 'error': f"เกิดข้อผิดพลาด: {str(e)}"}
+        
+        training_queue.put(('done', result))
+    
+    def poll_training_queue(self):
+        """อ่านข้อความจาก worker thread แล้วอัปเดต UI (เรียกซ้ำด้วย root.after)"""
+        try:
+            while True:
+                item = self.training_queue.get_nowait()
+                kind = item[0]
+                
+                if kind == 'log':
+                    self.log_text.insert(tk.END, f"{item[1]}\n")
+                    self.log_text.see(tk.END)
+                
+                elif kind == 'epoch':
+                    _, epoch, epochs, metrics = item
+                    metrics_text = ", ".join(f"{key}: {value:.4f}" for key, value in metrics.items()
+                                             if key != 'lr' and key != 'learning_rate')
+                    self.train_progress.config(maximum=epochs or 1, value=epoch)
+                    self.train_progress_label.config(text=f"Epoch {epoch}/{epochs}")
+                    self.log_text.insert(tk.END, f"Epoch {epoch}/{epochs} - {metrics_text}\n")
+                    self.log_text.see(tk.END)
+                
+                elif kind == 'done':
+                    self.on_training_finished(item[1])
+                    return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.poll_training_queue)
+    
+    def on_training_finished(self, result):
+        """แสดงผลเมื่อการเทรนจบ (ทำงานบน main thread)"""
+        def log(message):
+            self.log_text.insert(tk.END, f"{message}\n")
+            self.log_text.see(tk.END)
+        
+        self.train_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.training_thread = None
+        
+        if result['success']:
+            log(f"เทรนโมเดลสำเร็จ!")
+            log(f"ความแม่นยำ: {result['accuracy']:.4f}")
+            log(f"ไฟล์ TFLite: {result['tflite_path']}")
+            messagebox.showinfo("สำเร็จ", f"เทรนโมเดลสำเร็จ!\nความแม่นยำ: {result['accuracy']:.4f}\nไฟล์ .tflite พร้อมใช้งานกับ Flutter")
+        elif result.get('cancelled'):
+            self.train_progress_label.config(text="ยกเลิกการเทรนแล้ว")
+            messagebox.showinfo("ยกเลิก", "ยกเลิกการเทรนเรียบร้อยแล้ว")
+        else:
+            log(f"เทรนโมเดลไม่สำเร็จ: {result['error']}")
+            messagebox.showerror("ข้อผิดพลาด", f"เทรนโมเดลไม่สำเร็จ:\n{result['error']}")
+    
+    def on_close(self):
+        """ปิดโปรแกรม (ถ้ากำลังเทรนอยู่จะถามยืนยันและยกเลิกการเทรนก่อน)"""
+        if self.training_thread is not None and self.training_thread.is_alive():
+            if not messagebox.askyesno("กำลังเทรนอยู่", "กำลังเทรนโมเดลอยู่ ต้องการยกเลิกและปิดโปรแกรมหรือไม่?"):
+                return
+            self.cancel_event.set()
+        if self.catalog is not None:
+            self.catalog.close()
+        self.thumbnail_cache.close()
+        self.root.destroy()
             
     def sort_treeview_column(self, tv, col, reverse):
         """ฟังก์ชันสำหรับเรียงข้อมูลใน Treeview เมื่อคลิกหัวคอลัมน์"""
@@ -587,8 +706,11 @@ class ProductTrainerGUI:
 
 
 def main():
+    # จำเป็นเมื่อ build เป็น .exe ด้วย PyInstaller เพราะการ decode รูปภาพใช้ process pool
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ProductTrainerGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     
     # เพิ่ม Style สำหรับปุ่มสีแดง
     style = ttk.Style()
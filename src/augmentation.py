@@ -0,0 +1,88 @@
+import math
+
+import tensorflow as tf
+
+
+# ค่าเดียวกับ data augmentation เดิม: RandomFlip("horizontal"), RandomRotation(0.1), RandomZoom(0.1)
+ROTATION_FACTOR = 0.1  # สัดส่วนของ 2π
+ZOOM_FACTOR = 0.1
+
+
+def augment_batch(images, seed, rotation_factor=ROTATION_FACTOR, zoom_factor=ZOOM_FACTOR):
+    """สุ่ม flip แนวนอน หมุน และซูม ทั้ง batch ในครั้งเดียวด้วย random op แบบ stateless
+
+    images: float32 [B, H, W, 3], seed: int [2] (seed เดียวกันให้ผลเหมือนเดิมเสมอ)
+    การหมุนและซูมรวมเป็น projective transform เดียวต่อรูป (interpolate ครั้งเดียว)
+    """
+    seeds = tf.random.experimental.stateless_split(seed, num=3)
+    images = tf.image.stateless_random_flip_left_right(images, seeds[0])
+
+    batch_size = tf.shape(images)[0]
+    height = tf.cast(tf.shape(images)[1], tf.float32)
+    width = tf.cast(tf.shape(images)[2], tf.float32)
+
+    angles = tf.random.stateless_uniform(
+        [batch_size], seeds[1],
+        minval=-rotation_factor * 2 * math.pi, maxval=rotation_factor * 2 * math.pi
+    )
+    zooms = tf.random.stateless_uniform(
+        [batch_size], seeds[2], minval=1 - zoom_factor, maxval=1 + zoom_factor
+    )
+
+    # transform แปลงพิกัดของรูปผลลัพธ์ไปยังรูปต้นฉบับ: หมุนรอบจุดกึ่งกลางของพิกัดที่ถูกซูมแล้ว
+    # (เทียบเท่ากับ RandomRotation แล้วตามด้วย RandomZoom)
+    cos = tf.cos(angles)
+    sin = tf.sin(angles)
+    cx = (width - 1) / 2
+    cy = (height - 1) / 2
+    a0 = cos * zooms
+    a1 = -sin * zooms
+    b0 = sin * zooms
+    b1 = cos * zooms
+    a2 = cx - a0 * cx - a1 * cy
+    b2 = cy - b0 * cx - b1 * cy
+    zeros = tf.zeros_like(angles)
+    transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=tf.shape(images)[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='REFLECT',
+    )
+
+
+def augment_dataset(dataset, seed=42):
+    """ทำ augmentation หลัง batch ใน tf.data แบบขนาน (AUTOTUNE)
+
+    แต่ละ batch ได้ seed ของตัวเองจาก tf.data.Dataset.random ผลจึงเหมือนเดิมทุกครั้งที่รัน
+    ด้วย seed เดิม แต่ต่างกันในแต่ละ epoch
+    """
+    seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+    dataset = tf.data.Dataset.zip((dataset, seeds))
+    return dataset.map(
+        lambda batch, batch_seed: (augment_batch(batch[0], batch_seed), batch[1]),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True,
+    )
+
+
+class BatchAugmentation(tf.keras.layers.Layer):
+    """layer สำหรับทำ augmentation ในกราฟของโมเดล (ทำงานเฉพาะตอนเทรน)"""
+
+    def __init__(self, seed=42, **kwargs):
+        super().__init__(**kwargs)
+        self.seed = seed
+        self.generator = tf.random.Generator.from_seed(seed)
+
+    def call(self, inputs, training=None):
+        if not training:
+            return inputs
+        return augment_batch(inputs, self.generator.make_seeds(1)[:, 0])
+
+    def get_config(self):
+        config = super().get_config()
+        config['seed'] = self.seed
+        return config
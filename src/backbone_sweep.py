@@ -0,0 +1,195 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+import subprocess
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# alpha ที่มี weights ของ ImageNet ในแต่ละ backbone
+SUPPORTED_ALPHAS = {
+    'mobilenet_v2': (0.35, 0.5, 0.75, 1.0, 1.3, 1.4),
+    'mobilenet_v3_small': (0.75, 1.0),
+    'mobilenet_v3_large': (0.75, 1.0),
+}
+
+
+def build_candidates(backbones, alphas, img_sizes):
+    """สร้างทุกชุด backbone/alpha/ขนาดรูป (ข้าม alpha ที่ backbone นั้นไม่มี weights)"""
+    candidates = []
+    for backbone, alpha, img_size in itertools.product(backbones, alphas, img_sizes):
+        if alpha not in SUPPORTED_ALPHAS[backbone]:
+            continue
+        candidates.append({'backbone': backbone, 'alpha': alpha, 'img_size': img_size})
+    return candidates
+
+
+def candidate_name(candidate):
+    alpha = '' if candidate['alpha'] == 1.0 else f"_{candidate['alpha']:g}"
+    return f"{candidate['backbone']}{alpha}_{candidate['img_size']}"
+
+
+def run_candidate(candidate, options):
+    """เทรน export และ benchmark หนึ่ง candidate ใน process ปัจจุบัน"""
+    try:
+        from src.model_trainer import ProductClassifierTrainer, train_model
+        from src.tflite_benchmark import benchmark_tflite
+    except ImportError:  # รันโดยตรงด้วย python src/backbone_sweep.py
+        from model_trainer import ProductClassifierTrainer, train_model
+        from tflite_benchmark import benchmark_tflite
+
+    model_dir = os.path.join(options['output_dir'], candidate_name(candidate))
+    trainer_options = dict(
+        data_dir=options['data_dir'],
+        model_dir=model_dir,
+        streaming=options['streaming'],
+        epochs=options['epochs'],
+        quantization=options['quantization'],
+        **candidate
+    )
+    result = train_model(print, **trainer_options)
+    if not result['success']:
+        raise RuntimeError(result['error'])
+
+    # วัด latency ด้วย interpreter บน validation split เดียวกับตอนเทรน (ขนาดรูปตาม candidate)
+    trainer = ProductClassifierTrainer(**{k: trainer_options[k] for k in
+                                          ('data_dir', 'model_dir', 'backbone', 'alpha', 'img_size')})
+    report = benchmark_tflite(result['tflite_path'], [options['threads']], options['max_images'], trainer)
+    latency = report['results'][0]
+    return {
+        'keras_val_accuracy': result['accuracy'],
+        'tflite_top1_accuracy': latency['top1_accuracy'],
+        'tflite_top5_accuracy': latency['top5_accuracy'],
+        'tflite_size_kb': report['model_size_kb'],
+        'latency_p50_ms': latency['p50_ms'],
+        'latency_p95_ms': latency['p95_ms'],
+        'model_dir': model_dir,
+    }
+
+
+def pareto_front(results):
+    """candidate ที่ไม่มีตัวอื่นทั้งแม่นยำกว่าและเร็วกว่า (ไม่แย่กว่าทั้งสองด้านและดีกว่าอย่างน้อยหนึ่งด้าน)"""
+    front = set()
+    for r in results:
+        dominated = any(
+            o is not r
+            and o['tflite_top1_accuracy'] >= r['tflite_top1_accuracy']
+            and o['latency_p50_ms'] <= r['latency_p50_ms']
+            and (o['tflite_top1_accuracy'] > r['tflite_top1_accuracy']
+                 or o['latency_p50_ms'] < r['latency_p50_ms'])
+            for o in results
+        )
+        if not dominated:
+            front.add(r['name'])
+    return front
+
+
+def sweep(candidates, options, timeout=None):
+    """รันแต่ละ candidate ใน process ใหม่ (หน่วยความจำของ TensorFlow คืนเมื่อจบแต่ละตัว)"""
+    results = []
+    for i, candidate in enumerate(candidates):
+        name = candidate_name(candidate)
+        print(f"[{i + 1}/{len(candidates)}] {name}")
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(candidate),
+               '--worker-options', json.dumps(options)]
+        try:
+            proc = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            results.append({'name': name, **candidate, 'error': f"เกินเวลา {timeout} วินาที"})
+            continue
+
+        # ผลลัพธ์อยู่ในบรรทัดสุดท้ายที่ขึ้นต้นด้วย RESULT (บรรทัดอื่นเป็น log ของการเทรน)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith('RESULT ')]
+        if proc.returncode != 0 or not lines:
+            error = (proc.stderr.strip().splitlines() or ['ไม่ทราบสาเหตุ'])[-1]
+            results.append({'name': name, **candidate, 'error': error})
+            print(f"  ไม่สำเร็จ: {error}")
+            continue
+
+        result = {'name': name, **candidate, **json.loads(lines[-1][len('RESULT '):])}
+        results.append(result)
+        print(f"  top-1 (TFLite): {result['tflite_top1_accuracy']:.4f}, "
+              f"p50: {result['latency_p50_ms']:.2f} ms, ขนาด: {result['tflite_size_kb']:.0f} KB")
+    return results
+
+
+def write_report(results, output_dir):
+    """บันทึกตาราง Pareto เป็น JSON และ CSV เรียงจาก latency ต่ำไปสูง"""
+    ok = [r for r in results if 'error' not in r]
+    front = pareto_front(ok)
+    for r in ok:
+        r['pareto'] = r['name'] in front
+    ok.sort(key=lambda r: r['latency_p50_ms'])
+
+    json_path = os.path.join(output_dir, "sweep_results.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.now().isoformat(), 'results': ok,
+                   'failed': [r for r in results if 'error' in r]}, f, ensure_ascii=False, indent=2)
+
+    columns = ['name', 'backbone', 'alpha', 'img_size', 'tflite_top1_accuracy', 'tflite_top5_accuracy',
+               'keras_val_accuracy', 'tflite_size_kb', 'latency_p50_ms', 'latency_p95_ms', 'pareto']
+    csv_path = os.path.join(output_dir, "sweep_results.csv")
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for r in ok:
+            writer.writerow([r[c] for c in columns])
+    return json_path, csv_path, ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="เทรนและ export หลาย backbone/ขนาดรูป แล้วเปรียบเทียบความแม่นยำกับ latency (Pareto)")
+    parser.add_argument('--backbones', nargs='+', choices=sorted(SUPPORTED_ALPHAS),
+                        default=['mobilenet_v2', 'mobilenet_v3_small', 'mobilenet_v3_large'])
+    parser.add_argument('--alphas', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--img-sizes', type=int, nargs='+', default=[128, 160, 224])
+    parser.add_argument('--epochs', type=int, default=20, help="จำนวน epochs ต่อ candidate")
+    parser.add_argument('--quantization', choices=['none', 'dynamic', 'float16', 'int8'], default='dynamic')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--threads', type=int, default=1, help="จำนวน thread ของ interpreter ที่วัด latency")
+    parser.add_argument('--max-images', type=int, default=300, help="จำนวนรูป validation ที่ใช้วัด latency")
+    parser.add_argument('--timeout', type=int, default=None, help="เวลาสูงสุดต่อ candidate (วินาที)")
+    parser.add_argument('--data-dir', default=os.path.join(PROJECT_ROOT, 'data'))
+    parser.add_argument('--model-dir', default=os.path.join(PROJECT_ROOT, 'models'))
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-options', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        result = run_candidate(json.loads(args.worker), json.loads(args.worker_options))
+        print("RESULT " + json.dumps(result))
+        return
+
+    output_dir = os.path.join(args.model_dir, "backbone_sweep")
+    os.makedirs(output_dir, exist_ok=True)
+    candidates = build_candidates(args.backbones, args.alphas, args.img_sizes)
+    if not candidates:
+        print("ไม่มี candidate ที่ใช้ได้ (ตรวจสอบ alpha ของแต่ละ backbone)")
+        return
+    options = {
+        'data_dir': args.data_dir,
+        'output_dir': output_dir,
+        'epochs': args.epochs,
+        'quantization': args.quantization,
+        'streaming': args.streaming,
+        'threads': args.threads,
+        'max_images': args.max_images,
+    }
+    results = sweep(candidates, options, args.timeout)
+    json_path, csv_path, table = write_report(results, output_dir)
+
+    print("\n=== ความแม่นยำเทียบกับ latency (* = Pareto front) ===")
+    print(f"{'candidate':32s} {'top-1':>7s} {'p50 ms':>8s} {'KB':>8s}")
+    for r in table:
+        marker = '*' if r['pareto'] else ' '
+        print(f"{marker}{r['name']:31s} {r['tflite_top1_accuracy']:7.4f} "
+              f"{r['latency_p50_ms']:8.2f} {r['tflite_size_kb']:8.0f}")
+    print(f"บันทึกผลที่: {json_path} และ {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+
+
+class BottleneckFeatureCache:
+    """แคช pooled features ของ backbone ที่ freeze ไว้ (คำนวณครั้งเดียวต่อรูปภาพ)
+
+    เก็บ features เป็น float16 ในไฟล์ .npz โดยอ้างอิงจาก path ขนาดไฟล์ และ mtime ของรูป
+    แบบเดียวกับ DecodedImageCache ถ้ารูปไม่เปลี่ยนแปลงจะไม่ต้องรัน backbone ซ้ำ
+    """
+
+    CHUNK_SIZE = 256  # จำนวนรูปต่อครั้งที่ส่งให้ compute_fn (คุมหน่วยความจำ)
+
+    def __init__(self, cache_dir, tag):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"features_{tag}.npz")
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._load()
+
+    def _load(self):
+        """โหลดแคชจากดิสก์"""
+        self.rows = {}
+        self.signatures = []
+        self.features = None
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                keys = data['keys']
+                self.signatures = [tuple(sig) for sig in data['signatures'].tolist()]
+                self.features = data['features']
+            self.rows = {str(key): i for i, key in enumerate(keys)}
+        except Exception as e:
+            print(f"ไม่สามารถอ่านแคช bottleneck features: {e}")
+            self.rows = {}
+            self.signatures = []
+            self.features = None
+
+    def save(self):
+        """บันทึกแคชลงดิสก์แบบ atomic (ตัดรายการที่ไฟล์ต้นฉบับถูกลบไปแล้วออก)"""
+        if self.features is None:
+            return
+        keep = sorted(
+            (row, key) for key, row in self.rows.items() if os.path.exists(key)
+        )
+        rows = np.array([row for row, _ in keep], dtype=np.int64)
+        keys = np.array([key for _, key in keep])
+        signatures = np.array([self.signatures[row] for row, _ in keep], dtype=np.int64).reshape(-1, 2)
+
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, signatures=signatures, features=self.features[rows])
+        os.replace(tmp_path, self.path)
+
+        self.features = self.features[rows]
+        self.signatures = [tuple(sig) for sig in signatures.tolist()]
+        self.rows = {str(key): i for i, key in enumerate(keys)}
+
+    @staticmethod
+    def _key(img_path):
+        return os.path.abspath(img_path)
+
+    @staticmethod
+    def _signature(img_path):
+        st = os.stat(img_path)
+        return (st.st_size, st.st_mtime_ns)
+
+    def _lookup(self, img_path):
+        row = self.rows.get(self._key(img_path))
+        if row is None:
+            return -1
+        try:
+            if self.signatures[row] != self._signature(img_path):
+                return -1
+        except OSError:
+            return -1
+        return row
+
+    def get(self, img_paths, compute_fn):
+        """คืนค่า features ของทุกรูป (float32) และ ok_mask
+
+        compute_fn(paths) ต้องคืนค่า (features, ok_mask) ของรูปที่ยังไม่อยู่ในแคช
+        """
+        rows = np.array([self._lookup(p) for p in img_paths], dtype=np.int64)
+        missing = np.flatnonzero(rows < 0)
+
+        if len(missing) > 0:
+            print(f"กำลังคำนวณ bottleneck features {len(missing)} รูป "
+                  f"(อยู่ในแคชแล้ว {len(img_paths) - len(missing)} รูป)")
+            # แถวใหม่ถูกสะสมไว้แล้วต่อท้ายเมทริกซ์ครั้งเดียว (concatenate ทีละรูปทำให้ copy ทั้งเมทริกซ์ทุกรูป)
+            new_features = []
+            for start in range(0, len(missing), self.CHUNK_SIZE):
+                chunk = missing[start:start + self.CHUNK_SIZE]
+                chunk_paths = [img_paths[i] for i in chunk]
+                feats, ok = compute_fn(chunk_paths)
+                for i, img_path, feat, loaded in zip(chunk, chunk_paths, feats, ok):
+                    if loaded:
+                        rows[i] = self._store(img_path, feat, new_features)
+            if new_features:
+                new_features = np.stack(new_features)
+                self.features = new_features if self.features is None else np.concatenate(
+                    [self.features, new_features])
+            self.save()
+            # save() จัดเรียงแถวใหม่ จึงต้องค้นหาแถวอีกครั้ง
+            rows = np.array([self._lookup(p) for p in img_paths], dtype=np.int64)
+
+        ok = rows >= 0
+        if self.features is None:
+            return np.zeros((len(img_paths), 0), dtype=np.float32), ok
+        features = np.zeros((len(img_paths), self.features.shape[1]), dtype=np.float32)
+        features[ok] = self.features[rows[ok]].astype(np.float32)
+        return features, ok
+
+    def _store(self, img_path, feat, new_features):
+        """เขียนทับ features ของรูปที่มีแถวอยู่แล้ว หรือเพิ่มลง new_features (ต่อท้ายเมทริกซ์ภายหลัง)
+        คืนค่าแถวที่ใช้"""
+        feat = np.asarray(feat, dtype=np.float16).reshape(-1)
+        key = self._key(img_path)
+        signature = self._signature(img_path)
+        row = self.rows.get(key)
+
+        existing = 0 if self.features is None else len(self.features)
+        if row is not None and row < existing:
+            self.features[row] = feat
+            self.signatures[row] = signature
+        elif row is not None:
+            new_features[row - existing] = feat
+            self.signatures[row] = signature
+        else:
+            row = existing + len(new_features)
+            new_features.append(feat)
+            self.signatures.append(signature)
+
+        self.rows[key] = row
+        return row
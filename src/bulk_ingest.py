@@ -0,0 +1,244 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+try:
+    from src.catalog_store import CatalogStore, catalog_path
+    from src.image_store import ImageStore, IMAGE_EXTENSIONS, file_sha256
+except ImportError:  # รันโดยตรงด้วย python src/bulk_ingest.py
+    from catalog_store import CatalogStore, catalog_path
+    from image_store import ImageStore, IMAGE_EXTENSIONS, file_sha256
+
+
+def scan_tree(source_dir):
+    """อ่านโฟลเดอร์แบบ <barcode>/<รูปภาพ> คืนค่า (items, names) โดย items เป็น [(barcode, path)]"""
+    items = []
+    for entry in sorted(os.scandir(source_dir), key=lambda e: e.name):
+        if not entry.is_dir() or entry.name.startswith('.'):
+            continue
+        for root, dirs, files in os.walk(entry.path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for file in sorted(files):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((entry.name, os.path.join(root, file)))
+    return items, {}
+
+
+def read_manifest(manifest_path):
+    """อ่าน CSV ที่มีคอลัมน์ barcode, image (หรือ image_path) และ name (ไม่บังคับ)
+
+    path ของรูปที่เป็น relative จะอ้างอิงจากโฟลเดอร์ของไฟล์ CSV
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    items = []
+    names = {}
+    with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            barcode = (row.get('barcode') or '').strip()
+            image_path = (row.get('image') or row.get('image_path') or '').strip()
+            if not barcode or not image_path:
+                continue
+            items.append((barcode, os.path.join(base_dir, image_path)))
+            name = (row.get('name') or '').strip()
+            if name:
+                names[barcode] = name
+    return items, names
+
+
+def validate_image(img_path, min_size=32):
+    """ตรวจว่าไฟล์เป็นรูปที่อ่านได้ คืนค่าข้อความ error หรือ None ถ้าใช้ได้"""
+    try:
+        with Image.open(img_path) as img:
+            width, height = img.size
+            img.verify()
+    except Exception as e:
+        return f"ไฟล์รูปภาพเสีย: {e}"
+    if min(width, height) < min_size:
+        return f"รูปเล็กเกินไป ({width}x{height})"
+    return None
+
+
+class IngestJournal:
+    """บันทึกผลของแต่ละรูปเป็น JSON lines เพื่อทำงานต่อได้ถ้าถูกขัดจังหวะ
+
+    เฉพาะรูปที่เก็บสำเร็จ (path ไม่เป็น null) นับว่าเสร็จแล้ว รูปที่ error จะถูกลองใหม่เมื่อรันซ้ำ
+    (เช่น ไฟล์ที่อ่านไม่ได้ชั่วคราวหรือถูกแก้ไขแล้ว)
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # บรรทัดสุดท้ายที่เขียนไม่เสร็จ
+                    self._remember(record)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _remember(self, record):
+        key = (record['barcode'], record['source'])
+        if record['path']:
+            self.done[key] = record
+        else:
+            self.done.pop(key, None)
+
+    def record(self, result):
+        self._remember(result)
+        self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _ingest_one(store, barcode, source, min_size):
+    """ตรวจสอบและเก็บรูปหนึ่งรูป (ทำงานบน thread pool)"""
+    result = {'barcode': barcode, 'source': source, 'path': None, 'error': None,
+              'bytes': 0, 'new': False}
+    try:
+        result['bytes'] = os.path.getsize(source)
+        error = validate_image(source, min_size)
+        if error is not None:
+            result['error'] = error
+            return result
+        digest = file_sha256(source)
+        ext = os.path.splitext(source)[1].lower()
+        result['new'] = not os.path.exists(store.object_path(digest, ext))
+        result['path'] = store.add_image(barcode, source, digest)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def ingest(items, names, data_dir, workers=8, replace=False, restart=False,
+           journal_name=None, min_size=32, export_json=False, progress_every=500):
+    """นำเข้ารูปภาพ [(barcode, path)] เข้าสู่ data/ และแคตตาล็อก คืนค่า dict สรุปผล"""
+    store = ImageStore(data_dir)
+    journal_name = journal_name or "ingest"
+    journal = IngestJournal(os.path.join(data_dir, ".ingest", f"{journal_name}.jsonl"), restart)
+
+    items = [(barcode, os.path.abspath(path)) for barcode, path in items]
+    pending = [(barcode, path) for barcode, path in items if (barcode, path) not in journal.done]
+    resumed = len(items) - len(pending)
+    if resumed:
+        print(f"ทำงานต่อจากครั้งก่อน: ข้าม {resumed} รูปที่นำเข้าแล้ว (รูปที่ error จะลองใหม่)")
+    print(f"กำลังนำเข้า {len(pending)} รูป ด้วย {workers} thread")
+
+    start = time.perf_counter()
+    processed_bytes = 0
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_ingest_one, store, barcode, path, min_size)
+                       for barcode, path in pending]
+            for i, future in enumerate(as_completed(futures)):
+                result = future.result()
+                journal.record(result)
+                results.append(result)
+                processed_bytes += result['bytes']
+                if result['error']:
+                    print(f"ข้าม {result['source']}: {result['error']}")
+                if progress_every and (i + 1) % progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"นำเข้าแล้ว {i + 1}/{len(pending)} รูป ({(i + 1) / elapsed:.1f} รูป/วินาที)")
+    finally:
+        journal.close()
+    elapsed = time.perf_counter() - start
+
+    # รวมรูปตามบาร์โค้ดตามลำดับของรายการต้นทาง แล้วบันทึกลงแคตตาล็อกทีละสินค้า
+    per_barcode = {}
+    for barcode, path in items:
+        record = journal.done.get((barcode, path))
+        if record is not None and record['path']:
+            per_barcode.setdefault(barcode, []).append(record['path'])
+
+    catalog = CatalogStore(catalog_path(data_dir), import_json_path=os.path.join(data_dir, "products.json"))
+    new_products = 0
+    for barcode, paths in per_barcode.items():
+        existing = catalog.get_product(barcode)
+        if existing is None:
+            new_products += 1
+        if existing is not None and not replace:
+            images = existing['images'] + [p for p in paths if p not in existing['images']]
+        else:
+            # ลบรูปเดิมที่ไม่อยู่ในชุดใหม่ออกจากโฟลเดอร์สินค้า (รูปใหม่อยู่ในโฟลเดอร์แล้ว ไม่คัดลอกซ้ำ)
+            images = store.save_product_images(barcode, paths)
+        name = names.get(barcode) or (existing['name'] if existing else barcode)
+        catalog.upsert_product(barcode, name, list(dict.fromkeys(images)))
+    if export_json:
+        catalog.export_json(os.path.join(data_dir, "products.json"))
+    catalog.close()
+
+    # สรุปจากผลของรอบนี้ (รูปที่ error ไม่อยู่ใน journal.done แต่ยังนับในสรุป)
+    summary = {
+        'images_total': len(items),
+        'images_processed': len(results),
+        'images_resumed': resumed,
+        'images_new': sum(1 for r in results if r['path'] and r['new']),
+        'images_duplicate': sum(1 for r in results if r['path'] and not r['new']),
+        'images_invalid': sum(1 for r in results if r['error']),
+        'products': len(per_barcode),
+        'products_new': new_products,
+        'seconds': elapsed,
+        'images_per_sec': len(results) / elapsed if elapsed > 0 else 0.0,
+        'mb_per_sec': processed_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+    }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="นำเข้ารูปภาพสินค้าจำนวนมากจากโฟลเดอร์ <barcode>/<รูป> หรือไฟล์ CSV")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--source', help="โฟลเดอร์ที่มีโฟลเดอร์ย่อยตามบาร์โค้ด")
+    source.add_argument('--manifest', help="ไฟล์ CSV ที่มีคอลัมน์ barcode, image, name")
+    parser.add_argument('--data-dir', default='data',
+                        help="โฟลเดอร์ข้อมูล (ค่าเริ่มต้น: data เหมือน GUI, path ของรูปในแคตตาล็อกอ้างอิงจากโฟลเดอร์ที่รัน)")
+    parser.add_argument('--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                        help="จำนวน thread สำหรับตรวจสอบและคัดลอกรูป")
+    parser.add_argument('--replace', action='store_true',
+                        help="แทนที่รูปเดิมของสินค้าที่มีอยู่แล้ว (ค่าเริ่มต้น: เพิ่มต่อจากรูปเดิม)")
+    parser.add_argument('--restart', action='store_true',
+                        help="เริ่มใหม่ทั้งหมด ไม่ใช้ผลการนำเข้าครั้งก่อน")
+    parser.add_argument('--min-size', type=int, default=32, help="ด้านที่สั้นที่สุดของรูป (pixel)")
+    parser.add_argument('--export-json', action='store_true',
+                        help="เขียน data/products.json จากแคตตาล็อกหลังนำเข้าเสร็จ")
+    args = parser.parse_args(argv)
+
+    source_path = os.path.abspath(args.source or args.manifest)
+    if args.source:
+        items, names = scan_tree(source_path)
+    else:
+        items, names = read_manifest(source_path)
+    if not items:
+        print("ไม่พบรูปภาพที่จะนำเข้า")
+        return
+
+    # journal แยกตามต้นทาง เพื่อให้รันซ้ำกับต้นทางเดิมแล้วทำงานต่อได้
+    journal_name = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:16]
+    summary = ingest(items, names, args.data_dir, workers=args.workers, replace=args.replace,
+                     restart=args.restart, journal_name=journal_name, min_size=args.min_size,
+                     export_json=args.export_json)
+
+    print("\n=== สรุปการนำเข้า ===")
+    print(f"รูปทั้งหมด: {summary['images_total']} (นำเข้าแล้วจากครั้งก่อน {summary['images_resumed']})")
+    print(f"รูปใหม่: {summary['images_new']}, รูปซ้ำ: {summary['images_duplicate']}, "
+          f"รูปเสีย/ใช้ไม่ได้: {summary['images_invalid']}")
+    print(f"สินค้า: {summary['products']} รายการ (ใหม่ {summary['products_new']})")
+    print(f"เวลา: {summary['seconds']:.1f} วินาที, {summary['images_per_sec']:.1f} รูป/วินาที, "
+          f"{summary['mb_per_sec']:.1f} MB/วินาที")
+
+
+if __name__ == "__main__":
+    main()
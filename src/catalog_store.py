@@ -0,0 +1,281 @@
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+
+class CatalogStore:
+    """แคตตาล็อกสินค้าแบบ SQLite แทนการเขียน products.json ทั้งไฟล์ทุกครั้งที่บันทึก
+
+    - บันทึก/ลบทีละสินค้าใน transaction (ถ้าโปรแกรมล่มกลางทาง ข้อมูลเดิมไม่เสีย)
+    - บาร์โค้ดเป็น primary key (ค้นหาสินค้าตามบาร์โค้ดด้วย index)
+    - ค้นหาบางส่วนของบาร์โค้ด/ชื่อผ่าน FTS5 (trigram) แทนการอ่านทั้งตาราง
+    - ใช้ WAL mode ให้ GUI และ trainer อ่าน/เขียนพร้อมกันได้
+    - ข้อมูลที่โหลดออกมามีโครงสร้างเหมือน products.json เดิม
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            barcode TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TEXT,
+            updated_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS product_images (
+            barcode TEXT NOT NULL REFERENCES products(barcode) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (barcode, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_name ON products(name COLLATE NOCASE);
+    """
+    # ดัชนีค้นหา substring (external content: เก็บเฉพาะ trigram, ข้อมูลจริงอยู่ใน products)
+    # trigger อัปเดตดัชนีใน transaction เดียวกับการบันทึกสินค้า
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            barcode, name, content='products', content_rowid='rowid', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, barcode, name) VALUES (new.rowid, new.barcode, new.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, barcode, name)
+            VALUES ('delete', old.rowid, old.barcode, old.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, barcode, name)
+            VALUES ('delete', old.rowid, old.barcode, old.name);
+            INSERT INTO products_fts(rowid, barcode, name) VALUES (new.rowid, new.barcode, new.name);
+        END;
+    """
+    # trigram ต้องการคำค้นอย่างน้อย 3 ตัวอักษร คำที่สั้นกว่าค้นแบบขึ้นต้นด้วย (ใช้ index)
+    FTS_MIN_TERM = 3
+    # PRAGMA user_version: 1 = ย้ายข้อมูลจาก products.json แล้ว (ไม่นำเข้าซ้ำแม้ลบสินค้าหมด)
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path, import_json_path=None):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        self.fts = self._init_fts()
+
+        # ย้ายข้อมูลจาก products.json เดิมครั้งเดียวในครั้งแรกที่เปิดใช้
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            if import_json_path and os.path.exists(import_json_path) and self.count_products() == 0:
+                imported = self.import_json(import_json_path)
+                print(f"นำเข้าข้อมูลสินค้าจาก {import_json_path}: {imported} รายการ")
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _init_fts(self):
+        """สร้างดัชนี FTS5 (ครั้งแรกสร้างจากข้อมูลที่มีอยู่) คืนค่า False ถ้า SQLite ไม่รองรับ trigram"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        ).fetchone() is not None
+        if exists:
+            return True
+        try:
+            self.conn.executescript(self.FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # SQLite รุ่นเก่า (ไม่มี FTS5 หรือ tokenizer trigram): ค้นหาด้วย LIKE แบบเดิม
+            return False
+        with self.conn:
+            self.conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        return True
+
+    def close(self):
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # เขียน
+    # ------------------------------------------------------------------
+    def _upsert(self, barcode, name, images, created_at, updated_at):
+        self.conn.execute(
+            """
+            INSERT INTO products (barcode, name, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(barcode) DO UPDATE SET
+                name = excluded.name,
+                updated_at = excluded.updated_at
+            """,
+            (barcode, name, created_at, updated_at)
+        )
+        self.conn.execute("DELETE FROM product_images WHERE barcode = ?", (barcode,))
+        self.conn.executemany(
+            "INSERT INTO product_images (barcode, position, path) VALUES (?, ?, ?)",
+            [(barcode, i, path) for i, path in enumerate(images)]
+        )
+
+    def upsert_product(self, barcode, name, images, created_at=None, updated_at=None):
+        """เพิ่มหรือแก้ไขสินค้าหนึ่งรายการ (created_at เดิมจะถูกเก็บไว้เมื่อแก้ไข) คืนค่าข้อมูลสินค้า"""
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self._upsert(barcode, name, list(images), created_at or now, updated_at or now)
+        return self.get_product(barcode)
+
+    def delete_product(self, barcode):
+        """ลบสินค้าหนึ่งรายการ (รูปภาพในตารางถูกลบตามด้วย ON DELETE CASCADE)"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM products WHERE barcode = ?", (barcode,))
+        return cursor.rowcount > 0
+
+    def import_json(self, json_path):
+        """นำเข้าข้อมูลจาก products.json ทั้งหมดใน transaction เดียว"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            products_data = json.load(f)
+
+        with self._lock, self.conn:
+            for barcode, product in products_data.items():
+                self._upsert(
+                    barcode,
+                    product['name'],
+                    product.get('images', []),
+                    product.get('created_at'),
+                    product.get('updated_at')
+                )
+        return len(products_data)
+
+    def export_json(self, json_path):
+        """เขียนแคตตาล็อกออกเป็น products.json (สำหรับเครื่องมือที่ยังอ่านรูปแบบเดิม)"""
+        products_data = self.load_all()
+        tmp_path = json_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(products_data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, json_path)
+        return len(products_data)
+
+    # ------------------------------------------------------------------
+    # อ่าน
+    # ------------------------------------------------------------------
+    def _images_of(self, barcode):
+        rows = self.conn.execute(
+            "SELECT path FROM product_images WHERE barcode = ? ORDER BY position", (barcode,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_product(self, barcode):
+        """ข้อมูลสินค้าหนึ่งรายการ (None ถ้าไม่มี)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT name, created_at, updated_at FROM products WHERE barcode = ?", (barcode,)
+            ).fetchone()
+            if row is None:
+                return None
+            return {
+                'name': row[0],
+                'images': self._images_of(barcode),
+                'created_at': row[1],
+                'updated_at': row[2],
+            }
+
+    def load_all(self):
+        """ข้อมูลสินค้าทั้งหมดในรูปแบบเดียวกับ products.json (เรียงตามลำดับที่เพิ่ม)"""
+        with self._lock:
+            products_data = {}
+            for barcode, name, created_at, updated_at in self.conn.execute(
+                "SELECT barcode, name, created_at, updated_at FROM products ORDER BY rowid"
+            ):
+                products_data[barcode] = {
+                    'name': name,
+                    'images': [],
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                }
+            for barcode, path in self.conn.execute(
+                "SELECT barcode, path FROM product_images ORDER BY barcode, position"
+            ):
+                products_data[barcode]['images'].append(path)
+        return products_data
+
+    def search(self, term, limit=None):
+        """ค้นหาสินค้าที่บาร์โค้ดหรือชื่อมีคำนี้อยู่ (ไม่สนตัวพิมพ์เล็ก/ใหญ่) คืนค่า [(barcode, name, จำนวนรูป)]
+
+        คำตั้งแต่ 3 ตัวอักษรค้นแบบ substring ผ่านดัชนี FTS5 trigram คำที่สั้นกว่าค้นบาร์โค้ด/ชื่อที่ขึ้นต้นด้วยคำนี้
+        (ใช้ primary key และ idx_products_name) ถ้า SQLite ไม่รองรับ FTS5 จะค้นแบบ substring ด้วย LIKE ทั้งตาราง
+        """
+        like_term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if self.fts and len(term) >= self.FTS_MIN_TERM:
+            where = "p.rowid IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)"
+            params = ['"' + term.replace('"', '""') + '"']
+        elif self.fts:
+            # GLOB แยกตัวพิมพ์เหมือน primary key (บาร์โค้ด), ชื่อใช้ LIKE กับ index แบบ NOCASE
+            glob_term = term.replace('[', '[[]').replace('*', '[*]').replace('?', '[?]')
+            where = "p.barcode GLOB ? OR p.name LIKE ? ESCAPE '\\'"
+            params = [glob_term + '*', like_term + '%']
+        else:
+            where = "p.barcode LIKE ? ESCAPE '\\' OR p.name LIKE ? ESCAPE '\\'"
+            params = ['%' + like_term + '%', '%' + like_term + '%']
+        sql = f"""
+            SELECT p.barcode, p.name,
+                   (SELECT COUNT(*) FROM product_images i WHERE i.barcode = p.barcode)
+            FROM products p
+            WHERE {where}
+            ORDER BY p.rowid
+        """
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def count_products(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def count_images(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM product_images").fetchone()[0]
+
+
+def catalog_path(data_dir):
+    """path ของไฟล์แคตตาล็อก SQLite ในโฟลเดอร์ข้อมูล"""
+    return os.path.join(data_dir, "catalog.db")
+
+
+def load_catalog(data_dir):
+    """โหลดข้อมูลสินค้าทั้งหมด (จาก catalog.db หรือนำเข้าจาก products.json ถ้ายังไม่มี)"""
+    db_path = catalog_path(data_dir)
+    json_path = os.path.join(data_dir, "products.json")
+    if not os.path.exists(db_path) and not os.path.exists(json_path):
+        raise FileNotFoundError("ไม่พบข้อมูลสินค้า (catalog.db หรือ products.json)")
+
+    store = CatalogStore(db_path, import_json_path=json_path)
+    try:
+        return store.load_all()
+    finally:
+        store.close()
+
+
+def main(argv=None):
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="จัดการแคตตาล็อกสินค้า (SQLite)")
+    parser.add_argument('command', choices=['import', 'export', 'stats'],
+                        help="import: นำเข้าจาก products.json, export: เขียน products.json, stats: สถิติ")
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data'))
+    parser.add_argument('--json', default=None, help="path ของ products.json (ค่าเริ่มต้น: data/products.json)")
+    args = parser.parse_args(argv)
+
+    json_path = args.json or os.path.join(args.data_dir, "products.json")
+    store = CatalogStore(catalog_path(args.data_dir))
+
+    if args.command == 'import':
+        print(f"นำเข้าข้อมูลสินค้า {store.import_json(json_path)} รายการ")
+    elif args.command == 'export':
+        print(f"เขียนข้อมูลสินค้า {store.export_json(json_path)} รายการที่ {json_path}")
+
+    print(f"จำนวนสินค้า: {store.count_products()} รายการ")
+    print(f"จำนวนรูปภาพ: {store.count_images()} รูป")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
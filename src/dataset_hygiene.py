@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from PIL import Image
+
+try:
+    from src.catalog_store import load_catalog
+    from src.image_decode import resolve_workers
+except ImportError:  # รันโดยตรงด้วย python src/dataset_hygiene.py
+    from catalog_store import load_catalog
+    from image_decode import resolve_workers
+
+HASH_BITS = 64
+# จำนวน bit ที่เป็น 1 ของแต่ละ byte (popcount ของ uint64 = ผลรวมของ 8 byte)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def difference_hash(img):
+    """dHash 64 bit: เทียบความสว่างของ pixel ที่อยู่ติดกันบนรูปขาวดำขนาด 9x8"""
+    small = img.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | int(left > right)
+    return value
+
+
+def inspect_image(path, min_size=32):
+    """ตรวจรูปหนึ่งรูป (ทำงานใน worker process) คืนค่า dict ของสถานะ ขนาด และ dHash"""
+    result = {'path': path, 'status': 'ok', 'width': None, 'height': None, 'dhash': None, 'error': None}
+    if not os.path.exists(path):
+        result['status'] = 'missing'
+        return result
+    try:
+        with Image.open(path) as img:
+            result['width'], result['height'] = img.size
+            img.verify()
+        # verify() ใช้ไฟล์ต่อไม่ได้ ต้องเปิดใหม่เพื่อ decode จริง (draft ทำให้ JPEG decode ที่ขนาดเล็ก)
+        with Image.open(path) as img:
+            img.draft('L', (64, 64))
+            result['dhash'] = difference_hash(img)
+    except Exception as e:
+        result['status'] = 'corrupt'
+        result['error'] = str(e)
+        return result
+    if min(result['width'], result['height']) < min_size:
+        result['status'] = 'tiny'
+    return result
+
+
+def hamming(hashes_a, hashes_b):
+    """จำนวน bit ที่ต่างกันของ hash แต่ละคู่ (array ของ uint64 ขนาดเท่ากัน)"""
+    xor = np.ascontiguousarray(np.bitwise_xor(hashes_a, hashes_b), dtype=np.uint64)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def near_duplicate_pairs(hashes, max_distance):
+    """หาคู่ index ที่ dHash ต่างกันไม่เกิน max_distance bit
+
+    แบ่ง hash เป็น max_distance + 1 ช่วง คู่ที่ต่างกันไม่เกิน max_distance bit ต้องมีอย่างน้อยหนึ่งช่วง
+    ที่เหมือนกันทุก bit (pigeonhole) จึงเทียบเฉพาะรูปที่อยู่ bucket เดียวกัน ไม่ต้องเทียบทุกคู่
+    bucket ได้จากการเรียงตามค่าของช่วง แล้วเทียบตำแหน่ง p กับ p + k ของทุก bucket พร้อมกันด้วย numpy
+    (XOR + popcount) โดย k เพิ่มทีละ 1 จนไม่มี bucket ใดใหญ่กว่า k
+    """
+    values = np.asarray(hashes, dtype=np.uint64)
+    count = len(values)
+    bands = max_distance + 1
+    widths = [HASH_BITS // bands + (1 if i < HASH_BITS % bands else 0) for i in range(bands)]
+    found = []
+    offset = 0
+    for width in widths:
+        keys = (values >> np.uint64(offset)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        # ตำแหน่งที่ค่าถัดไปอีก k ตำแหน่งยังอยู่ bucket เดียวกัน (ลดลงเรื่อย ๆ เมื่อ k เพิ่ม)
+        positions = np.arange(count - 1)
+        k = 1
+        while len(positions):
+            positions = positions[positions + k < count]
+            positions = positions[sorted_keys[positions] == sorted_keys[positions + k]]
+            if len(positions) == 0:
+                break
+            a = order[positions]
+            b = order[positions + k]
+            close = hamming(values[a], values[b]) <= max_distance
+            a, b = a[close], b[close]
+            found.append(np.minimum(a, b).astype(np.int64) * count + np.maximum(a, b))
+            k += 1
+        offset += width
+    if not found:
+        return set()
+    codes = np.unique(np.concatenate(found))
+    return set(zip((codes // count).tolist(), (codes % count).tolist()))
+
+
+def group_pairs(count, pairs):
+    """รวมคู่ที่ซ้ำกันเป็นกลุ่ม (union-find) คืนค่า list ของกลุ่มที่มีมากกว่า 1 รูป"""
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    groups = defaultdict(list)
+    for i in range(count):
+        groups[find(i)].append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def scan(products_data, workers=None, min_size=32, max_distance=6):
+    """ตรวจทุกรูปในแคตตาล็อกแบบขนาน คืนค่า (report, remove) โดย remove เป็น path ที่ควรตัดออก"""
+    items = [(barcode, path) for barcode, product in products_data.items() for path in product['images']]
+    workers = resolve_workers(workers)
+    print(f"กำลังตรวจรูปภาพ {len(items)} รูป ด้วย {workers} process")
+
+    start = time.perf_counter()
+    paths = [path for _, path in items]
+    if workers <= 1:
+        results = list(map(inspect_image, paths, repeat(min_size)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(inspect_image, paths, repeat(min_size), chunksize=32))
+    for (barcode, _), result in zip(items, results):
+        result['barcode'] = barcode
+    scan_seconds = time.perf_counter() - start
+
+    # หารูปซ้ำเฉพาะรูปที่อ่านได้ (รวมรูปเล็กด้วย เพื่อให้เห็นว่าซ้ำกับรูปใด)
+    hashed = [r for r in results if r['dhash'] is not None]
+    groups = group_pairs(len(hashed), near_duplicate_pairs([r['dhash'] for r in hashed], max_distance))
+
+    within = []
+    cross = []
+    redundant = set()
+    for members in groups:
+        records = [hashed[i] for i in members]
+        barcodes = sorted({r['barcode'] for r in records})
+        if len(barcodes) > 1:
+            # รูปเดียวกันอยู่หลายบาร์โค้ด: อาจติด label ผิด ให้คนตรวจ (ไม่ตัดออกอัตโนมัติ)
+            cross.append({'barcodes': barcodes,
+                          'images': [{'barcode': r['barcode'], 'path': r['path']} for r in records]})
+        for barcode in barcodes:
+            same = [r for r in records if r['barcode'] == barcode]
+            if len(same) < 2:
+                continue
+            # เก็บรูปที่ความละเอียดสูงสุดไว้ รูปอื่นในกลุ่มถือว่าซ้ำซ้อน
+            keep = max(same, key=lambda r: r['width'] * r['height'])
+            drop = [r['path'] for r in same if r is not keep]
+            redundant.update(drop)
+            within.append({'barcode': barcode, 'keep': keep['path'], 'redundant': drop})
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {'min_size': min_size, 'max_distance': max_distance},
+        'summary': {
+            'products': len(products_data),
+            'images': len(results),
+            'corrupt': sum(1 for r in results if r['status'] == 'corrupt'),
+            'missing': sum(1 for r in results if r['status'] == 'missing'),
+            'tiny': sum(1 for r in results if r['status'] == 'tiny'),
+            'redundant': len(redundant),
+            'duplicate_groups': len(within),
+            'cross_barcode_groups': len(cross),
+            'scan_seconds': scan_seconds,
+            'images_per_sec': len(results) / scan_seconds if scan_seconds > 0 else 0.0,
+        },
+        'corrupt': [{'barcode': r['barcode'], 'path': r['path'], 'error': r['error']}
+                    for r in results if r['status'] == 'corrupt'],
+        'missing': [{'barcode': r['barcode'], 'path': r['path']} for r in results if r['status'] == 'missing'],
+        'tiny': [{'barcode': r['barcode'], 'path': r['path'], 'size': [r['width'], r['height']]}
+                 for r in results if r['status'] == 'tiny'],
+        'duplicates': within,
+        'cross_barcode_duplicates': cross,
+    }
+    remove = sorted(redundant | {r['path'] for r in results if r['status'] != 'ok'})
+    return report, remove
+
+
+def pruned_products(products_data, remove):
+    """ข้อมูลสินค้ารูปแบบเดียวกับ products.json โดยตัดรูปเสีย รูปเล็ก และรูปซ้ำซ้อนออก"""
+    remove = set(remove)
+    pruned = {}
+    for barcode, product in products_data.items():
+        pruned[barcode] = dict(product, images=[p for p in product['images'] if p not in remove])
+    return pruned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ตรวจรูปเสีย รูปเล็ก และรูปซ้ำ/เกือบซ้ำในแคตตาล็อกก่อนเทรน")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--workers', type=int, default=None, help="จำนวน process (ค่าเริ่มต้น: ทุก core)")
+    parser.add_argument('--min-size', type=int, default=32, help="ด้านที่สั้นที่สุดของรูป (pixel)")
+    parser.add_argument('--max-distance', type=int, default=6,
+                        help="จำนวน bit ของ dHash ที่ต่างกันได้สูงสุดจึงถือว่าเป็นรูปเกือบซ้ำ (0 = ซ้ำทุก bit)")
+    parser.add_argument('--output', default=None,
+                        help="ไฟล์รายงาน (ค่าเริ่มต้น: <data-dir>/hygiene_report.json)")
+    parser.add_argument('--pruned-manifest', default=None,
+                        help="เขียนข้อมูลสินค้า (รูปแบบ products.json) ที่ตัดรูปเสีย/เล็ก/ซ้ำซ้อนออกแล้ว")
+    args = parser.parse_args(argv)
+
+    products_data = load_catalog(args.data_dir)
+    report, remove = scan(products_data, args.workers, args.min_size, args.max_distance)
+
+    output = args.output or os.path.join(args.data_dir, "hygiene_report.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    summary = report['summary']
+    print("\n=== สรุปการตรวจรูปภาพ ===")
+    print(f"รูปทั้งหมด: {summary['images']} ({summary['images_per_sec']:.1f} รูป/วินาที)")
+    print(f"รูปเสีย: {summary['corrupt']}, ไม่พบไฟล์: {summary['missing']}, รูปเล็กเกินไป: {summary['tiny']}")
+    print(f"รูปซ้ำซ้อนในสินค้าเดียวกัน: {summary['redundant']} รูป ({summary['duplicate_groups']} กลุ่ม)")
+    print(f"รูปซ้ำข้ามบาร์โค้ด (ตรวจ label): {summary['cross_barcode_groups']} กลุ่ม")
+    for group in report['cross_barcode_duplicates'][:10]:
+        print(f"  {', '.join(group['barcodes'])}")
+    print(f"บันทึกรายงานที่: {output}")
+
+    if args.pruned_manifest:
+        with open(args.pruned_manifest, 'w', encoding='utf-8') as f:
+            json.dump(pruned_products(products_data, remove), f, ensure_ascii=False, indent=2)
+        print(f"บันทึกรายการสินค้าที่ตัดรูปออก {len(remove)} รูป ที่: {args.pruned_manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
+
+try:
+    from src.model_trainer import ProductClassifierTrainer, load_model_info
+except ImportError:  # รันโดยตรงด้วย python src/embedding_index.py
+    from model_trainer import ProductClassifierTrainer, load_model_info
+
+
+class EmbeddingIndex:
+    """ดัชนี prototype ต่อบาร์โค้ด สำหรับค้นหาสินค้าด้วย cosine similarity
+
+    เก็บเป็น 3 ไฟล์ใน index_dir:
+    - embedding_index.f16: เมทริกซ์ prototype (float16, 1 แถวต่อบาร์โค้ด) ต่อท้ายได้
+    - embedding_index.txt: บาร์โค้ดของแต่ละแถว บรรทัดละ 1 บาร์โค้ด ต่อท้ายได้
+    - embedding_index.json: ข้อมูลของดัชนี (มิติ, ขนาดรูป, บาร์โค้ดที่ถูกลบ)
+    การเพิ่มสินค้าจึงเขียนเพียงแถวเดียว ไม่ต้องเขียนทั้งดัชนีใหม่
+    """
+
+    def __init__(self, index_dir, dim=None):
+        self.index_dir = index_dir
+        self.matrix_path = os.path.join(index_dir, "embedding_index.f16")
+        self.barcodes_path = os.path.join(index_dir, "embedding_index.txt")
+        self.meta_path = os.path.join(index_dir, "embedding_index.json")
+
+        self.meta = {'dim': dim, 'removed': []}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        if dim is not None and self.meta.get('dim') not in (None, dim):
+            raise ValueError(f"มิติของ embedding ({dim}) ไม่ตรงกับดัชนีเดิม ({self.meta['dim']})")
+        self.meta['dim'] = self.meta.get('dim') or dim
+
+        self._load()
+
+    @property
+    def dim(self):
+        return self.meta['dim']
+
+    def _load(self):
+        """โหลดบาร์โค้ดและเมทริกซ์ (ตัดแถวที่เขียนไม่ครบถ้าเคยถูกขัดจังหวะ)"""
+        barcodes = []
+        if os.path.exists(self.barcodes_path):
+            with open(self.barcodes_path, 'r', encoding='utf-8') as f:
+                barcodes = [line.rstrip('\n') for line in f if line.strip()]
+
+        rows = 0
+        if os.path.exists(self.matrix_path) and self.dim:
+            rows = os.path.getsize(self.matrix_path) // (self.dim * 2)
+
+        self.num_rows = min(rows, len(barcodes))
+        self.barcodes = barcodes[:self.num_rows]
+        self.row_of = {barcode: i for i, barcode in enumerate(self.barcodes)}
+        self.removed = set(self.meta.get('removed', []))
+        self._matrix = None
+        self._valid = None
+
+    def _save_meta(self):
+        self.meta['removed'] = sorted(self.removed)
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def set_prototype(self, barcode, prototype):
+        """เพิ่มหรือแทนที่ prototype ของบาร์โค้ดเดียว (เขียนเฉพาะแถวนั้น)"""
+        row = np.asarray(prototype, dtype=np.float16).reshape(-1)
+        if row.shape[0] != self.dim:
+            raise ValueError(f"prototype ต้องมี {self.dim} มิติ")
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        existing = self.row_of.get(barcode)
+        if existing is not None:
+            with open(self.matrix_path, 'r+b') as f:
+                f.seek(existing * self.dim * 2)
+                f.write(row.tobytes())
+        else:
+            # ตัดส่วนที่เขียนไม่ครบออกก่อน แล้วเขียนแถวก่อนบาร์โค้ด
+            mode = 'r+b' if os.path.exists(self.matrix_path) else 'w+b'
+            with open(self.matrix_path, mode) as f:
+                f.truncate(self.num_rows * self.dim * 2)
+                f.seek(self.num_rows * self.dim * 2)
+                f.write(row.tobytes())
+            with open(self.barcodes_path, 'a', encoding='utf-8') as f:
+                f.write(barcode + '\n')
+            self.row_of[barcode] = self.num_rows
+            self.barcodes.append(barcode)
+            self.num_rows += 1
+
+        if barcode in self.removed:
+            self.removed.discard(barcode)
+        self._save_meta()
+        self._matrix = None
+
+    def remove(self, barcode):
+        """ทำเครื่องหมายว่าบาร์โค้ดถูกลบ (แถวยังอยู่จนกว่าจะ build ใหม่)"""
+        if barcode in self.row_of:
+            self.removed.add(barcode)
+            self._save_meta()
+            self._matrix = None
+
+    def matrix(self):
+        """เมทริกซ์ prototype (float32) และ mask ของแถวที่ยังใช้งานอยู่"""
+        if self._matrix is None:
+            valid = np.ones(self.num_rows, dtype=bool)
+            if self.num_rows == 0:
+                matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            else:
+                data = np.fromfile(self.matrix_path, dtype=np.float16,
+                                   count=self.num_rows * self.dim)
+                matrix = data.reshape(self.num_rows, self.dim).astype(np.float32)
+            for barcode in self.removed:
+                row = self.row_of.get(barcode)
+                if row is not None:
+                    valid[row] = False
+            self._matrix = matrix
+            self._valid = valid
+        return self._matrix, self._valid
+
+    def search(self, embeddings, k=5):
+        """ค้นหา top-k ด้วย cosine similarity แบบ vectorized
+
+        embeddings: (N, dim) ที่ normalize แล้ว คืนค่า list ของ [(barcode, score), ...] ต่อรูป
+        """
+        matrix, valid = self.matrix()
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        scores = queries @ matrix.T
+        scores[:, ~valid] = -np.inf
+        k = min(k, int(valid.sum()))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(self.barcodes[j], float(s)) for j, s in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(top, top_scores)
+        ]
+
+    def reset(self, dim=None):
+        """ลบดัชนีทั้งหมด (ใช้ก่อน build ใหม่ ซึ่งอาจเปลี่ยนมิติของ embedding ได้)"""
+        for path in (self.matrix_path, self.barcodes_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.removed = set()
+        if dim is not None:
+            self.meta['dim'] = dim
+        self._save_meta()
+        self._load()
+
+
+class ProductEmbedder:
+    """สร้าง embedding ของรูปสินค้าด้วย backbone ของ trainer (GlobalAveragePooling + L2 normalize)"""
+
+    def __init__(self, trainer, use_classifier_backbone=False):
+        self.trainer = trainer
+        self.model = self.build_model(use_classifier_backbone)
+        self.dim = int(self.model.output_shape[-1])
+
+    def build_model(self, use_classifier_backbone=False):
+        """สร้างโมเดล embedding (ใช้ backbone ที่ fine-tune แล้วจากโมเดลจำแนกได้ถ้าต้องการ)"""
+        base_model = None
+        if use_classifier_backbone:
+            keras_path = os.path.join(self.trainer.published_dir(), "product_classifier.keras")
+            if os.path.exists(keras_path):
+                classifier = tf.keras.models.load_model(keras_path)
+                if tuple(classifier.input_shape[1:3]) != tuple(self.trainer.img_size):
+                    raise ValueError(f"โมเดลจำแนกใช้ input {classifier.input_shape[1:3]} "
+                                     f"แต่ trainer ใช้ {self.trainer.img_size} (ดู model_info.json)")
+                base_model = classifier.layers[0]
+            else:
+                print("ไม่พบ product_classifier.keras จะใช้ backbone จาก ImageNet")
+
+        if base_model is None:
+            base_model = self.trainer.create_backbone()
+        base_model.trainable = False
+
+        return tf.keras.Sequential([
+            tf.keras.Input(shape=(*self.trainer.img_size, 3)),
+            base_model,
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.UnitNormalization(),
+        ])
+
+    def embed_paths(self, paths, chunk_size=256):
+        """คำนวณ embedding ของหลายรูป คืนค่า (embeddings, ok_mask)"""
+        embeddings = np.zeros((len(paths), self.dim), dtype=np.float32)
+        ok = np.zeros(len(paths), dtype=bool)
+        for start in range(0, len(paths), chunk_size):
+            chunk = paths[start:start + chunk_size]
+            images, loaded = self.trainer.load_images_uint8(chunk)
+            if loaded.any():
+                x = preprocess_input(images[loaded].astype(np.float32))
+                idx = np.arange(start, start + len(chunk))[loaded]
+                embeddings[idx] = self.model.predict(x, batch_size=self.trainer.batch_size, verbose=0)
+                ok[idx] = True
+        return embeddings, ok
+
+    def prototype(self, paths):
+        """prototype ของสินค้า = ค่าเฉลี่ยของ embedding ที่ normalize แล้ว (normalize ซ้ำ)"""
+        embeddings, ok = self.embed_paths(paths)
+        if not ok.any():
+            return None
+        mean = embeddings[ok].mean(axis=0)
+        return mean / (np.linalg.norm(mean) + 1e-12)
+
+    def export_tflite(self, index_dir):
+        """แปลงโมเดล embedding เป็น TFLite (dynamic-range quantization)"""
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        tflite_model = converter.convert()
+
+        tflite_path = os.path.join(index_dir, "product_embedder.tflite")
+        with open(tflite_path, 'wb') as f:
+            f.write(tflite_model)
+        print(f"บันทึกโมเดล embedding ที่: {tflite_path} ({len(tflite_model) / 1024:.1f} KB)")
+        return tflite_path
+
+
+def add_products(embedder, index, barcodes=None):
+    """คำนวณ prototype ใหม่เฉพาะบาร์โค้ดที่ระบุ (None = ทุกสินค้า) แล้วเขียนลงดัชนี"""
+    products_data = embedder.trainer.load_products_data()
+    barcodes = list(products_data.keys()) if barcodes is None else barcodes
+
+    added = 0
+    for barcode in barcodes:
+        product = products_data.get(barcode)
+        if product is None:
+            print(f"ไม่พบสินค้า {barcode} ในแคตตาล็อก")
+            continue
+        paths = [p for p in product['images'] if os.path.exists(p)]
+        prototype = embedder.prototype(paths)
+        if prototype is None:
+            print(f"ไม่มีรูปที่ใช้งานได้สำหรับ {barcode}")
+            continue
+        index.set_prototype(barcode, prototype)
+        added += 1
+
+    print(f"อัปเดต prototype {added} รายการ (ทั้งหมดในดัชนี {index.num_rows - len(index.removed)} รายการ)")
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จัดการดัชนี embedding สำหรับค้นหาสินค้าโดยไม่ต้องเทรนใหม่")
+    parser.add_argument('command', choices=['build', 'add', 'remove', 'query'],
+                        help="build: export โมเดลและสร้างดัชนีใหม่ทั้งหมด, add: เพิ่ม/อัปเดตบาร์โค้ด, "
+                             "remove: ลบบาร์โค้ด, query: ค้นหาสินค้าจากรูป")
+    parser.add_argument('items', nargs='*', help="บาร์โค้ด (add/remove) หรือ path ของรูป (query)")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--use-classifier-backbone', action='store_true',
+                        help="ใช้ backbone ที่ fine-tune แล้วจาก models/product_classifier.keras")
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--model-dir', default=None)
+    args = parser.parse_args(argv)
+
+    trainer = ProductClassifierTrainer(data_dir=args.data_dir, model_dir=args.model_dir)
+    index_dir = trainer.model_dir
+    if args.use_classifier_backbone and args.command != 'remove':
+        # backbone ที่ fine-tune แล้วต้องใช้ขนาด input และ backbone เดียวกับตอนเทรน
+        info = load_model_info(trainer.published_dir())
+        if info is not None:
+            trainer = ProductClassifierTrainer(data_dir=args.data_dir, model_dir=args.model_dir,
+                                               backbone=info['backbone'], alpha=info['alpha'],
+                                               img_size=tuple(info['img_size']))
+
+    if args.command == 'remove':
+        index = EmbeddingIndex(index_dir)
+        for barcode in args.items:
+            index.remove(barcode)
+        print(f"ลบ {len(args.items)} บาร์โค้ดออกจากดัชนี")
+        return
+
+    embedder = ProductEmbedder(trainer, args.use_classifier_backbone)
+    backbone = 'classifier' if args.use_classifier_backbone else 'imagenet'
+
+    if args.command == 'build':
+        # ไม่ส่ง dim ตอนเปิด: build ใหม่หลังเปลี่ยน backbone ต้องทำได้แม้มิติเดิมไม่ตรง
+        index = EmbeddingIndex(index_dir)
+        embedder.export_tflite(index_dir)
+        index.reset(embedder.dim)
+        index.meta['backbone'] = backbone
+        index.meta['model'] = trainer.backbone_tag()
+        index.meta['img_size'] = list(trainer.img_size)
+        add_products(embedder, index)
+        return
+
+    index = EmbeddingIndex(index_dir, embedder.dim)
+    # embedding ต้องคำนวณจาก backbone และขนาดรูปเดียวกับที่ใช้สร้างดัชนี
+    expected = {'backbone': backbone, 'model': trainer.backbone_tag(), 'img_size': list(trainer.img_size)}
+    for key, value in expected.items():
+        if index.meta.get(key, value) != value:
+            raise ValueError(f"ดัชนีนี้สร้างด้วย {key}={index.meta[key]} แต่ตอนนี้ใช้ {value} "
+                             f"กรุณาใช้ตัวเลือกเดียวกันหรือ build ใหม่")
+
+    if args.command == 'add':
+        add_products(embedder, index, args.items)
+
+    elif args.command == 'query':
+        embeddings, ok = embedder.embed_paths(args.items)
+        results = index.search(embeddings[ok], args.top_k)
+        for img_path, matches in zip([p for p, loaded in zip(args.items, ok) if loaded], results):
+            print(img_path)
+            for barcode, score in matches:
+                print(f"  {barcode}: {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_config(config, num_classes=100, steps=30, warmup=5):
+    """วัดความเร็วการเทรน (รูป/วินาที) ของการตั้งค่าเดียว รันใน process ปัจจุบัน
+
+    ใช้รูปสุ่ม (synthetic) เพื่อวัดเฉพาะความเร็วของ engine ไม่รวมเวลาอ่านรูปจากดิสก์
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    try:
+        from src.model_trainer import ProductClassifierTrainer
+    except ImportError:  # รันโดยตรงด้วย python src/engine_benchmark.py
+        from model_trainer import ProductClassifierTrainer
+
+    trainer = ProductClassifierTrainer(
+        use_image_cache=False,
+        intra_op_threads=config.get('intra_op_threads'),
+        inter_op_threads=config.get('inter_op_threads'),
+        jit_compile=config.get('jit_compile', False),
+        mixed_precision=config.get('mixed_precision', 'none'),
+    )
+
+    rng = np.random.default_rng(0)
+    images = rng.uniform(-1, 1, (trainer.batch_size * 4, *trainer.img_size, 3)).astype(np.float32)
+    labels = rng.integers(0, num_classes, len(images))
+    dataset = tf.data.Dataset.from_tensor_slices((images, labels)).batch(trainer.batch_size).repeat()
+
+    model = trainer.create_model(num_classes)
+    result = dict(trainer.engine_info())
+
+    def _measure(phase):
+        # epoch แรกรวมเวลา trace/compile (XLA) จึงแยกเป็น warmup
+        start = time.perf_counter()
+        model.fit(dataset, steps_per_epoch=warmup, epochs=1, verbose=0)
+        result[f'{phase}_warmup_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        model.fit(dataset, steps_per_epoch=steps, epochs=1, verbose=0)
+        elapsed = time.perf_counter() - start
+        result[f'{phase}_images_per_sec'] = steps * trainer.batch_size / elapsed
+
+    _measure('head')  # รอบที่ 1: backbone ถูก freeze
+    trainer.prepare_fine_tuning(model)
+    _measure('finetune')  # รอบที่ 2: fine-tune 40 ชั้นท้าย
+    return result
+
+
+def build_configs(thread_counts, jit_options, precisions, onednn_options):
+    """สร้างทุกชุดการตั้งค่าจากตัวเลือก (thread = 0 หมายถึงให้ TensorFlow เลือกเอง)"""
+    configs = []
+    for threads, jit, precision, onednn in itertools.product(
+            thread_counts, jit_options, precisions, onednn_options):
+        configs.append({
+            'intra_op_threads': threads or None,
+            'inter_op_threads': 1 if threads else None,
+            'jit_compile': jit,
+            'mixed_precision': precision,
+            'onednn': onednn,
+        })
+    return configs
+
+
+def benchmark_configs(configs, num_classes=100, steps=30, warmup=5, timeout=1800):
+    """รันแต่ละการตั้งค่าใน process ใหม่ (thread pool และ oneDNN ตั้งได้ครั้งเดียวต่อ process)"""
+    results = []
+    for i, config in enumerate(configs):
+        print(f"[{i + 1}/{len(configs)}] {config}")
+        env = dict(os.environ)
+        if config.get('onednn') is not None:
+            env['TF_ENABLE_ONEDNN_OPTS'] = '1' if config['onednn'] else '0'
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config),
+               '--num-classes', str(num_classes), '--steps', str(steps), '--warmup', str(warmup)]
+        try:
+            proc = subprocess.run(cmd, env=env, cwd=PROJECT_ROOT, capture_output=True,
+                                  text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            results.append({**config, 'error': f"เกินเวลา {timeout} วินาที"})
+            continue
+
+        # ผลลัพธ์อยู่ในบรรทัดสุดท้ายที่ขึ้นต้นด้วย RESULT (บรรทัดอื่นเป็น log ของ TensorFlow)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith('RESULT ')]
+        if proc.returncode != 0 or not lines:
+            error = (proc.stderr.strip().splitlines() or ['ไม่ทราบสาเหตุ'])[-1]
+            results.append({**config, 'error': error})
+            print(f"  ไม่สำเร็จ: {error}")
+            continue
+
+        result = {**config, **json.loads(lines[-1][len('RESULT '):])}
+        result['onednn'] = config.get('onednn')
+        results.append(result)
+        print(f"  head: {result['head_images_per_sec']:.1f} รูป/วินาที, "
+              f"fine-tune: {result['finetune_images_per_sec']:.1f} รูป/วินาที")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วัดความเร็วการเทรนบน CPU ของแต่ละการตั้งค่า engine")
+    parser.add_argument('--threads', type=int, nargs='+', default=[0],
+                        help="จำนวน intra-op thread ที่ต้องการทดสอบ (0 = ค่าเริ่มต้นของ TensorFlow)")
+    parser.add_argument('--jit', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--precision', nargs='+', choices=['none', 'bfloat16'], default=['none', 'bfloat16'])
+    parser.add_argument('--onednn', choices=['default', 'on', 'off', 'both'], default='default')
+    parser.add_argument('--num-classes', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=30, help="จำนวน batch ที่จับเวลาต่อรอบ")
+    parser.add_argument('--warmup', type=int, default=5, help="จำนวน batch สำหรับ warmup/compile")
+    parser.add_argument('--model-dir', default=os.path.join(PROJECT_ROOT, 'models'))
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        result = run_config(json.loads(args.worker), args.num_classes, args.steps, args.warmup)
+        print("RESULT " + json.dumps(result))
+        return
+
+    jit_options = {'off': [False], 'on': [True], 'both': [False, True]}[args.jit]
+    onednn_options = {'default': [None], 'on': [True], 'off': [False], 'both': [True, False]}[args.onednn]
+    configs = build_configs(args.threads, jit_options, args.precision, onednn_options)
+    results = benchmark_configs(configs, args.num_classes, args.steps, args.warmup)
+
+    ok = [r for r in results if 'error' not in r]
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'cpu_count': os.cpu_count(),
+        'num_classes': args.num_classes,
+        'steps': args.steps,
+        'results': results,
+    }
+    if ok:
+        best = max(ok, key=lambda r: r['finetune_images_per_sec'])
+        report['best'] = best
+        print(f"\nการตั้งค่าที่เร็วที่สุด (fine-tune): threads={best['intra_op_threads']}, "
+              f"jit={best['jit_compile']}, precision={best['mixed_precision']}, onednn={best['onednn']} "
+              f"-> {best['finetune_images_per_sec']:.1f} รูป/วินาที")
+
+    if not os.path.exists(args.model_dir):
+        os.makedirs(args.model_dir)
+    report_path = os.path.join(args.model_dir, "engine_benchmark.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"บันทึกผล benchmark ที่: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
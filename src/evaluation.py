@@ -0,0 +1,235 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+
+def prepare_tflite_input(x, input_detail):
+    """แปลง input ที่ preprocess แล้ว (float32, [-1, 1]) ให้ตรงกับชนิดของ interpreter (float หรือ quantized)"""
+    dtype = input_detail['dtype']
+    if dtype == np.float32:
+        return x
+    scale, zero_point = input_detail['quantization']
+    info = np.iinfo(dtype)
+    q = np.round(x / scale + zero_point)
+    return np.clip(q, info.min, info.max).astype(dtype)
+
+
+def dequantize_output(output, output_detail):
+    if output_detail['dtype'] == np.float32:
+        return output
+    scale, zero_point = output_detail['quantization']
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+def load_retired_mask(model_dir, num_classes):
+    """mask ของคลาสที่ retired จาก label_map.json ข้างไฟล์โมเดล (ไม่มีไฟล์ = ไม่มีคลาสที่ retired)
+
+    คลาสที่ retired ยังมี output อยู่ (ID ถาวร) แต่ไม่ควรถูกนับเป็นคำตอบของโมเดล
+    """
+    retired = np.zeros(num_classes, dtype=bool)
+    label_map_path = os.path.join(model_dir, "label_map.json")
+    if os.path.exists(label_map_path):
+        with open(label_map_path, 'r', encoding='utf-8') as f:
+            for label in json.load(f)['labels']:
+                if label['id'] < num_classes:
+                    retired[label['id']] = label['retired']
+    return retired
+
+
+class StreamingEvaluator:
+    """สะสม metrics ทีละ batch: loss, top-1/top-k, confusion matrix และ precision/recall ต่อคลาส
+
+    เก็บเฉพาะ label และคลาสที่ทำนาย (int32 ต่อรูป) ไม่เก็บ probability ของทุกคลาส
+    confusion matrix บันทึกแบบ sparse (true, pred, count) เพราะจำนวนคลาสอาจเป็นหลักพัน
+    """
+
+    def __init__(self, num_classes, top_k=5, retired=None):
+        self.num_classes = num_classes
+        self.top_k = min(top_k, num_classes)
+        # คลาสที่ retired ถูกตั้ง probability เป็น 0 ก่อนคำนวณ top-1/top-k (เหมือน inference server)
+        self.retired = retired if retired is not None and np.any(retired) else None
+        self.loss_sum = 0.0
+        self.top_k_correct = 0
+        self._labels = []
+        self._predictions = []
+
+    @property
+    def count(self):
+        return sum(len(y) for y in self._labels)
+
+    def update(self, probs, labels):
+        """เพิ่มผลของหนึ่ง batch (probs: [B, num_classes], labels: [B])"""
+        probs = np.asarray(probs, dtype=np.float32)
+        labels = np.asarray(labels).astype(np.int64).reshape(-1)
+        if len(labels) == 0:
+            return
+        if self.retired is not None:
+            probs = np.where(self.retired, 0.0, probs)
+        true_probs = probs[np.arange(len(labels)), labels]
+        self.loss_sum += float(np.sum(-np.log(np.clip(true_probs, 1e-7, 1.0))))
+        # argpartition หา top-k โดยไม่ต้องเรียงทุกคลาส
+        top_k = np.argpartition(-probs, self.top_k - 1, axis=1)[:, :self.top_k]
+        self.top_k_correct += int(np.sum(top_k == labels[:, None]))
+        self._labels.append(labels.astype(np.int32))
+        self._predictions.append(np.argmax(probs, axis=1).astype(np.int32))
+
+    def arrays(self):
+        """คืนค่า (labels, predictions) ของทุกรูปที่ประเมินแล้ว"""
+        if not self._labels:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(self._labels), np.concatenate(self._predictions)
+
+    def confusion(self):
+        """confusion matrix แบบ sparse คืนค่า (true, pred, count) เฉพาะคู่ที่มีค่า"""
+        labels, predictions = self.arrays()
+        codes = labels.astype(np.int64) * self.num_classes + predictions
+        codes, counts = np.unique(codes, return_counts=True)
+        return ((codes // self.num_classes).astype(np.int32), (codes % self.num_classes).astype(np.int32),
+                counts.astype(np.int32))
+
+    def per_class(self):
+        """precision, recall, f1 และ support ต่อคลาส (คลาสที่ไม่มีรูป/ไม่ถูกทำนายได้ค่า 0)"""
+        labels, predictions = self.arrays()
+        support = np.bincount(labels, minlength=self.num_classes)
+        predicted = np.bincount(predictions, minlength=self.num_classes)
+        correct = np.bincount(labels[labels == predictions], minlength=self.num_classes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, correct / predicted, 0.0)
+            recall = np.where(support > 0, correct / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        return precision.astype(np.float32), recall.astype(np.float32), f1.astype(np.float32), support
+
+    def result(self):
+        """สรุป metrics รวม (ค่าต่อคลาสดูได้จาก per_class() หรือไฟล์ .npz)"""
+        total = self.count
+        if total == 0:
+            raise ValueError("ไม่พบรูปภาพสำหรับประเมินผล")
+        labels, predictions = self.arrays()
+        precision, recall, f1, support = self.per_class()
+        present = support > 0
+        return {
+            'num_images': total,
+            'loss': self.loss_sum / total,
+            'accuracy': float(np.mean(labels == predictions)),
+            f'top{self.top_k}_accuracy': self.top_k_correct / total,
+            'macro_precision': float(precision[present].mean()),
+            'macro_recall': float(recall[present].mean()),
+            'macro_f1': float(f1[present].mean()),
+        }
+
+    def save(self, path, class_names=None):
+        """บันทึก metrics ต่อคลาสและ confusion matrix (sparse) เป็น .npz แบบบีบอัด"""
+        precision, recall, f1, support = self.per_class()
+        true, pred, counts = self.confusion()
+        arrays = dict(precision=precision, recall=recall, f1=f1, support=support.astype(np.int32),
+                      confusion_true=true, confusion_pred=pred, confusion_count=counts)
+        if class_names is not None:
+            arrays['class_names'] = np.array(class_names)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    def worst_classes(self, class_names, n=10):
+        """คลาสที่ recall ต่ำที่สุด (เฉพาะคลาสที่มีรูปใน validation)"""
+        precision, recall, _, support = self.per_class()
+        present = np.flatnonzero(support > 0)
+        order = present[np.argsort(recall[present], kind='stable')][:n]
+        return [{'class': class_names[i], 'precision': float(precision[i]), 'recall': float(recall[i]),
+                 'support': int(support[i])} for i in order]
+
+
+def evaluate_keras(model, batches, num_classes, top_k=5, retired=None):
+    """ประเมินโมเดล Keras ในรอบเดียว (batches: iterable ของ (x ที่ preprocess แล้ว, y))"""
+    evaluator = StreamingEvaluator(num_classes, top_k, retired)
+    for x_batch, y_batch in batches:
+        evaluator.update(np.asarray(model.predict_on_batch(x_batch)), np.asarray(y_batch))
+    return evaluator
+
+
+def evaluate_tflite(tflite_path, batches, num_classes, num_threads=None, top_k=5, retired=None):
+    """ประเมินไฟล์ .tflite ในรอบเดียว (batches: iterable ของ (x ที่ preprocess แล้ว, y))
+
+    ปรับ batch dimension ของ interpreter ตามขนาด batch จึงไม่ต้อง invoke ทีละรูป
+    """
+    import tensorflow as tf
+
+    interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+    input_detail = interpreter.get_input_details()[0]
+    batch_size = None
+    evaluator = StreamingEvaluator(num_classes, top_k, retired)
+    for x_batch, y_batch in batches:
+        x_batch = np.asarray(x_batch, dtype=np.float32)
+        if len(x_batch) == 0:
+            continue
+        if len(x_batch) != batch_size:
+            batch_size = len(x_batch)
+            interpreter.resize_tensor_input(input_detail['index'], [batch_size, *x_batch.shape[1:]])
+            interpreter.allocate_tensors()
+            input_detail = interpreter.get_input_details()[0]
+        output_detail = interpreter.get_output_details()[0]
+        interpreter.set_tensor(input_detail['index'], prepare_tflite_input(x_batch, input_detail))
+        interpreter.invoke()
+        probs = dequantize_output(interpreter.get_tensor(output_detail['index']), output_detail)
+        evaluator.update(probs, np.asarray(y_batch))
+    return evaluator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ประเมินโมเดล (.keras หรือ .tflite) บน validation set ในรอบเดียว")
+    parser.add_argument('--model', default=None,
+                        help="path ของ .keras หรือ .tflite (ค่าเริ่มต้น: product_classifier.tflite ของรุ่น CURRENT)")
+    parser.add_argument('--threads', type=int, default=None, help="จำนวน thread ของ interpreter")
+    parser.add_argument('--max-images', type=int, default=None, help="จำกัดจำนวนรูปจาก validation set")
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--model-dir', default=None)
+    args = parser.parse_args(argv)
+
+    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
+    try:
+        from src.model_trainer import ProductClassifierTrainer
+        from src.tflite_benchmark import load_validation_split, iter_batches, trainer_for_model
+        from src.model_registry import current_model_dir
+    except ImportError:  # รันโดยตรงด้วย python src/evaluation.py
+        from model_trainer import ProductClassifierTrainer
+        from tflite_benchmark import load_validation_split, iter_batches, trainer_for_model
+        from model_registry import current_model_dir
+
+    trainer = ProductClassifierTrainer(data_dir=args.data_dir, model_dir=args.model_dir)
+    model_path = args.model or os.path.join(current_model_dir(trainer.model_dir), "product_classifier.tflite")
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    with open(os.path.join(model_dir, "class_names.json"), 'r', encoding='utf-8') as f:
+        class_names = json.load(f)
+    # decode รูปตามขนาด input ของโมเดลที่ประเมิน
+    trainer = trainer_for_model(model_path, trainer)
+
+    paths, labels = load_validation_split(trainer, class_names, args.max_images, model_dir)
+    print(f"ประเมิน {model_path} บน validation set {len(paths)} รูป")
+    batches = ((preprocess_input(images.astype(np.float32)), y)
+               for images, y in iter_batches(trainer, paths, labels))
+
+    retired = load_retired_mask(model_dir, len(class_names))
+    if model_path.endswith('.tflite'):
+        evaluator = evaluate_tflite(model_path, batches, len(class_names), args.threads, retired=retired)
+    else:
+        import tensorflow as tf
+        evaluator = evaluate_keras(tf.keras.models.load_model(model_path), batches, len(class_names),
+                                   retired=retired)
+
+    result = evaluator.result()
+    for key, value in result.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+    print("คลาสที่ recall ต่ำที่สุด:")
+    for row in evaluator.worst_classes(class_names):
+        print(f"  {row['class']}: recall={row['recall']:.3f}, precision={row['precision']:.3f}, "
+              f"รูป={row['support']}")
+
+    base = os.path.splitext(model_path)[0]
+    npz_path = evaluator.save(base + "_metrics.npz", class_names)
+    print(f"บันทึก metrics ต่อคลาสที่: {npz_path}")
+
+
+if __name__ == "__main__":
+    main()
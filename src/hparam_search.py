@@ -0,0 +1,271 @@
+import os
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# ชื่อ hyperparameter -> ชื่อ argument ของ ProductClassifierTrainer
+SEARCH_SPACE_DEFAULTS = {
+    'batch_size': [16, 32, 64],
+    'learning_rate': [1e-3, 3e-4],
+    'fine_tune_learning_rate': [1e-5, 3e-5],
+    'dropout': [0.2, 0.3],
+    'fine_tune_layers': [20, 40, 60],
+}
+
+
+def sample_trials(space, num_trials, seed=42):
+    """สุ่มชุด hyperparameter จาก grid โดยไม่ซ้ำกัน (ถ้า num_trials >= ขนาด grid จะใช้ทั้ง grid)"""
+    keys = list(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if num_trials and num_trials < len(grid):
+        grid = random.Random(seed).sample(grid, num_trials)
+    return grid
+
+
+def _limit_threads(threads):
+    """จำกัดจำนวน thread ของไลบรารีตัวเลขใน worker process ก่อน import tensorflow"""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+
+def _make_pruning_callback(tf, shared, lock, trial_id, stop_event, warmup_epochs, min_trials):
+    class MedianPruningCallback(tf.keras.callbacks.Callback):
+        """หยุด trial ที่ val_accuracy ต่ำกว่า median ของ trial อื่นที่ epoch เดียวกัน"""
+
+        def on_epoch_end(self, epoch, logs=None):
+            value = (logs or {}).get('val_accuracy')
+            if value is None:
+                return
+            with lock:
+                values = shared.get(epoch, [])
+                others = list(values)
+                shared[epoch] = values + [float(value)]
+            if epoch + 1 < warmup_epochs or len(others) < min_trials:
+                return
+            median = sorted(others)[len(others) // 2]
+            if value < median:
+                print(f"trial {trial_id}: หยุดที่ epoch {epoch + 1} "
+                      f"(val_accuracy {value:.4f} < median {median:.4f})")
+                stop_event.set()
+                self.model.stop_training = True
+
+    return MedianPruningCallback()
+
+
+def run_trial(trial, options, shared, lock):
+    """เทรนหนึ่ง trial ใน worker process คืนค่า dict ผลลัพธ์"""
+    _limit_threads(options['threads_per_trial'])
+
+    import tensorflow as tf
+
+    try:
+        from src.model_trainer import ProductClassifierTrainer, TrainingCancelled
+    except ImportError:  # รันโดยตรงด้วย python src/hparam_search.py
+        from model_trainer import ProductClassifierTrainer, TrainingCancelled
+
+    trial_id = trial['trial_id']
+    params = trial['params']
+    trial_dir = os.path.join(options['output_dir'], f"trial_{trial_id:03d}")
+    stop_event = threading.Event()
+    pruning = _make_pruning_callback(tf, shared, lock, trial_id, stop_event,
+                                     options['prune_warmup_epochs'], options['prune_min_trials'])
+
+    result = {'trial_id': trial_id, 'params': params, 'status': 'failed',
+              'val_accuracy': None, 'epochs_run': 0, 'train_seconds': None}
+    start = time.perf_counter()
+    trainer = None
+    try:
+        # streaming + แคช memory-mapped: ทุก trial อ่านรูปที่ decode แล้วชุดเดียวกันจาก page cache
+        trainer = ProductClassifierTrainer(
+            data_dir=options['data_dir'],
+            model_dir=trial_dir,
+            versioned=False,  # trial ไม่ถูก publish เขียนไฟล์ลงโฟลเดอร์ของ trial โดยตรง
+            streaming=True,
+            decode_workers=1,
+            cancel_event=stop_event,
+            intra_op_threads=options['threads_per_trial'],
+            inter_op_threads=1,
+            epochs=options['epochs'],
+            extra_callbacks=[pruning],
+            checkpoint_every=0,  # trial สั้นและไม่ได้ resume จึงไม่ต้องเขียน checkpoint
+            **params
+        )
+        _, history, _, _, _ = trainer.train_model()
+        result['status'] = 'completed'
+    except TrainingCancelled:
+        result['status'] = 'pruned'
+        history = None
+    except Exception as e:
+        result['error'] = str(e)
+        history = None
+    result['train_seconds'] = time.perf_counter() - start
+
+    if history is None and trainer is not None:
+        # trial ที่ถูกหยุดกลางทาง: ใช้ค่าที่บันทึกไว้ใน run report
+        val_accuracies = [e['metrics'].get('val_accuracy') for e in trainer.report.epochs]
+        val_accuracies = [v for v in val_accuracies if v is not None]
+    elif history is not None:
+        val_accuracies = history.history.get('val_accuracy', [])
+    else:
+        val_accuracies = []
+    if val_accuracies:
+        result['val_accuracy'] = float(max(val_accuracies))
+        result['epochs_run'] = len(val_accuracies)
+
+    if trainer is not None:
+        trainer.save_run_report(result['status'])
+    return result
+
+
+def pareto_front(results):
+    """trial ที่ไม่มี trial อื่นทั้งแม่นยำกว่าและเทรนเร็วกว่า"""
+    front = set()
+    for r in results:
+        dominated = any(
+            o is not r
+            and o['val_accuracy'] >= r['val_accuracy'] and o['train_seconds'] <= r['train_seconds']
+            and (o['val_accuracy'] > r['val_accuracy'] or o['train_seconds'] < r['train_seconds'])
+            for o in results
+        )
+        if not dominated:
+            front.add(r['trial_id'])
+    return front
+
+
+def write_leaderboard(results, output_dir):
+    """บันทึก leaderboard (เรียงตาม val accuracy) เป็น JSON และ CSV"""
+    scored = [r for r in results if r['val_accuracy'] is not None]
+    front = pareto_front(scored)
+    for r in results:
+        r['pareto'] = r['trial_id'] in front
+    leaderboard = sorted(results, key=lambda r: (r['val_accuracy'] is None, -(r['val_accuracy'] or 0)))
+
+    json_path = os.path.join(output_dir, "leaderboard.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.now().isoformat(), 'trials': leaderboard},
+                  f, ensure_ascii=False, indent=2)
+
+    csv_path = os.path.join(output_dir, "leaderboard.csv")
+    param_names = sorted({name for r in results for name in r['params']})
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'trial_id', 'status', 'val_accuracy', 'train_seconds',
+                         'epochs_run', 'pareto'] + param_names)
+        for rank, r in enumerate(leaderboard, 1):
+            writer.writerow([rank, r['trial_id'], r['status'], r['val_accuracy'], r['train_seconds'],
+                             r['epochs_run'], r['pareto']] + [r['params'].get(n) for n in param_names])
+    return json_path, csv_path, leaderboard
+
+
+def search(space, num_trials=8, workers=2, threads_per_trial=None, epochs=10, data_dir=None,
+           model_dir=None, prune_warmup_epochs=3, prune_min_trials=3, seed=42):
+    """รัน hyperparameter search แบบขนานแล้วคืนค่า leaderboard"""
+    try:
+        from src.model_trainer import ProductClassifierTrainer
+    except ImportError:
+        from model_trainer import ProductClassifierTrainer
+
+    data_dir = data_dir or os.path.join(PROJECT_ROOT, 'data')
+    model_dir = model_dir or os.path.join(PROJECT_ROOT, 'models')
+    output_dir = os.path.join(model_dir, "hparam_search")
+    os.makedirs(output_dir, exist_ok=True)
+    threads_per_trial = threads_per_trial or max(1, (os.cpu_count() or 1) // workers)
+
+    # decode ทุกรูปลงแคชครั้งเดียวก่อนเริ่ม trial (trial อ่านจากแคชโดยไม่ decode ซ้ำ)
+    trainer = ProductClassifierTrainer(data_dir=data_dir, model_dir=model_dir)
+    paths, _, _ = trainer.collect_image_paths()
+    trainer.ensure_cached(paths)
+
+    trials = [{'trial_id': i + 1, 'params': params}
+              for i, params in enumerate(sample_trials(space, num_trials, seed))]
+    options = {
+        'data_dir': data_dir,
+        'output_dir': output_dir,
+        'epochs': epochs,
+        'threads_per_trial': threads_per_trial,
+        'prune_warmup_epochs': prune_warmup_epochs,
+        'prune_min_trials': prune_min_trials,
+    }
+    print(f"เริ่ม hyperparameter search: {len(trials)} trials, {workers} process, "
+          f"{threads_per_trial} thread ต่อ trial")
+
+    # spawn: TensorFlow ไม่ปลอดภัยกับ fork และทุก trial ได้ process ใหม่ (ตั้งจำนวน thread ได้ทุกครั้ง)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        shared = manager.dict()
+        lock = manager.Lock()
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1)
+        except TypeError:  # Python < 3.11
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        with executor:
+            futures = [executor.submit(run_trial, trial, options, shared, lock) for trial in trials]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                accuracy = result['val_accuracy']
+                print(f"trial {result['trial_id']} ({result['status']}): "
+                      f"val_accuracy={accuracy if accuracy is None else round(accuracy, 4)}, "
+                      f"{result['train_seconds']:.0f} วินาที, {result['params']}")
+
+    json_path, csv_path, leaderboard = write_leaderboard(results, output_dir)
+    print("\n=== Leaderboard ===")
+    for rank, r in enumerate(leaderboard[:10], 1):
+        accuracy = '-' if r['val_accuracy'] is None else f"{r['val_accuracy']:.4f}"
+        marker = '*' if r['pareto'] else ' '
+        print(f"{rank:2d}.{marker} trial {r['trial_id']:3d} {r['status']:9s} acc={accuracy} "
+              f"time={r['train_seconds']:.0f}s {r['params']}")
+    print("(* = Pareto front ของ val accuracy กับเวลาเทรน)")
+    print(f"บันทึก leaderboard ที่: {json_path} และ {csv_path}")
+    return leaderboard
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ค้นหา hyperparameter ของการเทรนแบบขนาน")
+    parser.add_argument('--trials', type=int, default=8, help="จำนวน trial (สุ่มจาก grid)")
+    parser.add_argument('--workers', type=int, default=2, help="จำนวน trial ที่รันพร้อมกัน")
+    parser.add_argument('--threads-per-trial', type=int, default=None,
+                        help="จำนวน thread ต่อ trial (ค่าเริ่มต้น: จำนวน core / workers)")
+    parser.add_argument('--epochs', type=int, default=10, help="จำนวน epochs ต่อ trial")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=SEARCH_SPACE_DEFAULTS['batch_size'])
+    parser.add_argument('--learning-rates', type=float, nargs='+', default=SEARCH_SPACE_DEFAULTS['learning_rate'])
+    parser.add_argument('--fine-tune-learning-rates', type=float, nargs='+',
+                        default=SEARCH_SPACE_DEFAULTS['fine_tune_learning_rate'])
+    parser.add_argument('--dropouts', type=float, nargs='+', default=SEARCH_SPACE_DEFAULTS['dropout'])
+    parser.add_argument('--fine-tune-layers', type=int, nargs='+', default=SEARCH_SPACE_DEFAULTS['fine_tune_layers'])
+    parser.add_argument('--prune-warmup-epochs', type=int, default=3,
+                        help="ไม่หยุด trial ก่อน epoch นี้")
+    parser.add_argument('--prune-min-trials', type=int, default=3,
+                        help="ต้องมีผลของ trial อื่นที่ epoch เดียวกันอย่างน้อยเท่านี้จึงจะตัดสิน")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--model-dir', default=None)
+    args = parser.parse_args(argv)
+
+    space = {
+        'batch_size': args.batch_sizes,
+        'learning_rate': args.learning_rates,
+        'fine_tune_learning_rate': args.fine_tune_learning_rates,
+        'dropout': args.dropouts,
+        'fine_tune_layers': args.fine_tune_layers,
+    }
+    search(space, args.trials, args.workers, args.threads_per_trial, args.epochs, args.data_dir,
+           args.model_dir, args.prune_warmup_epochs, args.prune_min_trials, args.seed)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
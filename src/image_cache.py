@@ -0,0 +1,345 @@
+import os
+import json
+import uuid
+import argparse
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: ล็อกได้เฉพาะระหว่าง thread ใน process เดียว
+    fcntl = None
+
+
+class DecodedImageCache:
+    """แคชรูปภาพที่ decode และ resize แล้ว เก็บเป็น uint8 ในไฟล์ memory-mapped
+
+    แต่ละรูปใช้ 1 slot ขนาดคงที่ (H x W x 3 bytes) ในไฟล์ข้อมูล และมี index (JSON)
+    ที่ map path -> slot พร้อมขนาดไฟล์และ mtime ของรูปต้นฉบับ ถ้าไฟล์ต้นฉบับไม่เปลี่ยน
+    จะอ่านจากแคชโดยไม่ต้อง decode ซ้ำ
+
+    การเขียนล็อกข้ามทั้ง thread และ process (flock บนไฟล์ .lock ข้าง index) และอ่าน index
+    จากดิสก์ใหม่ก่อนจอง slot ทุกครั้ง หลาย process (เช่น trial ของ hparam search) จึงใช้แคชเดียวกันได้
+    """
+
+    INDEX_VERSION = 1
+    FLUSH_EVERY = 256  # บันทึก index ทุก ๆ กี่รูปที่ decode ใหม่ (กันข้อมูลหายถ้าถูกขัดจังหวะ)
+
+    def __init__(self, cache_dir, img_size):
+        self.cache_dir = cache_dir
+        self.img_size = tuple(img_size)
+        self.slot_shape = (*self.img_size, 3)
+        self.slot_bytes = int(np.prod(self.slot_shape))
+
+        size_tag = f"{self.img_size[0]}x{self.img_size[1]}"
+        self.index_path = os.path.join(cache_dir, f"index_{size_tag}.json")
+        self.lock_path = self.index_path + ".lock"
+        self._size_tag = size_tag
+        self._lock = threading.Lock()
+        self._memmap = None
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # index
+    # ------------------------------------------------------------------
+    def _load_index(self):
+        """โหลด index จากดิสก์ (ถ้าไม่มีหรือเสียจะเริ่มแคชใหม่)"""
+        index = None
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('version') != self.INDEX_VERSION:
+                    index = None
+            except Exception as e:
+                print(f"ไม่สามารถอ่าน index ของแคชรูปภาพ: {e}")
+                index = None
+
+        if index is None:
+            index = {
+                'version': self.INDEX_VERSION,
+                'data_file': f"images_{self._size_tag}_{uuid.uuid4().hex[:8]}.u8",
+                'slots': 0,
+                'entries': {},
+            }
+
+        self.data_file = index['data_file']
+        self.data_path = os.path.join(self.cache_dir, self.data_file)
+        self.num_slots = index['slots']
+        self.entries = index['entries']
+
+    def _reload_index(self):
+        """อ่าน index ล่าสุดจากดิสก์ (process อื่นอาจเพิ่มรูปหรือ compact ไปแล้ว) เรียกขณะถือล็อกเท่านั้น"""
+        data_file = self.data_file
+        self._load_index()
+        if self.data_file != data_file:
+            self._memmap = None
+
+    @contextmanager
+    def _locked(self):
+        """ล็อกสำหรับเขียนแคช: threading.Lock ใน process และ flock ระหว่าง process"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def flush(self):
+        """บันทึก index ลงดิสก์แบบ atomic"""
+        index = {
+            'version': self.INDEX_VERSION,
+            'data_file': self.data_file,
+            'slots': self.num_slots,
+            'entries': self.entries,
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _key(img_path):
+        return os.path.abspath(img_path)
+
+    @staticmethod
+    def _signature(img_path):
+        st = os.stat(img_path)
+        return st.st_size, st.st_mtime_ns
+
+    def lookup(self, img_path):
+        """คืนค่า slot ของรูปถ้าอยู่ในแคชและยังไม่เปลี่ยนแปลง ไม่เช่นนั้นคืน None"""
+        entry = self.entries.get(self._key(img_path))
+        if entry is None:
+            return None
+        try:
+            size, mtime_ns = self._signature(img_path)
+        except OSError:
+            return None
+        if entry[1] != size or entry[2] != mtime_ns:
+            return None
+        return entry[0]
+
+    # ------------------------------------------------------------------
+    # data file
+    # ------------------------------------------------------------------
+    def _write_slot(self, f, slot, img):
+        f.seek(slot * self.slot_bytes)
+        f.write(np.ascontiguousarray(img, dtype=np.uint8).tobytes())
+
+    def array(self):
+        """คืนค่า memmap (อ่านอย่างเดียว) ของทุก slot ในแคช"""
+        if self._memmap is None or self._memmap.shape[0] != self.num_slots:
+            if self.num_slots == 0:
+                return np.zeros((0, *self.slot_shape), dtype=np.uint8)
+            self._memmap = np.memmap(
+                self.data_path, dtype=np.uint8, mode='r',
+                shape=(self.num_slots, *self.slot_shape)
+            )
+        return self._memmap
+
+    def read(self, slots):
+        """อ่านรูปภาพจากหลาย slot (คืนค่าเป็น array ใหม่ ไม่ผูกกับไฟล์)"""
+        return np.asarray(self.array()[np.asarray(slots)])
+
+    def read_slot(self, slot):
+        """อ่านรูปภาพจาก slot เดียว"""
+        return np.array(self.array()[int(slot)])
+
+    def find(self, img_paths):
+        """ค้นหา slot ของหลายรูป คืนค่า (slots, missing) โดย missing คือ index ของรูปที่ต้อง decode"""
+        slots = np.full(len(img_paths), -1, dtype=np.int64)
+        missing = []
+        for i, img_path in enumerate(img_paths):
+            slot = self.lookup(img_path)
+            if slot is None:
+                missing.append(i)
+            else:
+                slots[i] = slot
+        return slots, missing
+
+    def ensure(self, img_paths, decode_fn):
+        """ทำให้ทุกรูปอยู่ในแคช โดย decode เฉพาะรูปที่ยังไม่มีหรือมีการเปลี่ยนแปลง
+
+        decode_fn(path) ต้องคืนค่า uint8 array ขนาด img_size หรือ None ถ้าอ่านไม่ได้
+        คืนค่า array ของ slot (-1 สำหรับรูปที่อ่านไม่ได้)
+        """
+        slots, missing = self.find(img_paths)
+        if not missing:
+            return slots
+
+        print(f"กำลัง decode รูปภาพใหม่ {len(missing)} รูป (อยู่ในแคชแล้ว {len(img_paths) - len(missing)} รูป)")
+        decoded = ((i, self._safe_decode(decode_fn, img_paths[i])) for i in missing)
+        self.store_decoded(img_paths, decoded, slots)
+        return slots
+
+    def store_decoded(self, img_paths, decoded, slots):
+        """เขียนรูปที่ decode แล้ว (iterable ของ (i, img)) ลงแคช และอัปเดต slots ตาม index i
+
+        decode นอกล็อก แล้วเขียนทีละ FLUSH_EVERY รูปภายใต้ล็อก (process อื่น decode ไปพร้อมกันได้)
+        """
+        batch = []
+        for i, img in decoded:
+            if img is None:
+                continue
+            batch.append((i, img))
+            if len(batch) >= self.FLUSH_EVERY:
+                self._write_batch(img_paths, batch, slots)
+                batch = []
+        if batch:
+            self._write_batch(img_paths, batch, slots)
+
+    def _write_batch(self, img_paths, batch, slots):
+        with self._locked():
+            # จอง slot จาก index ล่าสุด ไม่เช่นนั้นสอง process อาจเขียนทับ slot เดียวกัน
+            self._reload_index()
+            mode = 'r+b' if os.path.exists(self.data_path) else 'w+b'
+            with open(self.data_path, mode) as f:
+                for i, img in batch:
+                    img_path = img_paths[i]
+                    key = self._key(img_path)
+                    size, mtime_ns = self._signature(img_path)
+                    entry = self.entries.get(key)
+                    if entry is not None and entry[1] == size and entry[2] == mtime_ns:
+                        # process อื่นเขียนรูปนี้ไปแล้ว
+                        slots[i] = entry[0]
+                        continue
+                    # รูปที่เปลี่ยนแปลงเขียนทับ slot เดิม รูปใหม่ต่อท้ายไฟล์
+                    slot = entry[0] if entry is not None else self.num_slots
+                    self._write_slot(f, slot, img)
+                    if slot == self.num_slots:
+                        self.num_slots += 1
+                    self.entries[key] = [slot, size, mtime_ns]
+                    slots[i] = slot
+            self._memmap = None
+            self.flush()
+
+    @staticmethod
+    def _safe_decode(decode_fn, img_path):
+        try:
+            return decode_fn(img_path)
+        except Exception as e:
+            print(f"ไม่สามารถโหลดรูปภาพ {img_path}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # eviction / compaction
+    # ------------------------------------------------------------------
+    def compact(self, keep_paths=None):
+        """ลบรูปที่ไม่ใช้แล้วออกจากแคชและเขียนไฟล์ข้อมูลใหม่ให้กระชับ
+
+        keep_paths: path ที่ยังต้องการเก็บไว้ (เช่น รูปในแคตตาล็อกสินค้า)
+        ถ้าไม่ระบุ จะเก็บทุกรูปที่ไฟล์ต้นฉบับยังอยู่และไม่เปลี่ยนแปลง
+        คืนค่า (จำนวนที่เก็บไว้, จำนวนที่ลบออก)
+        """
+        keep_keys = None
+        if keep_paths is not None:
+            keep_keys = {self._key(p) for p in keep_paths}
+
+        with self._locked():
+            self._reload_index()
+            kept = []
+            for key, entry in self.entries.items():
+                if keep_keys is not None and key not in keep_keys:
+                    continue
+                if self.lookup(key) is None:
+                    continue
+                kept.append((entry[0], key, entry))
+            kept.sort()
+            removed = len(self.entries) - len(kept)
+
+            old_data_path = self.data_path
+            new_data_file = f"images_{self._size_tag}_{uuid.uuid4().hex[:8]}.u8"
+            new_data_path = os.path.join(self.cache_dir, new_data_file)
+
+            source = self.array()
+            new_entries = {}
+            with open(new_data_path, 'wb') as f:
+                for new_slot, (old_slot, key, entry) in enumerate(kept):
+                    f.write(np.ascontiguousarray(source[old_slot]).tobytes())
+                    new_entries[key] = [new_slot, entry[1], entry[2]]
+
+            self._memmap = None
+            del source
+            self.data_file = new_data_file
+            self.data_path = new_data_path
+            self.num_slots = len(kept)
+            self.entries = new_entries
+            # สลับ index เป็นขั้นตอนสุดท้าย ถ้าถูกขัดจังหวะก่อนหน้านี้ แคชเดิมยังใช้งานได้
+            self.flush()
+
+            if old_data_path != new_data_path and os.path.exists(old_data_path):
+                try:
+                    os.remove(old_data_path)
+                except OSError as e:
+                    print(f"ไม่สามารถลบไฟล์แคชเก่า {old_data_path}: {e}")
+
+            # ลบไฟล์ข้อมูลที่ไม่มี index อ้างอิง (เหลือจากการ compact ที่ถูกขัดจังหวะ)
+            for name in os.listdir(self.cache_dir):
+                if (name.startswith(f"images_{self._size_tag}_") and name.endswith(".u8")
+                        and name != self.data_file):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+        return len(kept), removed
+
+    def stats(self):
+        """สถิติของแคช"""
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        return {
+            'img_size': list(self.img_size),
+            'entries': len(self.entries),
+            'slots': self.num_slots,
+            'data_file_mb': data_size / (1024 * 1024),
+        }
+
+
+def _products_image_paths(data_dir):
+    """รายการ path รูปภาพทั้งหมดที่ยังอยู่ในแคตตาล็อกสินค้า"""
+    try:
+        from src.catalog_store import load_catalog
+    except ImportError:  # รันโดยตรงด้วย python src/image_cache.py
+        from catalog_store import load_catalog
+    products_data = load_catalog(data_dir)
+    return [img_path for product in products_data.values() for img_path in product['images']]
+
+
+def main(argv=None):
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="จัดการแคชรูปภาพที่ decode แล้ว")
+    parser.add_argument('command', choices=['stats', 'compact'],
+                        help="stats: แสดงสถิติ, compact: ลบรูปของสินค้าที่ถูกลบและบีบอัดไฟล์แคช")
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data'))
+    parser.add_argument('--img-size', type=int, default=224)
+    args = parser.parse_args(argv)
+
+    cache = DecodedImageCache(
+        os.path.join(args.data_dir, '.image_cache'), (args.img_size, args.img_size)
+    )
+
+    if args.command == 'compact':
+        keep_paths = None
+        try:
+            keep_paths = _products_image_paths(args.data_dir)
+        except FileNotFoundError:
+            pass
+        kept, removed = cache.compact(keep_paths)
+        print(f"compact แคชเรียบร้อย: เก็บไว้ {kept} รูป, ลบออก {removed} รูป")
+
+    for key, value in cache.stats().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import cv2
+import numpy as np
+
+
+# ต่ำกว่าจำนวนนี้ decode บน process เดียวเร็วกว่าเพราะไม่ต้องเสียเวลาสร้าง process pool
+MIN_PARALLEL_IMAGES = 200
+
+
+def decode_image_uint8(img_path, img_size):
+    """โหลดรูปภาพเป็น RGB uint8 ขนาด img_size (ยังไม่ preprocess)"""
+    # โหลดรูปภาพด้วย OpenCV
+    img = cv2.imread(img_path)
+    if img is None:
+        return None
+
+    # แปลง BGR เป็น RGB
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    # Resize รูปภาพ
+    return cv2.resize(img, img_size)
+
+
+def decode_image_bytes(data, img_size):
+    """decode รูปภาพจาก bytes (เช่นไฟล์ที่อัปโหลด) เป็น RGB uint8 ขนาด img_size คืนค่า None ถ้าอ่านไม่ได้"""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return cv2.resize(img, img_size)
+
+
+def _decode_worker(img_path, img_size):
+    """ฟังก์ชันที่รันใน worker process คืนค่า (img, error)"""
+    try:
+        img = decode_image_uint8(img_path, img_size)
+        if img is None:
+            return None, "OpenCV อ่านไฟล์รูปภาพไม่ได้"
+        return img, None
+    except Exception as e:
+        return None, str(e)
+
+
+def resolve_workers(workers):
+    """แปลงค่า workers (None/0 = ใช้ทุก core) เป็นจำนวน process จริง"""
+    if not workers or workers < 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def decode_images(img_paths, img_size, workers=None, chunk_size=32, progress_every=1000):
+    """decode หลายรูปตามลำดับ (ขนานด้วย process pool) yield (i, img, error)
+
+    ผลลัพธ์ออกมาตามลำดับของ img_paths เสมอ img เป็น None และ error เป็นข้อความ
+    สำหรับไฟล์ที่อ่านไม่ได้
+    """
+    img_size = tuple(img_size)
+    workers = resolve_workers(workers)
+    total = len(img_paths)
+
+    if workers <= 1 or total < MIN_PARALLEL_IMAGES:
+        results = map(_decode_worker, img_paths, repeat(img_size))
+        for i, (img, error) in enumerate(results):
+            if progress_every and (i + 1) % progress_every == 0:
+                print(f"decode รูปภาพแล้ว {i + 1}/{total} รูป")
+            yield i, img, error
+        return
+
+    print(f"กำลัง decode รูปภาพ {total} รูป ด้วย {workers} process")
+    # spawn: trainer เรียกจาก thread ของ GUI หลังโหลด TensorFlow แล้ว การ fork ในสภาพนี้อาจค้าง (deadlock)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = executor.map(_decode_worker, img_paths, repeat(img_size), chunksize=chunk_size)
+        for i, (img, error) in enumerate(results):
+            if progress_every and (i + 1) % progress_every == 0:
+                print(f"decode รูปภาพแล้ว {i + 1}/{total} รูป")
+            yield i, img, error
@@ -0,0 +1,256 @@
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+import threading
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff')
+OBJECTS_DIR = "objects"
+HASH_PREFIX = 12  # จำนวนตัวอักษรของ hash ที่ใช้ในชื่อไฟล์ของสินค้า
+FICLONE = 0x40049409  # ioctl สำหรับ reflink บน Linux (btrfs, XFS)
+
+
+def file_sha256(path):
+    """sha256 ของเนื้อไฟล์ (อ่านทีละ 1 MB)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def link_file(src, dst):
+    """สร้าง dst จาก src โดยไม่ใช้พื้นที่เพิ่ม: hardlink -> reflink คืนค่าวิธีที่ใช้ หรือ None ถ้าระบบไฟล์ไม่รองรับ"""
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError:
+        pass
+    if sys.platform.startswith('linux'):
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+    return None
+
+
+class ImageStore:
+    """ที่เก็บรูปภาพสินค้าแบบ content-addressed
+
+    เนื้อไฟล์เก็บครั้งเดียวที่ data/objects/<ab>/<sha256><ext> และรูปของแต่ละสินค้า
+    (data/<barcode>/<barcode>_<hash>.<ext>) เป็น hardlink/reflink ไปยังไฟล์นั้น
+    ถ้าระบบไฟล์ไม่รองรับทั้งสองแบบ แคตตาล็อกอ้างอิง path ใน objects/ โดยตรง (ไม่คัดลอกเป็นสองชุด)
+    - รูปที่อยู่ในโฟลเดอร์สินค้าหรือ objects/ แล้วใช้ path เดิม (แก้ไขชื่อสินค้าไม่ต้องคัดลอกรูปใหม่)
+    - รูปซ้ำ (เนื้อไฟล์เหมือนกัน) ไม่ถูกคัดลอกซ้ำ แม้อยู่คนละบาร์โค้ด
+    - ลบเฉพาะรูปที่ถูกเอาออก ไฟล์ใน objects/ ที่ไม่มีสินค้าใช้แล้วลบได้ด้วย gc()
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.objects_dir = os.path.join(data_dir, OBJECTS_DIR)
+
+    def product_dir(self, barcode):
+        return os.path.join(self.data_dir, barcode)
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{ext}")
+
+    def add_object(self, src_path, digest=None):
+        """เก็บเนื้อไฟล์ลง objects/ (ถ้ายังไม่มี) คืนค่า (digest, path ของ object)"""
+        digest = digest or file_sha256(src_path)
+        ext = os.path.splitext(src_path)[1].lower()
+        object_path = self.object_path(digest, ext)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copy2(src_path, tmp_path)
+            os.replace(tmp_path, object_path)
+        return digest, object_path
+
+    def add_image(self, barcode, src_path, digest=None):
+        """เพิ่มรูปให้สินค้า คืนค่า path ของรูปในโฟลเดอร์สินค้า (ไม่คัดลอกซ้ำถ้ามีรูปนี้อยู่แล้ว)
+        หรือ path ของ object เองถ้าระบบไฟล์ link ไม่ได้"""
+        digest, object_path = self.add_object(src_path, digest)
+        ext = os.path.splitext(object_path)[1]
+        product_dir = self.product_dir(barcode)
+        os.makedirs(product_dir, exist_ok=True)
+
+        dst_path = os.path.join(product_dir, f"{barcode}_{digest[:HASH_PREFIX]}{ext}")
+        if not os.path.exists(dst_path):
+            tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if link_file(object_path, tmp_path) is None:
+                return object_path
+            os.replace(tmp_path, dst_path)
+        return dst_path
+
+    def _is_object(self, img_path):
+        objects_dir = os.path.abspath(self.objects_dir)
+        return os.path.abspath(img_path).startswith(objects_dir + os.sep)
+
+    def _is_stored(self, barcode, img_path):
+        """รูปนี้อยู่ในโฟลเดอร์ของสินค้าหรือใน objects/ แล้วหรือไม่"""
+        product_dir = os.path.abspath(self.product_dir(barcode))
+        in_store = os.path.dirname(os.path.abspath(img_path)) == product_dir or self._is_object(img_path)
+        return in_store and os.path.exists(img_path)
+
+    def save_product_images(self, barcode, image_paths):
+        """ทำให้โฟลเดอร์ของสินค้ามีเฉพาะรูปใน image_paths คืนค่ารายการ path ที่บันทึกแล้ว
+
+        คัดลอกเฉพาะรูปใหม่ รูปเดิมใช้ path เดิม และลบเฉพาะรูปที่ถูกเอาออก
+        """
+        saved_images = []
+        seen = set()
+        for image_path in image_paths:
+            try:
+                if self._is_stored(barcode, image_path):
+                    saved_path = image_path
+                else:
+                    saved_path = self.add_image(barcode, image_path)
+            except Exception as e:
+                print(f"Error copying image {image_path}: {e}")
+                continue
+
+            key = os.path.abspath(saved_path)
+            if key in seen:  # รูปเดียวกันถูกเลือกซ้ำ
+                continue
+            seen.add(key)
+            saved_images.append(saved_path)
+
+        # ลบรูปที่ไม่ได้ใช้แล้วออกจากโฟลเดอร์สินค้า
+        product_dir = self.product_dir(barcode)
+        if os.path.isdir(product_dir):
+            for file in os.listdir(product_dir):
+                file_path = os.path.join(product_dir, file)
+                if file.lower().endswith(IMAGE_EXTENSIONS) and os.path.abspath(file_path) not in seen:
+                    os.remove(file_path)
+
+        return saved_images
+
+    def remove_product(self, barcode, referenced_paths=None):
+        """ลบโฟลเดอร์รูปของสินค้า แล้วลบ object ที่ไม่มีสินค้าอื่นใช้ (ถ้าส่ง referenced_paths มา)
+
+        GUI ไม่ส่ง referenced_paths (gc อ่านทุก object จึงไม่ควรรันบน UI thread ให้ใช้ image_store.py gc แทน)
+        referenced_paths: path รูปทั้งหมดที่สินค้าที่เหลือในแคตตาล็อกใช้ (ดู gc())
+        คืนค่าผลของ gc() หรือ None
+        """
+        product_dir = self.product_dir(barcode)
+        if os.path.exists(product_dir):
+            shutil.rmtree(product_dir)
+        if referenced_paths is not None:
+            return self.gc(referenced_paths)
+        return None
+
+    def _objects(self):
+        """object ทั้งหมด คืนค่า {digest: DirEntry}"""
+        objects = {}
+        if not os.path.isdir(self.objects_dir):
+            return objects
+        for prefix_dir in os.scandir(self.objects_dir):
+            if not prefix_dir.is_dir():
+                continue
+            for obj in os.scandir(prefix_dir.path):
+                if not obj.name.endswith('.tmp'):
+                    objects[obj.name.split('.', 1)[0]] = obj
+        return objects
+
+    def gc(self, referenced_paths):
+        """ลบ object ที่ไม่มีรูปของสินค้าใดอ้างอิงแล้ว คืนค่า (จำนวนที่ลบ, ขนาดที่คืนได้เป็น bytes)
+
+        referenced_paths: path รูปทั้งหมดในแคตตาล็อก
+        object ถูกอ้างอิงเมื่อ: อยู่ใน referenced_paths (แคตตาล็อกอ้างอิง objects/ โดยตรง) หรือ
+        มีรูปในโฟลเดอร์สินค้า/ใน referenced_paths ที่เป็น hardlink (inode เดียวกัน) หรือมีเนื้อไฟล์ตรงกัน
+        (reflink) ซึ่งตรวจด้วย sha256 เต็ม ไม่ใช่เพียง hash 12 ตัวแรกในชื่อไฟล์
+        """
+        objects = self._objects()
+        if not objects:
+            return 0, 0
+        by_inode = {}
+        by_prefix = {}
+        for digest, obj in objects.items():
+            st = os.stat(obj.path)  # DirEntry.stat() ไม่มี inode บน Windows
+            by_inode[(st.st_dev, st.st_ino)] = digest
+            by_prefix.setdefault(digest[:HASH_PREFIX], []).append(digest)
+
+        candidates = {os.path.abspath(p) for p in referenced_paths}
+        for entry in os.scandir(self.data_dir):
+            if not entry.is_dir() or entry.name.startswith('.') or entry.name == OBJECTS_DIR:
+                continue
+            for file in os.listdir(entry.path):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    candidates.add(os.path.abspath(os.path.join(entry.path, file)))
+
+        referenced = set()
+        for path in candidates:
+            if self._is_object(path):
+                referenced.add(os.path.basename(path).split('.', 1)[0])
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = by_inode.get((st.st_dev, st.st_ino))
+            if digest is None:
+                # reflink: inode ต่างกัน ตรวจเนื้อไฟล์เฉพาะรูปที่ชื่อตรงกับ hash ของ object
+                stem = os.path.splitext(os.path.basename(path))[0]
+                prefix = stem.rsplit('_', 1)[-1]
+                if prefix in by_prefix:
+                    actual = file_sha256(path)
+                    digest = actual if actual in by_prefix[prefix] else None
+            if digest is not None:
+                referenced.add(digest)
+
+        removed = 0
+        freed = 0
+        for digest, obj in objects.items():
+            if digest in referenced:
+                continue
+            freed += obj.stat().st_size
+            os.remove(obj.path)
+            removed += 1
+        return removed, freed
+
+    def stats(self):
+        """จำนวนและขนาดรวมของ object ที่เก็บไว้"""
+        count = 0
+        total = 0
+        if os.path.isdir(self.objects_dir):
+            for root, _, files in os.walk(self.objects_dir):
+                for file in files:
+                    count += 1
+                    total += os.path.getsize(os.path.join(root, file))
+        return {'objects': count, 'objects_mb': total / (1024 * 1024)}
+
+
+def main(argv=None):
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="จัดการที่เก็บรูปภาพสินค้าแบบ content-addressed")
+    parser.add_argument('command', choices=['stats', 'gc'],
+                        help="stats: แสดงสถิติ, gc: ลบไฟล์รูปที่ไม่มีสินค้าใช้แล้ว")
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data'))
+    args = parser.parse_args(argv)
+
+    store = ImageStore(args.data_dir)
+    if args.command == 'gc':
+        try:
+            from src.catalog_store import load_catalog
+        except ImportError:  # รันโดยตรงด้วย python src/image_store.py
+            from catalog_store import load_catalog
+        products_data = load_catalog(args.data_dir)
+        removed, freed = store.gc(p for product in products_data.values() for p in product['images'])
+        print(f"ลบไฟล์ที่ไม่ได้ใช้ {removed} ไฟล์ ({freed / (1024 * 1024):.1f} MB)")
+
+    for key, value in store.stats().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
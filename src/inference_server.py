@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
+
+try:
+    from src.evaluation import prepare_tflite_input, dequantize_output, load_retired_mask
+    from src.image_decode import decode_image_bytes
+    from src.model_registry import ModelRegistry
+except ImportError:  # รันโดยตรงด้วย python src/inference_server.py
+    from evaluation import prepare_tflite_input, dequantize_output, load_retired_mask
+    from image_decode import decode_image_bytes
+    from model_registry import ModelRegistry
+
+
+class Overloaded(Exception):
+    """คิวเต็ม (ตอบ 503 ให้ client ลองใหม่)"""
+
+
+class DeadlineExceeded(Exception):
+    """รอในคิวนานเกิน max_latency_ms (ตอบ 504)"""
+
+
+class LoadedModel:
+    """โมเดลหนึ่งรุ่น: class_names และ pool ของ interpreter (interpreter หนึ่งตัวใช้ได้ทีละ thread)"""
+
+    def __init__(self, model_dir, num_interpreters=2, threads_per_interpreter=1):
+        self.model_dir = model_dir
+        self.tflite_path = os.path.join(model_dir, "product_classifier.tflite")
+        with open(os.path.join(model_dir, "class_names.json"), 'r', encoding='utf-8') as f:
+            self.class_names = json.load(f)
+
+        # class ที่ retired ยังมี output อยู่ (ID ถาวร) แต่ไม่ควรถูกตอบกลับ
+        self.retired = load_retired_mask(model_dir, len(self.class_names))
+
+        manifest_path = os.path.join(model_dir, "manifest.json")
+        self.manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        self.run_id = self.manifest.get('run_id')
+        self.model_sha256 = self.manifest.get('model_sha256')
+
+        self.pool = queue.Queue()
+        for _ in range(num_interpreters):
+            interpreter = tf.lite.Interpreter(model_path=self.tflite_path, num_threads=threads_per_interpreter)
+            interpreter.allocate_tensors()
+            self.pool.put([interpreter, 1])  # [interpreter, batch size ที่ allocate ไว้]
+        shape = interpreter.get_input_details()[0]['shape']
+        self.input_size = (int(shape[1]), int(shape[2]))
+
+    def info(self):
+        return {'run_id': self.run_id, 'model_sha256': self.model_sha256, 'model_dir': self.model_dir,
+                'num_classes': len(self.class_names), 'input_size': list(self.input_size)}
+
+    def predict(self, x):
+        """รัน batch (float32 [-1, 1]) บน interpreter ว่างตัวหนึ่งใน pool คืนค่า probability [B, num_classes]"""
+        slot = self.pool.get()
+        try:
+            interpreter, allocated = slot
+            input_detail = interpreter.get_input_details()[0]
+            if len(x) != allocated:
+                # allocate ใหม่เฉพาะเมื่อขนาด batch เปลี่ยน
+                interpreter.resize_tensor_input(input_detail['index'], [len(x), *self.input_size, 3])
+                interpreter.allocate_tensors()
+                slot[1] = len(x)
+                input_detail = interpreter.get_input_details()[0]
+            output_detail = interpreter.get_output_details()[0]
+            interpreter.set_tensor(input_detail['index'], prepare_tflite_input(x, input_detail))
+            interpreter.invoke()
+            return dequantize_output(interpreter.get_tensor(output_detail['index']), output_detail)
+        finally:
+            self.pool.put(slot)
+
+
+class ServerMetrics:
+    """ตัวนับและ latency ล่าสุด (percentile คำนวณจาก window ของ request ล่าสุด)"""
+
+    def __init__(self, window=2048):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {'requests': 0, 'images': 0, 'batches': 0, 'rejected': 0, 'timeouts': 0,
+                         'errors': 0, 'reloads': 0}
+        self.batch_sizes = {}
+        self.latency_ms = deque(maxlen=window)
+        self.queue_ms = deque(maxlen=window)
+        self.inference_ms = deque(maxlen=window)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def record_batch(self, size, queue_ms, inference_ms):
+        with self.lock:
+            self.counters['batches'] += 1
+            self.counters['images'] += size
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.queue_ms.extend(queue_ms)
+            self.inference_ms.append(inference_ms)
+
+    def record_request(self, latency_ms):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.latency_ms.append(latency_ms)
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return None
+        values = np.asarray(values)
+        return {'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)), 'p99': float(np.percentile(values, 99))}
+
+    def snapshot(self):
+        with self.lock:
+            uptime = time.time() - self.started
+            batches = self.counters['batches']
+            return {
+                'uptime_sec': uptime,
+                **self.counters,
+                'images_per_sec': self.counters['images'] / uptime if uptime > 0 else 0.0,
+                'mean_batch_size': self.counters['images'] / batches if batches else 0.0,
+                'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                'latency_ms': self._percentiles(self.latency_ms),
+                'queue_wait_ms': self._percentiles(self.queue_ms),
+                'batch_inference_ms': self._percentiles(self.inference_ms),
+            }
+
+
+class _Pending:
+    __slots__ = ('image', 'enqueued', 'deadline', 'done', 'result', 'error')
+
+    def __init__(self, image, max_latency):
+        self.image = image
+        self.enqueued = time.perf_counter()
+        self.deadline = self.enqueued + max_latency
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceService:
+    """รวม request ที่มาใกล้กันเป็น batch (micro-batching) แล้วรันบน pool ของ interpreter
+
+    worker แต่ละ thread รอ request แรกแล้วเก็บ request ต่อไปอีกไม่เกิน batch_window_ms หรือจน batch เต็ม
+    คิวมีขนาดจำกัด (เต็มแล้วปฏิเสธทันที) และ request ที่รอเกิน max_latency_ms ถูกตัดทิ้งก่อนรัน
+    โมเดลถูกโหลดใหม่เมื่อ models/CURRENT เปลี่ยน โดย batch ที่กำลังรันใช้รุ่นเดิมจนเสร็จ
+    """
+
+    def __init__(self, model_dir, num_interpreters=2, threads_per_interpreter=1, max_batch_size=16,
+                 batch_window_ms=5.0, max_queue=256, max_latency_ms=1000.0, reload_interval=5.0):
+        self.registry = ModelRegistry(model_dir)
+        self.num_interpreters = num_interpreters
+        self.threads_per_interpreter = threads_per_interpreter
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_latency = max_latency_ms / 1000
+        self.reload_interval = reload_interval
+        self.requests = queue.Queue(maxsize=max_queue)
+        self.metrics = ServerMetrics()
+        self.stop_event = threading.Event()
+        self.model = None
+        self._model_key = None
+        self.reload()
+        if self.model is None:
+            raise FileNotFoundError(f"ไม่พบโมเดลที่ publish แล้วใน {model_dir}")
+
+        # worker หนึ่งตัวต่อ interpreter หนึ่งตัว ขณะหนึ่ง worker รัน อีกตัวรวม batch ถัดไปได้
+        self.threads = [threading.Thread(target=self._worker, daemon=True, name=f"inference-{i}")
+                        for i in range(num_interpreters)]
+        self.threads.append(threading.Thread(target=self._watch, daemon=True, name="model-watcher"))
+        for thread in self.threads:
+            thread.start()
+
+    def _current_key(self):
+        """ตัวบ่งชี้รุ่นของโมเดล: run id ของ CURRENT หรือ mtime ของไฟล์สำหรับ models/ แบบเดิม"""
+        run_id = self.registry.current()
+        if run_id:
+            return run_id, self.registry.run_dir(run_id)
+        tflite_path = os.path.join(self.registry.model_dir, "product_classifier.tflite")
+        if not os.path.exists(tflite_path):
+            return None, None
+        return os.path.getmtime(tflite_path), self.registry.model_dir
+
+    def reload(self):
+        """โหลดโมเดลใหม่ถ้ารุ่นเปลี่ยน (โหลดเสร็จก่อนจึงสลับ ถ้าโหลดไม่สำเร็จใช้รุ่นเดิมต่อ) คืนค่า True ถ้าสลับ"""
+        key, model_dir = self._current_key()
+        if key is None or key == self._model_key:
+            return False
+        try:
+            model = LoadedModel(model_dir, self.num_interpreters, self.threads_per_interpreter)
+        except Exception as e:
+            print(f"โหลดโมเดล {model_dir} ไม่สำเร็จ: {e}")
+            self.metrics.count('errors')
+            return False
+        previous = self.model
+        self.model = model
+        self._model_key = key
+        if previous is not None:
+            self.metrics.count('reloads')
+        print(f"ใช้งานโมเดล {model_dir} ({len(model.class_names)} คลาส, input {model.input_size})")
+        return True
+
+    def _watch(self):
+        while not self.stop_event.wait(self.reload_interval):
+            self.reload()
+
+    def submit(self, image, top_k=5):
+        """จัดคิวรูป RGB uint8 หนึ่งรูป รอผลแล้วคืนค่า (predictions, model)"""
+        start = time.perf_counter()
+        pending = _Pending(image, self.max_latency)
+        try:
+            self.requests.put_nowait(pending)
+        except queue.Full:
+            self.metrics.count('rejected')
+            raise Overloaded(f"คิวเต็ม ({self.requests.maxsize} request)")
+        # เผื่อเวลาให้ batch ที่เริ่มรันก่อน deadline ทำงานจนเสร็จ
+        if not pending.done.wait(self.max_latency * 2 + 1):
+            self.metrics.count('timeouts')
+            raise DeadlineExceeded("ไม่ได้ผลลัพธ์ภายในเวลาที่กำหนด")
+        if pending.error is not None:
+            raise pending.error
+        probs, model = pending.result
+        self.metrics.record_request((time.perf_counter() - start) * 1000)
+        return self._top_k(probs, model, top_k), model
+
+    @staticmethod
+    def _top_k(probs, model, top_k):
+        probs = np.where(model.retired, 0.0, probs)
+        top_k = min(top_k, len(probs))
+        indices = np.argpartition(-probs, top_k - 1)[:top_k]
+        indices = indices[np.argsort(-probs[indices])]
+        return [{'class_id': int(i), 'barcode': model.class_names[i], 'score': float(probs[i])}
+                for i in indices]
+
+    def _collect_batch(self):
+        """รอ request แรกแล้วเก็บ request ที่มาภายใน batch window (ไม่เกิน max_batch_size)"""
+        try:
+            first = self.requests.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        window_end = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            now = time.perf_counter()
+            live = []
+            for pending in batch:
+                if now > pending.deadline:
+                    self.metrics.count('timeouts')
+                    pending.error = DeadlineExceeded("รอในคิวนานเกินกำหนด")
+                    pending.done.set()
+                else:
+                    live.append(pending)
+            if not live:
+                continue
+
+            model = self.model
+            try:
+                # รูปที่ถูก decode ก่อนสลับรุ่นอาจมีขนาดไม่ตรงกับโมเดลใหม่
+                images = [p.image if p.image.shape[:2] == model.input_size
+                          else tf.image.resize(p.image, model.input_size).numpy() for p in live]
+                x = preprocess_input(np.stack(images).astype(np.float32))
+                start = time.perf_counter()
+                probs = model.predict(x)
+                inference_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                self.metrics.count('errors')
+                for pending in live:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            self.metrics.record_batch(len(live), [(start - p.enqueued) * 1000 for p in live], inference_ms)
+            for pending, row in zip(live, probs):
+                pending.result = (row, model)
+                pending.done.set()
+
+    def stats(self):
+        return dict(self.metrics.snapshot(), queue_depth=self.requests.qsize(),
+                    queue_capacity=self.requests.maxsize, model=self.model.info())
+
+    def close(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """POST /predict (body = ไฟล์รูป JPEG/PNG, ?top_k=5), GET /metrics, GET /health"""
+
+    service = None
+    max_body_bytes = 20 * 1024 * 1024
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            self._send_json(200, self.service.stats())
+        elif path == '/health':
+            self._send_json(200, {'status': 'ok', 'model': self.service.model.info()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > self.max_body_bytes:
+            self._send_json(400, {'error': 'ต้องส่งไฟล์รูปใน body (ไม่เกิน 20 MB)'})
+            return
+        try:
+            top_k = int(parse_qs(url.query).get('top_k', ['5'])[0])
+        except ValueError:
+            self._send_json(400, {'error': 'top_k ต้องเป็นตัวเลข'})
+            return
+
+        start = time.perf_counter()
+        model = self.service.model
+        # decode ใน thread ของ request เอง (OpenCV ปล่อย GIL) worker จึงรันเฉพาะ inference
+        image = decode_image_bytes(self.rfile.read(length), model.input_size[::-1])
+        if image is None:
+            self._send_json(400, {'error': 'อ่านไฟล์รูปภาพไม่ได้'})
+            return
+        try:
+            predictions, model = self.service.submit(image, max(1, top_k))
+        except Overloaded as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        except DeadlineExceeded as e:
+            self._send_json(504, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {
+            'predictions': predictions,
+            'run_id': model.run_id,
+            'model_sha256': model.model_sha256,
+            'latency_ms': (time.perf_counter() - start) * 1000,
+        })
+
+    def log_message(self, format, *args):
+        pass  # ไม่ log ทุก request (ดูสถิติได้ที่ /metrics)
+
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer ที่ backlog ของ socket ใหญ่พอกับคิวของ service
+
+    ค่าเริ่มต้นของ socketserver คือ 5 connection เมื่อมี client พร้อมกันมาก kernel จะตัด connection ทิ้ง
+    ก่อนถึงการตรวจคิว (ตอบ 503) จึงตั้ง request_queue_size ตาม max_queue
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, request_queue_size=256):
+        self.request_queue_size = request_queue_size
+        super().__init__(server_address, handler_class)
+
+
+def serve(service, host='127.0.0.1', port=8080):
+    handler = type('Handler', (InferenceRequestHandler,), {'service': service})
+    server = InferenceHTTPServer((host, port), handler, request_queue_size=max(service.requests.maxsize, 5))
+    print(f"inference server ทำงานที่ http://{host}:{port} (POST /predict, GET /metrics, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def main(argv=None):
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="HTTP server จำแนกรูปสินค้าด้วย .tflite พร้อม micro-batching")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model-dir', default=os.path.join(project_root, 'models'),
+                        help="โฟลเดอร์ models (ใช้รุ่นของ CURRENT และโหลดใหม่อัตโนมัติเมื่อ publish รุ่นใหม่)")
+    parser.add_argument('--interpreters', type=int, default=2, help="จำนวน interpreter (= จำนวน batch ที่รันพร้อมกัน)")
+    parser.add_argument('--threads', type=int, default=1, help="จำนวน thread ต่อ interpreter")
+    parser.add_argument('--max-batch', type=int, default=16, help="จำนวนรูปสูงสุดต่อ batch")
+    parser.add_argument('--batch-window-ms', type=float, default=5.0,
+                        help="เวลาที่รอ request เพิ่มหลัง request แรกของ batch")
+    parser.add_argument('--max-queue', type=int, default=256, help="จำนวน request ที่รอในคิวได้ (เกินตอบ 503)")
+    parser.add_argument('--max-latency-ms', type=float, default=1000.0,
+                        help="request ที่รอในคิวนานกว่านี้ถูกตัดทิ้ง (ตอบ 504)")
+    parser.add_argument('--reload-interval', type=float, default=5.0, help="ตรวจรุ่นของโมเดลทุกกี่วินาที")
+    args = parser.parse_args(argv)
+
+    service = InferenceService(
+        args.model_dir,
+        num_interpreters=args.interpreters,
+        threads_per_interpreter=args.threads,
+        max_batch_size=args.max_batch,
+        batch_window_ms=args.batch_window_ms,
+        max_queue=args.max_queue,
+        max_latency_ms=args.max_latency_ms,
+        reload_interval=args.reload_interval,
+    )
+    serve(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import json
+import argparse
+import threading
+from datetime import datetime
+
+REGISTRY_VERSION = 1
+
+
+class LabelRegistry:
+    """กำหนด class ID ถาวรให้แต่ละบาร์โค้ด (ID = index ของ output layer)
+
+    สินค้าใหม่ได้ ID ถัดไปเสมอ สินค้าที่ถูกลบถูกทำเครื่องหมาย retired (tombstone) และ ID นั้นไม่ถูกนำไปใช้ซ้ำ
+    class_names.json ที่อุปกรณ์ถืออยู่จึงยังใช้ได้กับโมเดลใหม่: index เดิมยังเป็นบาร์โค้ดเดิมเสมอ
+    ถ้าสินค้าที่เคยลบกลับมา จะได้ ID เดิมคืน
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.entries = []  # index = ID
+        self._index = {}  # barcode -> ID
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != REGISTRY_VERSION:
+                raise ValueError(f"ไม่รองรับรูปแบบ label registry: {data.get('format')}")
+            self.version = data['version']
+            self.entries = data['labels']
+            self._index = {entry['barcode']: entry['id'] for entry in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, barcode):
+        return barcode in self._index
+
+    def id_of(self, barcode):
+        """ID ของบาร์โค้ด (KeyError ถ้าไม่เคยลงทะเบียน)"""
+        return self._index[barcode]
+
+    def class_names(self):
+        """รายชื่อบาร์โค้ดตาม ID (รวม ID ที่ retired เพื่อให้ index คงที่)"""
+        return [entry['barcode'] for entry in self.entries]
+
+    def active(self):
+        return [entry['barcode'] for entry in self.entries if not entry['retired']]
+
+    def retired(self):
+        return [entry['barcode'] for entry in self.entries if entry['retired']]
+
+    def sync(self, barcodes, seed=None, save=True):
+        """ลงทะเบียนบาร์โค้ดใหม่และ retire บาร์โค้ดที่ไม่อยู่ในแคตตาล็อกแล้ว บันทึกถ้ามีการเปลี่ยนแปลง
+
+        seed: class_names ของโมเดลที่ใช้งานอยู่ (ใช้ครั้งแรกที่ยังไม่มี registry เพื่อให้ index ตรงกับของเดิม)
+        save=False: อัปเดตเฉพาะในหน่วยความจำ (ไม่เขียนไฟล์และไม่เพิ่ม version) สำหรับผู้ที่อ่านอย่างเดียว
+        คืนค่า (added, retired) เป็นรายการบาร์โค้ด
+        """
+        now = datetime.now().isoformat()
+        current = list(dict.fromkeys(barcodes))
+        current_set = set(current)
+        added = []
+        retired = []
+
+        if not self.entries and seed:
+            for barcode in dict.fromkeys(seed):
+                self._add(barcode, now)
+
+        for barcode in current:
+            if barcode not in self._index:
+                self._add(barcode, now)
+                added.append(barcode)
+            else:
+                entry = self.entries[self._index[barcode]]
+                if entry['retired']:
+                    entry['retired'] = False
+                    entry['retired_at'] = None
+                    added.append(barcode)
+
+        for entry in self.entries:
+            if not entry['retired'] and entry['barcode'] not in current_set:
+                entry['retired'] = True
+                entry['retired_at'] = now
+                retired.append(entry['barcode'])
+
+        if save and (added or retired or not os.path.exists(self.path)):
+            self.version += 1
+            self.save()
+        return added, retired
+
+    def _add(self, barcode, now):
+        self._index[barcode] = len(self.entries)
+        self.entries.append({'id': len(self.entries), 'barcode': barcode, 'retired': False,
+                             'created_at': now, 'retired_at': None})
+
+    def to_dict(self):
+        return {'format': REGISTRY_VERSION, 'version': self.version, 'labels': self.entries}
+
+    def save(self):
+        """บันทึกแบบ atomic (ชื่อไฟล์ชั่วคราวไม่ซ้ำกันระหว่าง process/thread ที่ sync พร้อมกัน)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def export_label_map(self, path, class_names=None):
+        """เขียน label map ของโมเดล (ID, บาร์โค้ด, retired และ version ของ registry) ให้แอปใช้คู่กับ class_names.json"""
+        names = class_names if class_names is not None else self.class_names()
+        labels = []
+        for class_id, barcode in enumerate(names):
+            entry = self.entries[self._index[barcode]] if barcode in self._index else None
+            labels.append({'id': class_id, 'barcode': barcode,
+                           'retired': bool(entry['retired']) if entry else False})
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'num_classes': len(names), 'labels': labels},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def registry_path(data_dir):
+    return os.path.join(data_dir, "label_registry.json")
+
+
+def main(argv=None):
+    try:
+        from src.catalog_store import load_catalog
+    except ImportError:  # รันโดยตรงด้วย python src/label_registry.py
+        from catalog_store import load_catalog
+
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="จัดการ class ID ถาวรของสินค้า")
+    parser.add_argument('command', choices=['sync', 'stats', 'list'],
+                        help="sync: อัปเดตจากแคตตาล็อก, stats: สถิติ, list: แสดง ID ทั้งหมด")
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data'))
+    args = parser.parse_args(argv)
+
+    registry = LabelRegistry(registry_path(args.data_dir))
+    if args.command == 'sync':
+        added, retired = registry.sync(load_catalog(args.data_dir).keys())
+        print(f"เพิ่ม {len(added)} รายการ, retire {len(retired)} รายการ")
+    elif args.command == 'list':
+        for entry in registry.entries:
+            status = " (retired)" if entry['retired'] else ""
+            print(f"{entry['id']:6d}  {entry['barcode']}{status}")
+
+    print(f"version: {registry.version}")
+    print(f"class ID ทั้งหมด: {len(registry)} (ใช้งาน {len(registry.active())}, retired {len(registry.retired())})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import uuid
+from datetime import datetime
+
+try:
+    from src.image_store import file_sha256
+except ImportError:  # รันโดยตรงด้วย python src/model_registry.py
+    from image_store import file_sha256
+
+RUNS_DIR = "runs"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+class ModelRegistry:
+    """เก็บผลการเทรนแต่ละครั้งใน models/runs/<เวลา>-<id>/ และชี้รุ่นที่ใช้งานด้วยไฟล์ models/CURRENT
+
+    การเทรนเขียนไฟล์ลงโฟลเดอร์ของ run ตัวเองเท่านั้น เมื่อเสร็จจะเขียน manifest.json (sha256 ของทุกไฟล์,
+    version ของ class map, metrics และการตั้งค่า) แล้วสลับ CURRENT ด้วย os.replace (atomic)
+    ผู้ใช้โมเดลจึงเห็นทั้งชุดเดิมหรือทั้งชุดใหม่เสมอ และ rollback ได้โดยชี้ CURRENT กลับ
+    """
+
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self.runs_dir = os.path.join(model_dir, RUNS_DIR)
+        self.current_path = os.path.join(model_dir, CURRENT_FILE)
+
+    def new_run(self):
+        """สร้างโฟลเดอร์ของ run ใหม่ คืนค่า (run_id, path)"""
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        run_dir = os.path.join(self.runs_dir, run_id)
+        os.makedirs(run_dir)
+        return run_id, run_dir
+
+    def run_dir(self, run_id):
+        return os.path.join(self.runs_dir, run_id)
+
+    def current(self):
+        """run id ที่ใช้งานอยู่ (None ถ้ายังไม่เคย publish)"""
+        try:
+            with open(self.current_path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_dir(self):
+        run_id = self.current()
+        return self.run_dir(run_id) if run_id else None
+
+    def read_manifest(self, run_id=None):
+        """อ่าน manifest (เล็ก ไม่ต้องโหลดโมเดล) ของ run ที่ระบุหรือของ CURRENT"""
+        run_id = run_id or self.current()
+        if run_id is None:
+            return None
+        path = os.path.join(self.run_dir(run_id), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_manifest(self, run_id, metrics=None, config=None, class_map_version=None):
+        """คำนวณ sha256 ของทุกไฟล์ใน run แล้วเขียน manifest.json แบบ atomic"""
+        run_dir = self.run_dir(run_id)
+        files = {}
+        for root, dirs, names in os.walk(run_dir):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, run_dir).replace(os.sep, '/')
+                if rel == MANIFEST_FILE or name.endswith('.tmp'):
+                    continue
+                files[rel] = {'sha256': file_sha256(path), 'bytes': os.path.getsize(path)}
+
+        # version ของเนื้อหาโมเดล = hash ของไฟล์ที่แอปใช้ (ใช้เทียบว่าต้องดาวน์โหลดใหม่หรือไม่)
+        digest = hashlib.sha256()
+        for rel in ('product_classifier.tflite', 'class_names.json'):
+            if rel in files:
+                digest.update(files[rel]['sha256'].encode('ascii'))
+        manifest = {
+            'run_id': run_id,
+            'created_at': datetime.now().isoformat(),
+            'model_sha256': digest.hexdigest(),
+            'class_map_version': class_map_version,
+            'metrics': metrics or {},
+            'config': config or {},
+            'files': files,
+        }
+        path = os.path.join(run_dir, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return manifest
+
+    def set_current(self, run_id):
+        """ชี้ CURRENT ไปยัง run ที่มี manifest แล้ว (สลับแบบ atomic)"""
+        if self.read_manifest(run_id) is None:
+            raise ValueError(f"run {run_id} ยังไม่มี manifest (ยังเทรนไม่เสร็จหรือไม่มีอยู่)")
+        tmp_path = self.current_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(run_id + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+
+    def publish(self, run_id, metrics=None, config=None, class_map_version=None):
+        """เขียน manifest แล้วตั้งเป็น CURRENT คืนค่า manifest"""
+        manifest = self.write_manifest(run_id, metrics, config, class_map_version)
+        self.set_current(run_id)
+        return manifest
+
+    def verify(self, run_id=None):
+        """ตรวจ sha256 ของทุกไฟล์เทียบกับ manifest คืนค่ารายการไฟล์ที่ไม่ตรง"""
+        manifest = self.read_manifest(run_id)
+        if manifest is None:
+            raise ValueError("ไม่พบ manifest")
+        run_dir = self.run_dir(manifest['run_id'])
+        bad = []
+        for rel, info in manifest['files'].items():
+            path = os.path.join(run_dir, rel)
+            if not os.path.exists(path) or file_sha256(path) != info['sha256']:
+                bad.append(rel)
+        return bad
+
+    def list_runs(self):
+        """ทุก run เรียงจากเก่าไปใหม่ คืนค่า [(run_id, manifest หรือ None)]"""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        return [(run_id, self.read_manifest(run_id)) for run_id in sorted(os.listdir(self.runs_dir))
+                if os.path.isdir(self.run_dir(run_id))]
+
+    def prune(self, keep=5):
+        """ลบ run เก่า เก็บ run ที่ publish แล้ว keep รุ่นล่าสุด (CURRENT ไม่ถูกลบเสมอ) และลบ run ที่ไม่เสร็จ
+        ยกเว้น run ล่าสุด (อาจกำลังเทรนอยู่)"""
+        current = self.current()
+        runs = self.list_runs()
+        published = [run_id for run_id, manifest in runs if manifest is not None]
+        keep_ids = set(published[-keep:]) | {current}
+        if runs:
+            keep_ids.add(runs[-1][0])
+        removed = []
+        for run_id, _ in runs:
+            if run_id not in keep_ids:
+                shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+                removed.append(run_id)
+        return removed
+
+
+def current_model_dir(model_dir):
+    """โฟลเดอร์ของโมเดลที่ใช้งานอยู่ (run ของ CURRENT หรือ model_dir เองสำหรับโมเดลแบบเดิม)"""
+    return ModelRegistry(model_dir).current_dir() or model_dir
+
+
+def main(argv=None):
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="จัดการรุ่นของโมเดลที่เทรนแล้ว")
+    parser.add_argument('command', choices=['list', 'current', 'rollback', 'verify', 'prune'],
+                        help="list: ทุกรุ่น, current: รุ่นที่ใช้งาน, rollback: ตั้ง CURRENT เป็น run ที่ระบุ, "
+                             "verify: ตรวจ sha256, prune: ลบรุ่นเก่า")
+    parser.add_argument('run_id', nargs='?', default=None)
+    parser.add_argument('--keep', type=int, default=5, help="จำนวนรุ่นที่เก็บไว้เมื่อ prune")
+    parser.add_argument('--model-dir', default=os.path.join(project_root, 'models'))
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.model_dir)
+    current = registry.current()
+    if args.command == 'list':
+        for run_id, manifest in registry.list_runs():
+            marker = '*' if run_id == current else ' '
+            if manifest is None:
+                print(f"{marker} {run_id}  (ไม่เสร็จ)")
+                continue
+            accuracy = manifest['metrics'].get('validation_accuracy')
+            accuracy = '-' if accuracy is None else f"{accuracy:.4f}"
+            print(f"{marker} {run_id}  accuracy={accuracy}  classes={manifest['metrics'].get('num_classes')}  "
+                  f"class_map_version={manifest['class_map_version']}")
+    elif args.command == 'current':
+        manifest = registry.read_manifest()
+        print(json.dumps(manifest, ensure_ascii=False, indent=2) if manifest else "ยังไม่มีโมเดลที่ publish")
+    elif args.command == 'rollback':
+        if not args.run_id:
+            parser.error("ต้องระบุ run_id")
+        registry.set_current(args.run_id)
+        print(f"CURRENT -> {args.run_id}")
+    elif args.command == 'verify':
+        bad = registry.verify(args.run_id)
+        print("ไฟล์ถูกต้องทั้งหมด" if not bad else f"ไฟล์ไม่ตรงกับ manifest: {', '.join(bad)}")
+    elif args.command == 'prune':
+        removed = registry.prune(args.keep)
+        print(f"ลบ {len(removed)} รุ่น")
+
+
+if __name__ == "__main__":
+    main()
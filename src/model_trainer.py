@@ -5,180 +5,846 @@ from tensorflow.keras import layers # type: ignore
 import numpy as np
 import os
 import json
+import time
+import shutil
+import hashlib
+import argparse
 from PIL import Image
-import cv2
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
+import matplotlib
+matplotlib.use('Agg')  # วาดกราฟได้จาก worker thread ของ GUI (ไม่ต้องใช้หน้าต่าง)
 import matplotlib.pyplot as plt
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
 from sklearn.utils.class_weight import compute_class_weight
+
+try:
+    from src.image_cache import DecodedImageCache
+    from src.bottleneck_cache import BottleneckFeatureCache
+    from src.image_decode import decode_image_uint8, decode_images
+    from src.catalog_store import load_catalog
+    from src.run_report import RunReport
+    from src.augmentation import augment_dataset, BatchAugmentation
+    from src.evaluation import evaluate_keras
+    from src.tfrecord_export import TFRecordExporter
+    from src.label_registry import LabelRegistry, registry_path
+    from src.model_registry import ModelRegistry, current_model_dir
+except ImportError:  # รันโดยตรงด้วย python src/model_trainer.py
+    from image_cache import DecodedImageCache
+    from bottleneck_cache import BottleneckFeatureCache
+    from image_decode import decode_image_uint8, decode_images
+    from catalog_store import load_catalog
+    from run_report import RunReport
+    from augmentation import augment_dataset, BatchAugmentation
+    from evaluation import evaluate_keras
+    from tfrecord_export import TFRecordExporter
+    from label_registry import LabelRegistry, registry_path
+    from model_registry import ModelRegistry, current_model_dir
  
+
+def cpu_supports_bfloat16():
+    """CPU รองรับคำสั่ง bfloat16 (AVX512-BF16 หรือ AMX) หรือไม่ (ตรวจได้เฉพาะบน Linux)"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+# backbone ที่เลือกได้ -> ชื่อคลาสใน tf.keras.applications
+# ทุกตัวรับ input ช่วง [-1, 1] (preprocess_input ของ MobileNetV2) จึงใช้ pipeline และไฟล์ TFLite แบบเดียวกัน
+BACKBONES = {
+    'mobilenet_v2': 'MobileNetV2',
+    'mobilenet_v3_small': 'MobileNetV3Small',
+    'mobilenet_v3_large': 'MobileNetV3Large',
+}
+
+
+class TrainingCancelled(Exception):
+    """ถูกยกเลิกการเทรนระหว่างทำงาน"""
+
+
+class TrainingControlCallback(tf.keras.callbacks.Callback):
+    """ส่งค่า metrics ทุก epoch ให้ progress_callback และหยุดการเทรนเมื่อถูกยกเลิก"""
+    
+    def __init__(self, progress_callback=None, cancel_event=None):
+        super().__init__()
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+    
+    def on_train_batch_end(self, batch, logs=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.model.stop_training = True
+    
+    def on_epoch_end(self, epoch, logs=None):
+        if self.progress_callback:
+            metrics = {key: float(value) for key, value in (logs or {}).items()}
+            self.progress_callback(epoch + 1, self.params.get('epochs'), metrics)
+
+
+class EpochTimingCallback(tf.keras.callbacks.Callback):
+    """บันทึกเวลาต่อ epoch, เวลาต่อ step และจำนวนรูป/วินาทีลงใน RunReport"""
+    
+    def __init__(self, report, phase, num_samples):
+        super().__init__()
+        self.report = report
+        self.phase = phase
+        self.num_samples = num_samples
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+        self.train_end = self.epoch_start
+        self.step_times = []
+    
+    def on_train_batch_begin(self, batch, logs=None):
+        self.batch_start = time.perf_counter()
+    
+    def on_train_batch_end(self, batch, logs=None):
+        self.train_end = time.perf_counter()
+        self.step_times.append(self.train_end - self.batch_start)
+    
+    def on_epoch_end(self, epoch, logs=None):
+        train_seconds = self.train_end - self.epoch_start
+        step_ms = np.array(self.step_times) * 1000 if self.step_times else np.zeros(1)
+        self.report.add_epoch({
+            'phase': self.phase,
+            'epoch': epoch + 1,
+            'epoch_seconds': time.perf_counter() - self.epoch_start,
+            'train_seconds': train_seconds,
+            'steps': len(self.step_times),
+            'step_ms_mean': float(step_ms.mean()),
+            'step_ms_p50': float(np.percentile(step_ms, 50)),
+            'step_ms_max': float(step_ms.max()),
+            'images_per_sec': self.num_samples / train_seconds if train_seconds > 0 else 0.0,
+            'metrics': {key: float(value) for key, value in (logs or {}).items()},
+        })
+
+
+class CheckpointCallback(tf.keras.callbacks.Callback):
+    """บันทึก checkpoint (weights + optimizer) และสถานะการเทรนทุก trainer.checkpoint_every epoch
+    
+    target_model คือโมเดลหลัก (ไม่ใช่ wrapper ของ augmentation หรือ head ของ bottleneck ที่ใช้ fit)
+    ส่วน optimizer มาจากโมเดลที่ fit ถ้ามี restore_path จะคืนค่าทั้งสองอย่างก่อนเริ่มเทรน
+    """
+    
+    def __init__(self, trainer, target_model, phase, restore_path=None):
+        super().__init__()
+        self.trainer = trainer
+        self.target_model = target_model
+        self.phase = phase
+        self.restore_path = restore_path
+    
+    def on_train_begin(self, logs=None):
+        if self.restore_path:
+            self.trainer.restore_checkpoint(self.restore_path, self.target_model, self.model)
+            self.restore_path = None
+    
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.trainer.checkpoint_history.setdefault(key, []).append(float(value))
+        if (epoch + 1) % self.trainer.checkpoint_every == 0:
+            self.trainer.save_checkpoint(self.target_model, self.model.optimizer, self.phase, epoch + 1)
+
+
 class ProductClassifierTrainer:
-    def __init__(self, data_dir=None, model_dir=None):
+    def __init__(self, data_dir=None, model_dir=None, streaming=False, use_image_cache=True,
+                 bottleneck_features=False, decode_workers=None, incremental=False,
+                 replay_per_class=20, incremental_epochs=10, progress_callback=None,
+                 cancel_event=None, quantization='dynamic', int8_io='uint8',
+                 calibration_samples=200, intra_op_threads=None, inter_op_threads=None,
+                 jit_compile=False, mixed_precision='none', profile_batches=None,
+                 augmentation_placement='pipeline', augmentation_seed=42, batch_size=32,
+                 epochs=50, learning_rate=1e-3, fine_tune_learning_rate=1e-5, dropout=0.2,
+                 fine_tune_layers=40, extra_callbacks=None, backbone='mobilenet_v2', alpha=1.0,
+                 img_size=224, checkpoint_every=1, resume=False, tfrecords=False, tfrecord_shards=64,
+                 tfrecord_format='jpeg', versioned=True):
         # ทำให้ Path อ้างอิงจาก root ของโปรเจกต์เสมอ
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         self.data_dir = data_dir if data_dir else os.path.join(project_root, 'data')
         self.model_dir = model_dir if model_dir else os.path.join(project_root, 'models')
         
         self.products_json_path = os.path.join(self.data_dir, "products.json")
-        self.img_size = (224, 224)  # ขนาดรูปภาพสำหรับโมเดล
-        self.batch_size = 32
-        self.epochs = 50
+        # backbone, width multiplier (alpha) และขนาดรูปภาพสำหรับโมเดล (int = รูปจัตุรัส)
+        if backbone not in BACKBONES:
+            raise ValueError(f"ไม่รู้จัก backbone: {backbone}")
+        self.backbone = backbone
+        self.alpha = alpha
+        self.img_size = (img_size, img_size) if isinstance(img_size, int) else tuple(img_size)
+        # hyperparameters (ปรับได้จาก constructor หรือค้นหาด้วย src/hparam_search.py)
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.learning_rate = learning_rate  # รอบที่ 1 (เฉพาะ head)
+        self.fine_tune_learning_rate = fine_tune_learning_rate  # รอบที่ 2 (fine-tune)
+        self.dropout = dropout
+        self.fine_tune_layers = fine_tune_layers  # จำนวนชั้นท้ายของ backbone ที่ fine-tune
+        # callbacks เพิ่มเติมที่ใส่ในทั้งสองรอบของการเทรน (เช่น pruning ของ hparam search)
+        self.extra_callbacks = list(extra_callbacks or [])
+        # streaming=True: อ่านและ decode รูปภาพทีละ batch ผ่าน tf.data แทนการโหลดทั้งหมดลง RAM
+        # tfrecords=True: อ่านจากไฟล์ TFRecord แบบแบ่ง shard ใน data/.tfrecords (เป็นโหมด streaming เสมอ)
+        self.streaming = streaming or tfrecords
+        self.tfrecords = tfrecords
+        self.tfrecord_shards = tfrecord_shards
+        self.tfrecord_format = tfrecord_format  # 'jpeg' หรือ 'raw'
+        # จำนวน process สำหรับ decode รูปภาพ (None = ใช้ทุก core, 1 = decode บน process เดียว)
+        self.decode_workers = decode_workers
+        self.decode_errors = []
+        # incremental=True: warm-start จากโมเดลครั้งก่อน เมื่อมีสินค้าใหม่เพิ่มเข้ามา
+        self.incremental = incremental
+        self.replay_per_class = replay_per_class  # จำนวนรูปเดิมสูงสุดต่อสินค้าที่ใช้ทบทวน
+        self.incremental_epochs = incremental_epochs
+        # progress_callback(epoch, epochs, metrics) ถูกเรียกทุก epoch
+        # cancel_event (threading.Event) ใช้ยกเลิกการเทรนจาก thread อื่น
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        # การ quantize ตอน export เป็น TFLite: 'none', 'dynamic', 'float16' หรือ 'int8'
+        self.quantization = quantization
+        self.int8_io = int8_io  # ชนิดของ input/output ในโหมด int8: 'uint8' หรือ 'int8'
+        self.calibration_samples = calibration_samples  # จำนวนรูปสำหรับ calibration (โหมด int8)
+        # การตั้งค่า engine บน CPU: จำนวน thread (None = ให้ TensorFlow เลือกเอง), XLA และ mixed precision
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.jit_compile = jit_compile
+        self.mixed_precision = mixed_precision  # 'none' หรือ 'bfloat16'
+        self.configure_engine()
+        # เวลาของแต่ละขั้นตอนและสถิติต่อ epoch (บันทึกที่ models/runs/<run_id>/run_report.json)
+        # profile_batches=(เริ่ม, จบ): เก็บ trace ของ TensorFlow profiler ช่วง batch นั้นในรอบแรก
+        self.profile_batches = profile_batches
+        # ตำแหน่งของ data augmentation: 'pipeline' (ใน tf.data หลัง batch), 'model' (ในกราฟของโมเดล)
+        # หรือ 'auto' (วัดความเร็วทั้งสองแบบก่อนเทรนแล้วเลือกแบบที่เร็วกว่า)
+        if augmentation_placement not in ('pipeline', 'model', 'auto'):
+            raise ValueError(f"ไม่รู้จักตำแหน่ง augmentation: {augmentation_placement}")
+        self.augmentation_placement = augmentation_placement
+        self.augmentation_seed = augmentation_seed
+        # checkpoint ทุก checkpoint_every epoch ใน models/checkpoints (0 = ไม่บันทึก)
+        # resume=True: เทรนต่อจาก checkpoint ล่าสุดถ้าการตั้งค่าและข้อมูลยังเหมือนเดิม
+        self.checkpoint_every = checkpoint_every
+        self.resume = resume
+        self.checkpoint_dir = os.path.join(self.model_dir, "checkpoints")
+        self.resume_state = None
+        self.checkpoint_history = {}
+        self.data_fingerprint = None  # hash ของรูป label และคลาสที่ใช้เทรน (ตรวจตอน resume)
+        self.num_classes = None
+        self.label_registry = None
+        self.labels_synced = False  # True หลัง train_model sync registry แล้ว
+        self.report = RunReport()
+        self.report.info['engine'] = self.engine_info()
+        self.report.info['model'] = self.model_info()
         
         # สร้างโฟลเดอร์ models หากยังไม่มี
         if not os.path.exists(self.model_dir):
             os.makedirs(self.model_dir)
+        
+        # versioned=True: ไฟล์ผลลัพธ์ของการเทรนเขียนลง models/runs/<run_id>/ แล้ว publish ด้วย models/CURRENT
+        # (False = เขียนทับใน models/ แบบเดิม) output_dir คือโฟลเดอร์ที่การเทรนครั้งนี้เขียนไฟล์
+        self.versioned = versioned
+        self.model_registry = ModelRegistry(self.model_dir)
+        self.run_id = None
+        self.output_dir = self.model_dir
+        
+        # แคชรูปภาพที่ decode แล้ว (uint8, memory-mapped) เพื่อไม่ต้อง decode JPEG ซ้ำทุกรอบ
+        self.image_cache = None
+        if use_image_cache:
+            self.image_cache = DecodedImageCache(
+                os.path.join(self.data_dir, '.image_cache'), self.img_size
+            )
+        
+        # bottleneck_features=True: รอบที่ 1 (backbone ถูก freeze) เทรน head บน features ที่คำนวณครั้งเดียว
+        self.bottleneck_features = bottleneck_features
+        self.bottleneck_cache = None
+        if bottleneck_features:
+            self.bottleneck_cache = BottleneckFeatureCache(
+                os.path.join(self.data_dir, '.image_cache'),
+                f"{self.backbone_tag()}_{self.img_size[0]}x{self.img_size[1]}"
+            )
+    
+    def configure_engine(self):
+        """ตั้งค่า thread pool ของ TensorFlow และตรวจว่าใช้ bfloat16 ได้หรือไม่
+        
+        จำนวน thread ต้องตั้งก่อน TensorFlow รัน op แรก ถ้าตั้งไม่ได้ (เช่น เทรนครั้งที่ 2 ใน GUI)
+        จะใช้ค่าเดิมต่อ ส่วน oneDNN เปิด/ปิดด้วย environment variable TF_ENABLE_ONEDNN_OPTS
+        ก่อน import tensorflow เท่านั้น
+        """
+        try:
+            if self.intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+            if self.inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+        except RuntimeError as e:
+            print(f"ไม่สามารถตั้งจำนวน thread ได้ (TensorFlow เริ่มทำงานแล้ว): {e}")
+        
+        if self.mixed_precision not in ('none', 'bfloat16'):
+            raise ValueError(f"ไม่รู้จักโหมด mixed precision: {self.mixed_precision}")
+        if self.mixed_precision == 'bfloat16' and not cpu_supports_bfloat16():
+            print("CPU ไม่รองรับ bfloat16 (AVX512-BF16/AMX) จะเทรนด้วย float32")
+            self.mixed_precision = 'none'
+    
+    def engine_info(self):
+        """การตั้งค่า engine ที่ใช้จริง (สำหรับบันทึกในรายงาน)"""
+        return {
+            'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+            'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+            'jit_compile': bool(self.jit_compile),
+            'mixed_precision': self.mixed_precision,
+            'onednn': os.environ.get('TF_ENABLE_ONEDNN_OPTS', 'default'),
+        }
+    
+    def backbone_tag(self):
+        """ชื่อสั้นของ backbone + alpha (ใช้ตั้งชื่อแคชและโฟลเดอร์ผลลัพธ์)"""
+        if self.alpha == 1.0:
+            return self.backbone
+        return f"{self.backbone}_{self.alpha:g}"
+    
+    def model_info(self):
+        """ข้อมูลของ input ที่โมเดลต้องการ (บันทึกเป็น models/model_info.json ให้แอปอ่าน)"""
+        return {
+            'backbone': self.backbone,
+            'alpha': self.alpha,
+            'img_size': list(self.img_size),
+            'input_range': [-1.0, 1.0],
+        }
     
     def load_products_data(self):
-        """โหลดข้อมูลสินค้าจากไฟล์ JSON"""
-        if not os.path.exists(self.products_json_path):
-            raise FileNotFoundError("ไม่พบไฟล์ข้อมูลสินค้า products.json")
+        """โหลดข้อมูลสินค้าจากแคตตาล็อก (data/catalog.db, นำเข้าจาก products.json ในครั้งแรก)"""
+        return load_catalog(self.data_dir)
+    
+    def sync_labels(self, products_data, save=True):
+        """อัปเดต label registry จากแคตตาล็อก คืนค่า class_names ตาม class ID ถาวร
+        
+        class ID ของสินค้าที่ถูกลบยังอยู่ (retired) เพื่อให้ index ของสินค้าอื่นไม่เลื่อน
+        ครั้งแรกที่ยังไม่มี registry จะเริ่มจาก class_names.json ของโมเดลปัจจุบัน (ถ้ามี)
+        บันทึก data/label_registry.json เฉพาะเมื่อ save=True (เรียกจาก train_model เท่านั้น)
+        """
+        self.label_registry = LabelRegistry(registry_path(self.data_dir))
+        seed = None
+        class_names_path = os.path.join(self.published_dir(), "class_names.json")
+        if len(self.label_registry) == 0 and os.path.exists(class_names_path):
+            with open(class_names_path, 'r', encoding='utf-8') as f:
+                seed = json.load(f)
+        added, retired = self.label_registry.sync(products_data.keys(), seed=seed, save=save)
+        self.labels_synced = save
+        if save and (added or retired):
+            print(f"label registry: เพิ่ม {len(added)} รายการ, retired {len(retired)} รายการ "
+                  f"(version {self.label_registry.version})")
+        return self.label_registry.class_names()
+    
+    def retired_mask(self, class_names):
+        """mask ของคลาสที่ retired ตามลำดับ class_names (ใช้ตอนประเมินและบันทึก model_info.json)"""
+        retired = set(self.label_registry.retired()) if self.label_registry is not None else set()
+        return np.array([barcode in retired for barcode in class_names], dtype=bool)
+    
+    def current_labels(self, products_data):
+        """class_names ตาม registry ปัจจุบันโดยไม่เขียนไฟล์ (evaluation, benchmark, calibration, hparam)
         
-        with open(self.products_json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        ระหว่าง train_model ใช้ registry ที่ sync แล้ว นอกนั้นอ่านจากไฟล์และให้ ID ชั่วคราว
+        กับสินค้าที่ยังไม่ลงทะเบียนเฉพาะในหน่วยความจำ
+        """
+        if self.labels_synced:
+            return self.label_registry.class_names()
+        return self.sync_labels(products_data, save=False)
     
-    def prepare_data(self):
-        """เตรียมข้อมูลสำหรับการเทรน"""
+    def prepare_data(self, samples=None):
+        """เตรียมข้อมูลสำหรับการเทรน (samples = (paths, labels, class_names) ถ้าไม่ใช้ทั้งแคตตาล็อก)"""
         print("กำลังโหลดและเตรียมข้อมูล...")
         
+        paths, labels, class_names = samples if samples is not None else self.collect_image_paths()
+        
+        # โหลดรูปภาพ (รูปที่อยู่ในแคชแล้วจะไม่ถูก decode ซ้ำ)
+        with self.report.stage('decode', images=len(paths)):
+            images, ok = self.load_images_uint8(paths)
+        images = images[ok]
+        y = labels[ok]
+        paths = [p for p, loaded in zip(paths, ok) if loaded]
+        
+        if len(images) == 0:
+            raise ValueError("ไม่พบรูปภาพที่สามารถใช้งานได้")
+        
+        print(f"โหลดรูปภาพทั้งหมด: {len(images)} รูป")
+        
+        # แปลงเป็น float32 และ scale เป็น [-1, 1] ตาม MobileNetV2
+        with self.report.stage('preprocess'):
+            X = preprocess_input(images.astype(np.float32))
+        del images
+        
+        # แบ่งข้อมูล train/validation
+        with self.report.stage('split'):
+            train_idx, val_idx = self.split_indices(y, paths, class_names)
+            X_train, X_val = X[train_idx], X[val_idx]
+            y_train, y_val = y[train_idx], y[val_idx]
+            del X
+            self._record_split(paths, y, train_idx, val_idx)
+        
+        print(f"Training set: {len(X_train)} รูป")
+        print(f"Validation set: {len(X_val)} รูป")
+        
+        return X_train, X_val, y_train, y_val, class_names
+    
+    def check_cancelled(self):
+        """ยกเลิกการทำงานถ้ามีการสั่งยกเลิกจาก thread อื่น"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise TrainingCancelled("ยกเลิกการเทรนแล้ว")
+    
+    def decode_images(self, paths, indices=None):
+        """decode รูปภาพตามลำดับ (ขนานด้วย process pool ตาม decode_workers) yield (i, img)
+        
+        รูปที่อ่านไม่ได้จะได้ img เป็น None และถูกบันทึกไว้ใน self.decode_errors
+        """
+        if indices is None:
+            indices = range(len(paths))
+        indices = list(indices)
+        
+        results = decode_images(
+            [paths[i] for i in indices], self.img_size, workers=self.decode_workers
+        )
+        for (_, img, error), i in zip(results, indices):
+            self.check_cancelled()
+            if error is not None:
+                self.decode_errors.append({'path': paths[i], 'error': error})
+                print(f"ไม่สามารถโหลดรูปภาพ {paths[i]}: {error}")
+            yield i, img
+    
+    def ensure_cached(self, paths):
+        """ทำให้ทุกรูปอยู่ในแคช (decode เฉพาะรูปใหม่แบบขนาน) คืนค่า slot ของแต่ละรูป"""
+        slots, missing = self.image_cache.find(paths)
+        if missing:
+            print(f"กำลัง decode รูปภาพใหม่ {len(missing)} รูป "
+                  f"(อยู่ในแคชแล้ว {len(paths) - len(missing)} รูป)")
+            self.image_cache.store_decoded(paths, self.decode_images(paths, missing), slots)
+        return slots
+    
+    def load_images_uint8(self, paths):
+        """decode รูปภาพหลายรูปเป็น uint8 คืนค่า (images, ok_mask)"""
+        self.decode_errors = []
+        
+        if self.image_cache is not None:
+            slots = self.ensure_cached(paths)
+            ok = slots >= 0
+            images = np.zeros((len(paths), *self.img_size, 3), dtype=np.uint8)
+            if ok.any():
+                images[ok] = self.image_cache.read(slots[ok])
+        else:
+            images = np.zeros((len(paths), *self.img_size, 3), dtype=np.uint8)
+            ok = np.zeros(len(paths), dtype=bool)
+            for i, img in self.decode_images(paths):
+                if img is not None:
+                    images[i] = img
+                    ok[i] = True
+        
+        if self.decode_errors:
+            print(f"โหลดรูปภาพไม่สำเร็จ {len(self.decode_errors)} รูป")
+        return images, ok
+    
+    def collect_image_paths(self):
+        """รวบรวม path รูปภาพและ label โดยยังไม่ decode รูป (ใช้กับโหมด streaming)"""
         products_data = self.load_products_data()
         
         if len(products_data) < 2:
             raise ValueError("ต้องมีข้อมูลสินค้าอย่างน้อย 2 รายการสำหรับการเทรน")
         
-        images = []
+        paths = []
         labels = []
-        class_names = []
+        class_names = self.current_labels(products_data)
         
-        # สร้างรายชื่อ class
         for barcode, product in products_data.items():
-            if barcode not in class_names:
-                class_names.append(barcode)
-        
-        print(f"จำนวนคลาส: {len(class_names)}")
-        
-        # โหลดรูปภาพและ label
-        for barcode, product in products_data.items():
-            class_idx = class_names.index(barcode)
-            print(f"กำลังโหลดรูปภาพสำหรับ {product['name']} ({barcode})...")
-            
+            class_idx = self.label_registry.id_of(barcode)
             for img_path in product['images']:
                 if os.path.exists(img_path):
-                    try:
-                        # โหลดและ preprocess รูปภาพ
-                        img = self.load_and_preprocess_image(img_path)
-                        if img is not None:
-                            images.append(img)
-                            labels.append(class_idx)
-                    except Exception as e:
-                        print(f"ไม่สามารถโหลดรูปภาพ {img_path}: {e}")
+                    paths.append(img_path)
+                    labels.append(class_idx)
         
-        if len(images) == 0:
+        if len(paths) == 0:
             raise ValueError("ไม่พบรูปภาพที่สามารถใช้งานได้")
         
-        print(f"โหลดรูปภาพทั้งหมด: {len(images)} รูป")
+        print(f"จำนวนคลาส: {len(class_names)} (retired {len(self.label_registry.retired())})")
+        print(f"พบรูปภาพทั้งหมด: {len(paths)} รูป")
         
-        # แปลงเป็น numpy array
-        X = np.array(images)
-        y = np.array(labels)
+        return paths, np.array(labels), class_names
+    
+    def split_indices(self, labels, paths=None, class_names=None):
+        """แบ่ง train/validation บน index (ได้ผลเหมือน train_test_split บน pixel array)
         
-        # แบ่งข้อมูล train/validation
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+        ถ้าส่ง paths และเปิด checkpoint ไว้ split จะถูกบันทึกใน models/checkpoints/split.npz
+        และเมื่อ resume จะใช้ split เดิม (ถ้ารูป label และคลาสยังเหมือนเดิม)
+        """
+        fingerprint = None
+        if paths is not None and self.checkpoint_every:
+            fingerprint = self.data_fingerprint = self.fingerprint_data(paths, labels, class_names)
+            
+            split_path = os.path.join(self.checkpoint_dir, "split.npz")
+            if self.resume_state is not None:
+                if os.path.exists(split_path):
+                    with np.load(split_path) as saved:
+                        if str(saved['fingerprint']) == fingerprint:
+                            print("ใช้ train/validation split เดิมจาก checkpoint")
+                            return saved['train_idx'], saved['val_idx']
+                print("รูปภาพหรือสินค้าเปลี่ยนไปจาก checkpoint ล่าสุด จะเทรนใหม่ทั้งหมด")
+                self.resume_state = None
+        
+        indices = np.arange(len(labels))
+        train_idx, val_idx = train_test_split(
+            indices, test_size=0.2, random_state=42, stratify=labels
         )
         
-        print(f"Training set: {len(X_train)} รูป")
-        print(f"Validation set: {len(X_val)} รูป")
+        if fingerprint is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            tmp_path = split_path + ".tmp.npz"
+            np.savez(tmp_path, fingerprint=np.array(fingerprint), train_idx=train_idx, val_idx=val_idx)
+            os.replace(tmp_path, split_path)
+        return train_idx, val_idx
+    
+    @staticmethod
+    def fingerprint_data(paths, labels, class_names):
+        """hash ของ path, label และรายชื่อคลาส (เปลี่ยนเมื่อรูปหรือสินค้าในแคตตาล็อกเปลี่ยน)"""
+        digest = hashlib.sha1()
+        for path in paths:
+            digest.update(path.encode('utf-8') + b"\0")
+        digest.update(np.asarray(labels, dtype=np.int64).tobytes())
+        digest.update(json.dumps(class_names, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _record_split(self, paths, labels, train_idx, val_idx):
+        """จำ path และ label ของแต่ละชุดข้อมูลไว้ (ใช้กับ bottleneck features)"""
+        self.split = {
+            'train': ([paths[i] for i in train_idx], labels[train_idx]),
+            'val': ([paths[i] for i in val_idx], labels[val_idx]),
+        }
+    
+    def save_validation_split(self, class_names):
+        """บันทึก path และบาร์โค้ดของรูป validation ที่ใช้จริงลง validation_split.json ของ run นี้
         
-        return X_train, X_val, y_train, y_val, class_names
+        evaluation และ tflite_benchmark อ่านไฟล์นี้ จึงประเมินบนรูปชุดเดียวกับตอนเทรนเสมอ
+        (ทั้งโหมด TFRecord ที่ split ด้วย hash และโหมด incremental ที่ใช้รูปเพียงบางส่วน)
+        """
+        val_paths, y_val = self.split['val']
+        path = os.path.join(self.output_dir, "validation_split.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'paths': list(val_paths), 'barcodes': [class_names[int(i)] for i in y_val]},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
     
-    def load_and_preprocess_image(self, img_path):
-        """โหลดและ preprocess รูปภาพ"""
-        try:
-            # โหลดรูปภาพด้วย OpenCV
-            img = cv2.imread(img_path)
+    def _decode_for_dataset(self, path, label):
+        """decode รูปภาพหนึ่งรูปภายใน tf.data (เรียก OpenCV ผ่าน numpy_function)"""
+        def _load(p):
+            img = self.load_image_uint8(p.decode('utf-8'))
             if img is None:
-                return None
-            
-            # แปลง BGR เป็น RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Resize รูปภาพ
-            img = cv2.resize(img, self.img_size)
-
-            # แก้ตรงนี้: ไม่ต้องหาร 255 เอง ให้ใช้ preprocess_input แทน
-            img = img.astype(np.float32)
-            img = preprocess_input(img)  # scale เป็น [-1, 1] ตาม MobileNetV2
-            
+                raise ValueError(f"ไม่สามารถโหลดรูปภาพ {p}")
             return img
-            
-        except Exception as e:
-            print(f"Error processing image {img_path}: {e}")
-            return None
+        
+        img = tf.numpy_function(_load, [path], tf.uint8)
+        img.set_shape((*self.img_size, 3))
+        img = preprocess_input(tf.cast(img, tf.float32))
+        return img, label
+    
+    def _read_cached_for_dataset(self, slot, label):
+        """อ่านรูปหนึ่งรูปจากแคช memory-mapped ภายใน tf.data"""
+        img = tf.numpy_function(self.image_cache.read_slot, [slot], tf.uint8)
+        img.set_shape((*self.img_size, 3))
+        img = preprocess_input(tf.cast(img, tf.float32))
+        return img, label
+    
+    def build_dataset(self, items, labels, training=False):
+        """สร้าง tf.data.Dataset ที่โหลดรูปแบบ lazy (หน่วยความจำขึ้นกับ batch size)
+        
+        items เป็น path ของรูปภาพ หรือเป็น slot ในแคชรูปภาพถ้าเปิดใช้แคช
+        ชุด training ยังไม่ทำ augmentation และยังไม่ prefetch (ดู finalize_train_dataset)
+        """
+        if self.image_cache is not None:
+            dataset = tf.data.Dataset.from_tensor_slices((np.asarray(items), np.asarray(labels)))
+            load_fn = self._read_cached_for_dataset
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices((list(items), np.asarray(labels)))
+            load_fn = self._decode_for_dataset
+        if training:
+            # shuffle เฉพาะ path/label ซึ่งมีขนาดเล็ก ไม่ใช่ pixel
+            dataset = dataset.shuffle(buffer_size=len(items))
+        dataset = dataset.map(load_fn, num_parallel_calls=tf.data.AUTOTUNE)
+        # ข้ามรูปที่อ่านไม่ได้ เหมือนกับที่ prepare_data ทำ
+        dataset = dataset.ignore_errors().batch(self.batch_size)
+        if training:
+            return dataset
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def finalize_train_dataset(self, dataset, placement):
+        """เพิ่ม augmentation ทั้ง batch แบบขนาน (ถ้าทำใน pipeline) และ prefetch ให้ training dataset"""
+        if placement == 'pipeline':
+            dataset = augment_dataset(dataset, self.augmentation_seed)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def compile_model(self, model, learning_rate):
+        """compile โมเดลด้วย Adam, loss และ metrics เดียวกันทุกรอบ"""
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy'],
+            jit_compile=self.jit_compile
+        )
+    
+    def training_model(self, model, placement, learning_rate):
+        """โมเดลที่ใช้ใน fit: ถ้า augmentation อยู่ในโมเดลจะห่อด้วย BatchAugmentation
+        
+        wrapper ใช้ layer ชุดเดียวกับ model จึงไม่ต้องคัดลอก weights และ model ที่ export
+        เป็น TFLite ไม่มี layer augmentation ติดไปด้วย
+        """
+        if placement != 'model':
+            return model
+        wrapper = tf.keras.Sequential([
+            tf.keras.Input(shape=(*self.img_size, 3)),
+            BatchAugmentation(self.augmentation_seed),
+            model,
+        ])
+        self.compile_model(wrapper, learning_rate)
+        return wrapper
+    
+    def compare_augmentation_placement(self, model, train_base, steps=20, warmup=3):
+        """วัดความเร็วการเทรน (รูป/วินาที) เมื่อทำ augmentation ใน tf.data เทียบกับในโมเดล
+        
+        weights ของ model ถูกคืนค่าเดิมหลังวัด คืนค่า dict {placement: รูป/วินาที}
+        """
+        weights = model.get_weights()
+        results = {}
+        for placement in ('pipeline', 'model'):
+            dataset = self.finalize_train_dataset(train_base, placement).repeat()
+            fit_model = self.training_model(model, placement, self.learning_rate)
+            fit_model.fit(dataset, steps_per_epoch=warmup, epochs=1, verbose=0)
+            start = time.perf_counter()
+            fit_model.fit(dataset, steps_per_epoch=steps, epochs=1, verbose=0)
+            results[placement] = steps * self.batch_size / (time.perf_counter() - start)
+            print(f"augmentation ใน {placement}: {results[placement]:.1f} รูป/วินาที")
+        model.set_weights(weights)
+        self.compile_model(model, self.learning_rate)
+        return results
+    
+    def prepare_tfrecord_data(self):
+        """เตรียม train/validation dataset จาก TFRecord (export ใหม่เฉพาะ shard ที่สินค้าเปลี่ยน)
+        
+        split train/validation มาจาก hash ของ path ที่บันทึกตอน export (20% ของรูปในแต่ละสินค้า)
+        """
+        print("กำลังเตรียมข้อมูลจาก TFRecord...")
+        
+        products_data = self.load_products_data()
+        if len(products_data) < 2:
+            raise ValueError("ต้องมีข้อมูลสินค้าอย่างน้อย 2 รายการสำหรับการเทรน")
+        class_names = self.current_labels(products_data)
+        
+        exporter = TFRecordExporter(self, self.tfrecord_shards, self.tfrecord_format)
+        with self.report.stage('tfrecord_export') as record:
+            record.update(exporter.export(products_data))
+        
+        train_paths, y_train = exporter.split_items('train', class_names)
+        val_paths, y_val = exporter.split_items('val', class_names)
+        if len(y_train) == 0 or len(y_val) == 0:
+            raise ValueError("ไม่พบรูปภาพที่สามารถใช้งานได้")
+        self.split = {'train': (train_paths, y_train), 'val': (val_paths, y_val)}
+        # โหมดนี้ไม่ผ่าน split_indices จึงคำนวณ fingerprint ของข้อมูลจาก split ใน manifest แทน
+        self.data_fingerprint = self.fingerprint_data(
+            train_paths + val_paths, np.concatenate([y_train, y_val]), class_names
+        )
+        
+        train_dataset = exporter.make_dataset(
+            'train', class_names, training=True, seed=self.augmentation_seed
+        ).batch(self.batch_size)
+        val_dataset = exporter.make_dataset('val', class_names).batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        
+        print(f"Training set: {len(y_train)} รูป")
+        print(f"Validation set: {len(y_val)} รูป")
+        
+        return train_dataset, val_dataset, y_train, y_val, class_names
+    
+    def prepare_streaming_data(self, samples=None):
+        """เตรียม train/validation dataset แบบ streaming"""
+        if self.tfrecords:
+            if samples is None:
+                return self.prepare_tfrecord_data()
+            print("โหมด incremental เลือกรูปบางส่วน จึงอ่านจากไฟล์รูปภาพแทน TFRecord")
+        
+        print("กำลังเตรียมข้อมูลแบบ streaming...")
+        
+        paths, labels, class_names = samples if samples is not None else self.collect_image_paths()
+        items = paths
+        if self.image_cache is not None:
+            # decode เฉพาะรูปที่ยังไม่อยู่ในแคช แล้วอ่านจากแคชทีละ batch ระหว่างเทรน
+            self.decode_errors = []
+            with self.report.stage('decode', images=len(paths)):
+                slots = self.ensure_cached(paths)
+            ok = slots >= 0
+            items = slots[ok]
+            labels = labels[ok]
+            paths = [p for p, loaded in zip(paths, ok) if loaded]
+        with self.report.stage('split'):
+            train_idx, val_idx = self.split_indices(labels, paths, class_names)
+            self._record_split(paths, labels, train_idx, val_idx)
+        
+        y_train = labels[train_idx]
+        y_val = labels[val_idx]
+        train_dataset = self.build_dataset([items[i] for i in train_idx], y_train, training=True)
+        val_dataset = self.build_dataset([items[i] for i in val_idx], y_val)
+        
+        print(f"Training set: {len(train_idx)} รูป")
+        print(f"Validation set: {len(val_idx)} รูป")
+        
+        return train_dataset, val_dataset, y_train, y_val, class_names
+    
+    def load_image_uint8(self, img_path):
+        """โหลดรูปภาพเป็น RGB uint8 ขนาด img_size (ยังไม่ preprocess)"""
+        return decode_image_uint8(img_path, self.img_size)
     
     def create_model(self, num_classes):
         """สร้างโมเดล CNN"""
         print("กำลังสร้างโมเดล...")
         
-        # ใช้ MobileNetV2 เป็น base model (เหมาะสำหรับ mobile)
-        base_model = tf.keras.applications.MobileNetV2(
-            input_shape=(*self.img_size, 3),
-            include_top=False,
-            weights='imagenet'
-        )
+        # mixed precision: คำนวณเป็น bfloat16 แต่เก็บ weights เป็น float32 (มีผลเฉพาะ layer ที่สร้างในนี้)
+        previous_policy = tf.keras.mixed_precision.global_policy()
+        if self.mixed_precision == 'bfloat16':
+            tf.keras.mixed_precision.set_global_policy('mixed_bfloat16')
         
-        # Freeze base model layers
-        base_model.trainable = False
-        
-        # สร้าง model
-        model = tf.keras.Sequential([
-            base_model,
-            tf.keras.layers.GlobalAveragePooling2D(),
-            tf.keras.layers.Dropout(0.2),
-            tf.keras.layers.Dense(128, activation='relu'),
-            tf.keras.layers.Dropout(0.2),
-            tf.keras.layers.Dense(num_classes, activation='softmax')
-        ])
+        try:
+            # ใช้ MobileNet เป็น base model (เหมาะสำหรับ mobile)
+            base_model = self.create_backbone()
+            
+            # Freeze base model layers
+            base_model.trainable = False
+            
+            # สร้าง model (softmax เป็น float32 เสมอเพื่อความเสถียรของ loss)
+            model = tf.keras.Sequential([
+                base_model,
+                tf.keras.layers.GlobalAveragePooling2D(),
+                tf.keras.layers.Dropout(self.dropout),
+                tf.keras.layers.Dense(128, activation='relu'),
+                tf.keras.layers.Dropout(self.dropout),
+                tf.keras.layers.Dense(num_classes, activation='softmax', dtype='float32')
+            ])
+        finally:
+            tf.keras.mixed_precision.set_global_policy(previous_policy)
         
         # Compile model
-        model.compile(
-            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        self.compile_model(model, self.learning_rate)
         
         return model
     
+    def create_backbone(self):
+        """สร้าง backbone ที่เลือก (weights จาก ImageNet, ไม่มี classifier ด้านบน)
+        
+        MobileNetV3 สร้างโดยไม่มี layer rescaling ในตัว เพื่อรับ input [-1, 1] เหมือน MobileNetV2
+        ขนาดรูปที่ไม่มี weights ของ ImageNet ตรงกัน Keras จะใช้ weights ของ 224x224 แทน
+        """
+        options = dict(
+            input_shape=(*self.img_size, 3),
+            include_top=False,
+            weights='imagenet',
+            alpha=self.alpha,
+        )
+        if self.backbone != 'mobilenet_v2':
+            options['include_preprocessing'] = False
+        return getattr(tf.keras.applications, BACKBONES[self.backbone])(**options)
+    
+    def prepare_fine_tuning(self, model):
+        """เปิดให้เทรน backbone เฉพาะชั้นท้าย ๆ (self.fine_tune_layers) และ compile ใหม่ด้วย learning rate ต่ำ"""
+        base_model = model.layers[0]
+        base_model.trainable = True
+
+        fine_tune_at = len(base_model.layers) - self.fine_tune_layers
+        for layer in base_model.layers[:fine_tune_at]:
+            layer.trainable = False
+
+        self.compile_model(model, self.fine_tune_learning_rate)
+    
     def train_model(self, log_callback=None):
         """เทรนโมเดล"""
-        # เตรียมข้อมูล
-        X_train, X_val, y_train, y_val, class_names = self.prepare_data()
+        self.start_run()
+        
+        # อัปเดต label registry ครั้งเดียวต่อการเทรน (ผู้ที่อ่านอย่างเดียวใช้ current_labels ไม่เขียนไฟล์)
+        self.labels_synced = False
+        self.sync_labels(self.load_products_data())
+        
+        # resume: อ่านสถานะที่ค้างอยู่ ถ้าไม่ resume จะลบ checkpoint เก่าทิ้ง
+        self.resume_state = self.load_resume_state() if self.resume else None
+        if self.resume_state is None:
+            self.clear_checkpoints()
+        self.checkpoint_history = {}
+        
+        # โหมด incremental: เริ่มจากโมเดลเดิมและเทรนเฉพาะ replay sample + รูปของสินค้าใหม่
+        samples = None
+        previous = None
+        total_epochs = self.epochs
+        if self.incremental:
+            previous = self.load_previous_model()
+            if previous is None:
+                if log_callback:
+                    log_callback("ไม่พบโมเดลเดิม จะเทรนใหม่ทั้งหมด")
+            else:
+                samples, new_classes = self.select_incremental_samples(previous[1])
+                total_epochs = self.incremental_epochs
+                if log_callback:
+                    log_callback(f"เทรนแบบ incremental: สินค้าใหม่ {len(new_classes)} รายการ, "
+                                 f"ใช้รูปเดิมไม่เกิน {self.replay_per_class} รูปต่อสินค้า")
+        
+        with self.report.stage('prepare_data', streaming=self.streaming):
+            if self.streaming:
+                # เตรียมข้อมูลแบบ streaming: decode ทีละ batch จาก path
+                train_base, val_dataset, y_train, y_val, class_names = \
+                    self.prepare_streaming_data(samples)
+                # ในโหมดนี้ X_val คือ validation dataset (evaluate_model รองรับ)
+                X_val = val_dataset
+            else:
+                # เตรียมข้อมูล
+                X_train, X_val, y_train, y_val, class_names = self.prepare_data(samples)
+                
+                # สร้าง dataset (augmentation ทำทีละ batch หลัง batch แล้ว ดู finalize_train_dataset)
+                train_base = tf.data.Dataset.from_tensor_slices((X_train, y_train))
+                train_base = train_base.shuffle(buffer_size=len(X_train)).batch(self.batch_size)
+                
+                val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val))
+                val_dataset = val_dataset.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        self.report.info['num_classes'] = len(class_names)
+        self.report.info['train_images'] = int(len(y_train))
+        self.report.info['val_images'] = int(len(y_val))
+        self.save_validation_split(class_names)
+        self.check_resume_data(class_names)
         
         # สร้างโมเดล
-        model = self.create_model(len(class_names))
+        with self.report.stage('build_model'):
+            model = self.create_model(len(class_names))
+            
+            if previous is not None:
+                # คัดลอกน้ำหนักจากโมเดลเดิม (รวมแถวของ head สำหรับสินค้าที่มีอยู่แล้ว)
+                self.transfer_weights(previous[0], previous[1], model, class_names)
         
-        if log_callback:
-            log_callback("Model architecture created")
+        # resume อาจถูกยกเลิกหลังเตรียมข้อมูล (split_indices หรือ check_resume_data)
+        resume = self.resume_state
+        prior_history = None
+        if resume is not None:
+            self.checkpoint_history = {k: list(v) for k, v in resume['history'].items()}
+            prior_history = tf.keras.callbacks.History()
+            prior_history.history = {k: list(v) for k, v in resume['history'].items()}
+            prior_history.epoch = list(range(len(next(iter(prior_history.history.values()), []))))
         
-        # Data augmentation
-        data_augmentation = tf.keras.Sequential([
-            tf.keras.layers.RandomFlip("horizontal"),
-            tf.keras.layers.RandomRotation(0.1),
-            tf.keras.layers.RandomZoom(0.1),
-        ])
+        # เลือกตำแหน่งของ augmentation (โหมด auto วัดความเร็วบนเครื่องนี้ก่อน ยกเว้นตอน resume)
+        placement = self.augmentation_placement
+        if placement == 'auto' and resume is not None and resume.get('augmentation_placement'):
+            placement = resume['augmentation_placement']
+        if placement == 'auto':
+            with self.report.stage('augmentation_benchmark'):
+                timings = self.compare_augmentation_placement(model, train_base)
+            placement = max(timings, key=timings.get)
+            self.report.info['augmentation_benchmark'] = timings
+            if log_callback:
+                log_callback(f"augmentation ใน {placement} เร็วกว่า "
+                             f"({timings['pipeline']:.1f} vs {timings['model']:.1f} รูป/วินาที ใน pipeline/โมเดล)")
+        self.report.info['augmentation_placement'] = placement
+        train_dataset = self.finalize_train_dataset(train_base, placement)
         
-        # สร้าง dataset
-        train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train))
-        train_dataset = train_dataset.shuffle(buffer_size=len(X_train))
-        train_dataset = train_dataset.map(
-            lambda x, y: (data_augmentation(x, training=True), y)
-        ).batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        if log_callback:
+            log_callback("Model architecture created")
         
-        val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val))
-        val_dataset = val_dataset.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        self.check_cancelled()
+        control_callback = TrainingControlCallback(self.progress_callback, self.cancel_event)
         
         # Callbacks
         callbacks = [
+            control_callback,
+            *self.extra_callbacks,
             tf.keras.callbacks.EarlyStopping(
                 monitor='val_loss',
                 patience=10,
@@ -198,55 +864,99 @@ class ProductClassifierTrainer:
             classes=np.unique(y_train),
             y=y_train
         )
-        class_weights_dict = {i: w for i, w in enumerate(class_weights)}
+        # label เป็น class ID ถาวร: คลาสที่ไม่มีรูป (เช่น สินค้า retired) ไม่อยู่ใน y_train
+        # แต่ Keras ต้องการ weight ครบทุกคลาส 0..n-1 จึงใส่ 1.0 ให้คลาสเหล่านั้น
+        class_weights_dict = {i: 1.0 for i in range(len(class_names))}
+        class_weights_dict.update({int(c): float(w) for c, w in zip(np.unique(y_train), class_weights)})
 
         # --------- รอบที่ 1: train เฉพาะ head ---------
-        initial_epochs = int(self.epochs * 0.6)
+        initial_epochs = int(total_epochs * 0.6)
         if initial_epochs < 5:
-            initial_epochs = min(self.epochs, 5)
+            initial_epochs = min(total_epochs, 5)
 
         if log_callback:
             log_callback(f"เริ่มเทรนรอบแรก (เฉพาะ head) {initial_epochs} epochs")
 
-        history_1 = model.fit(
-            train_dataset,
-            epochs=initial_epochs,
-            validation_data=val_dataset,
-            callbacks=callbacks,
-            class_weight=class_weights_dict,
-            verbose=1
-        )
+        phase_1_callbacks = callbacks + [EpochTimingCallback(self.report, 'head', len(y_train))]
+        if self.profile_batches:
+            profile_dir = os.path.join(self.output_dir, "profile")
+            self.report.info['profile_dir'] = profile_dir
+            phase_1_callbacks.append(tf.keras.callbacks.TensorBoard(
+                log_dir=profile_dir, profile_batch=self.profile_batches
+            ))
+
+        if resume is not None and resume['phase'] == 'fine_tune':
+            # รอบแรกเสร็จแล้วใน run ก่อน: ข้ามไปรอบ fine-tune
+            history_1 = prior_history
+            if log_callback:
+                log_callback("ข้ามรอบแรก (เสร็จแล้วใน checkpoint)")
+        else:
+            initial_epoch = resume['epoch'] if resume is not None else 0
+            phase_1_callbacks += self.checkpoint_callbacks(
+                model, 'head', resume['checkpoint'] if resume is not None else None
+            )
+            with self.report.stage('phase1', epochs=initial_epochs, initial_epoch=initial_epoch):
+                # features ในแคชคำนวณจาก backbone ของ ImageNet จึงใช้ไม่ได้เมื่อ warm-start จากโมเดลเดิม
+                if self.bottleneck_features and previous is None:
+                    # backbone ถูก freeze ในรอบนี้ จึงคำนวณ features ครั้งเดียวแล้วเทรนเฉพาะ Dense head
+                    if log_callback:
+                        log_callback(f"กำลังคำนวณ bottleneck features ของ {BACKBONES[self.backbone]}...")
+                    history_1 = self.train_head_on_bottleneck(
+                        model, initial_epochs, phase_1_callbacks, class_weights_dict, initial_epoch
+                    )
+                else:
+                    history_1 = self.training_model(model, placement, self.learning_rate).fit(
+                        train_dataset,
+                        epochs=initial_epochs,
+                        initial_epoch=initial_epoch,
+                        validation_data=val_dataset,
+                        callbacks=phase_1_callbacks,
+                        class_weight=class_weights_dict,
+                        verbose=1
+                    )
+            self.check_cancelled()
+            
+            if prior_history is not None:
+                # ต่อ history ของ epoch ก่อน resume ไว้ข้างหน้า
+                for key, values in history_1.history.items():
+                    prior_history.history.setdefault(key, []).extend(values)
+                prior_history.epoch.extend(history_1.epoch)
+                history_1 = prior_history
+            
+            # checkpoint ตอนจบรอบแรก (ไม่มี optimizer เพราะรอบ fine-tune ใช้ optimizer ใหม่)
+            resume = None
+            self.save_checkpoint(model, None, 'fine_tune', history_1.epoch[-1])
 
         # --------- รอบที่ 2: Fine-tune base_model ชั้นท้าย ๆ ---------
         if log_callback:
-            log_callback("เริ่ม Fine-tune MobileNetV2 ชั้นท้าย ๆ ...")
+            log_callback(f"เริ่ม Fine-tune {BACKBONES[self.backbone]} ชั้นท้าย ๆ ...")
 
-        base_model = model.layers[0]
-        base_model.trainable = True
-
-        fine_tune_at = len(base_model.layers) - 40
-        for layer in base_model.layers[:fine_tune_at]:
-            layer.trainable = False
-
-        model.compile(
-            optimizer=tf.keras.optimizers.Adam(learning_rate=1e-5),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        self.prepare_fine_tuning(model)
 
-        fine_tune_epochs = self.epochs - initial_epochs
+        fine_tune_epochs = total_epochs - initial_epochs
         if fine_tune_epochs > 0:
             if log_callback:
                 log_callback(f"เทรน Fine-tune เพิ่มอีก {fine_tune_epochs} epochs")
 
-            history_2 = model.fit(
-                train_dataset,
-                epochs=self.epochs, # Train until the end
-                initial_epoch=history_1.epoch[-1], # Continue from where phase 1 left off
-                validation_data=val_dataset,
-                class_weight=class_weights_dict,
-                verbose=1
-            )
+            if resume is not None:
+                initial_epoch = resume['epoch']  # ต่อจาก checkpoint ของรอบ fine-tune
+            else:
+                initial_epoch = history_1.epoch[-1]  # Continue from where phase 1 left off
+            with self.report.stage('fine_tune', epochs=fine_tune_epochs, initial_epoch=initial_epoch):
+                history_2 = self.training_model(model, placement, self.fine_tune_learning_rate).fit(
+                    train_dataset,
+                    epochs=total_epochs, # Train until the end
+                    initial_epoch=initial_epoch,
+                    validation_data=val_dataset,
+                    callbacks=[control_callback, *self.extra_callbacks,
+                               EpochTimingCallback(self.report, 'fine_tune', len(y_train)),
+                               *self.checkpoint_callbacks(
+                                   model, 'fine_tune', resume['checkpoint'] if resume is not None else None
+                               )],
+                    class_weight=class_weights_dict,
+                    verbose=1
+                )
+            self.check_cancelled()
 
             for key in history_1.history.keys():
                 history_1.history[key].extend(history_2.history.get(key, []))
@@ -254,60 +964,438 @@ class ProductClassifierTrainer:
         history = history_1
 
         # บันทึก class names
-        class_names_path = os.path.join(self.model_dir, "class_names.json")
+        class_names_path = os.path.join(self.output_dir, "class_names.json")
         with open(class_names_path, 'w', encoding='utf-8') as f:
             json.dump(class_names, f, ensure_ascii=False, indent=2)
         
         if log_callback:
             log_callback(f"บันทึก class names ที่: {class_names_path}")
         
+        # class ID, บาร์โค้ด และสถานะ retired ตาม version ของ label registry
+        self.label_registry.export_label_map(os.path.join(self.output_dir, "label_map.json"), class_names)
+        
+        # backbone และขนาด input ของโมเดล (แอปใช้ตั้งขนาดรูปก่อนส่งเข้า interpreter)
+        # retired_ids: class ID ที่ยังมี output แต่แอปต้องไม่ตอบกลับ (ตรงกับ retired ใน label_map.json)
+        model_info = self.model_info()
+        model_info['retired_ids'] = [int(i) for i in np.flatnonzero(self.retired_mask(class_names))]
+        with open(os.path.join(self.output_dir, "model_info.json"), 'w', encoding='utf-8') as f:
+            json.dump(model_info, f, ensure_ascii=False, indent=2)
+        
+        # บันทึกโมเดล Keras ไว้สำหรับการเทรนแบบ incremental ครั้งถัดไป
+        with self.report.stage('save_model'):
+            model.save(os.path.join(self.output_dir, "product_classifier.keras"))
+        # เทรนครบแล้ว ไม่ต้องเก็บ checkpoint
+        self.clear_checkpoints()
+        
         return model, history, class_names, X_val, y_val
     
+    def checkpoint_config(self):
+        """การตั้งค่าที่ต้องเหมือนเดิมจึงจะ resume ได้"""
+        return {
+            'model': self.model_info(),
+            'batch_size': self.batch_size,
+            'epochs': self.epochs,
+            'incremental_epochs': self.incremental_epochs,
+            'incremental': self.incremental,
+            'learning_rate': self.learning_rate,
+            'fine_tune_learning_rate': self.fine_tune_learning_rate,
+            'dropout': self.dropout,
+            'fine_tune_layers': self.fine_tune_layers,
+            'bottleneck_features': self.bottleneck_features,
+            'mixed_precision': self.mixed_precision,
+            'tfrecords': self.tfrecords,
+            'augmentation_placement': self.augmentation_placement,
+        }
+    
+    def data_state(self, num_classes):
+        """ข้อมูลที่ใช้เทรนซึ่งต้องเหมือนเดิมจึงจะ resume ได้ (รู้หลังเตรียมข้อมูลแล้วเท่านั้น)"""
+        return {'num_classes': num_classes, 'fingerprint': self.data_fingerprint}
+    
+    def check_resume_data(self, class_names):
+        """ยกเลิกการ resume ถ้าจำนวนคลาสหรือรูปที่ใช้เทรนต่างจาก checkpoint (ขนาดของ head จะไม่ตรงกัน)"""
+        self.num_classes = len(class_names)
+        if self.resume_state is not None and self.resume_state.get('data') != self.data_state(self.num_classes):
+            print("รูปภาพหรือสินค้าเปลี่ยนไปจาก checkpoint ล่าสุด จะเทรนใหม่ทั้งหมด")
+            self.resume_state = None
+    
+    def load_resume_state(self):
+        """อ่านสถานะของการเทรนที่ค้างอยู่ (คืนค่า None ถ้าไม่มีหรือการตั้งค่าเปลี่ยน)"""
+        state_path = os.path.join(self.checkpoint_dir, "state.json")
+        if not os.path.exists(state_path):
+            print("ไม่พบ checkpoint จะเทรนใหม่ทั้งหมด")
+            return None
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('config') != self.checkpoint_config():
+            print("การตั้งค่าการเทรนต่างจาก checkpoint ล่าสุด จะเทรนใหม่ทั้งหมด")
+            return None
+        print(f"เทรนต่อจาก checkpoint: รอบ {state['phase']} epoch {state['epoch']}")
+        return state
+    
+    def save_checkpoint(self, model, optimizer, phase, epoch):
+        """บันทึก weights (และ optimizer ถ้ามี) แล้วเขียน state.json แบบ atomic
+        
+        epoch คือ initial_epoch ที่จะใช้เมื่อ resume ในรอบ phase เก็บ checkpoint ล่าสุดไว้ 2 ชุด
+        """
+        if not self.checkpoint_every:
+            return None
+        objects = {'model': model}
+        if optimizer is not None:
+            objects['optimizer'] = optimizer
+        checkpoint = tf.train.Checkpoint(**objects)
+        manager = tf.train.CheckpointManager(
+            checkpoint, self.checkpoint_dir, max_to_keep=2, checkpoint_name=f"ckpt-{phase}"
+        )
+        checkpoint_path = manager.save(checkpoint_number=epoch)
+        
+        state = {
+            'phase': phase,
+            'epoch': epoch,
+            'checkpoint': os.path.relpath(checkpoint_path, self.checkpoint_dir),
+            'history': self.checkpoint_history,
+            'augmentation_placement': self.report.info.get('augmentation_placement'),
+            'config': self.checkpoint_config(),
+            'data': self.data_state(self.num_classes),
+            'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        state_path = os.path.join(self.checkpoint_dir, "state.json")
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, state_path)
+        return checkpoint_path
+    
+    def restore_checkpoint(self, checkpoint, model, fit_model):
+        """คืนค่า weights ของ model และ optimizer ของ fit_model จาก checkpoint
+        
+        สร้างตัวแปรของ optimizer ก่อน restore (checkpoint ตอนเปลี่ยนรอบไม่มี optimizer จึงใช้ expect_partial)
+        """
+        optimizer = fit_model.optimizer
+        if hasattr(optimizer, 'build'):
+            optimizer.build(fit_model.trainable_variables)
+        tf.train.Checkpoint(model=model, optimizer=optimizer).restore(
+            os.path.join(self.checkpoint_dir, checkpoint)
+        ).expect_partial()
+        print(f"คืนค่าโมเดลจาก checkpoint: {checkpoint}")
+    
+    def checkpoint_callbacks(self, model, phase, restore_path=None):
+        if not self.checkpoint_every:
+            return []
+        return [CheckpointCallback(self, model, phase, restore_path)]
+    
+    def clear_checkpoints(self):
+        """ลบ checkpoint ทั้งหมด (เมื่อเทรนเสร็จ หรือเริ่มเทรนใหม่)"""
+        if os.path.exists(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+    
+    def published_dir(self):
+        """โฟลเดอร์ของโมเดลที่ publish ล่าสุด (ใช้เป็นโมเดลเดิมของ incremental)"""
+        return current_model_dir(self.model_dir)
+    
+    def start_run(self):
+        """สร้างโฟลเดอร์ของ run ใหม่ใน models/runs/ (ถ้า versioned และยังไม่ได้สร้าง)"""
+        if self.versioned and self.run_id is None:
+            self.run_id, self.output_dir = self.model_registry.new_run()
+            self.report.info['run_id'] = self.run_id
+            print(f"บันทึกผลการเทรนครั้งนี้ที่: {self.output_dir}")
+    
+    def publish_run(self, eval_results):
+        """เขียน manifest ของ run แล้วสลับ models/CURRENT มาที่ run นี้ (คืนค่า manifest หรือ None)"""
+        if self.run_id is None:
+            return None
+        metrics = {
+            'validation_accuracy': eval_results['validation_accuracy'],
+            'validation_top5_accuracy': eval_results.get('validation_top5_accuracy'),
+            'validation_loss': eval_results['validation_loss'],
+            'num_classes': len(eval_results['class_names']),
+        }
+        config = dict(self.checkpoint_config(), quantization=self.quantization, int8_io=self.int8_io,
+                      engine=self.engine_info())
+        manifest = self.model_registry.publish(
+            self.run_id, metrics, config, class_map_version=self.label_registry.version
+        )
+        print(f"publish โมเดล {self.run_id} แล้ว (models/CURRENT)")
+        return manifest
+    
+    def load_previous_model(self):
+        """โหลดโมเดล Keras และ class names จากการเทรนครั้งก่อน (ถ้าไม่มีคืนค่า None)"""
+        previous_dir = self.published_dir()
+        keras_path = os.path.join(previous_dir, "product_classifier.keras")
+        class_names_path = os.path.join(previous_dir, "class_names.json")
+        if not os.path.exists(keras_path) or not os.path.exists(class_names_path):
+            return None
+        
+        with open(class_names_path, 'r', encoding='utf-8') as f:
+            previous_class_names = json.load(f)
+        previous_model = tf.keras.models.load_model(keras_path)
+        
+        if previous_model.output_shape[-1] != len(previous_class_names):
+            print("จำนวนคลาสของโมเดลเดิมไม่ตรงกับ class_names.json จะเทรนใหม่ทั้งหมด")
+            return None
+        
+        # โมเดลก่อนมี model_info.json คือ MobileNetV2 alpha 1.0 ขนาด 224x224
+        previous_info = {'backbone': 'mobilenet_v2', 'alpha': 1.0, 'img_size': [224, 224]}
+        info_path = os.path.join(previous_dir, "model_info.json")
+        if os.path.exists(info_path):
+            with open(info_path, 'r', encoding='utf-8') as f:
+                previous_info = json.load(f)
+        current_info = self.model_info()
+        if any(previous_info.get(key) != current_info[key] for key in ('backbone', 'alpha', 'img_size')):
+            print("backbone หรือขนาดรูปของโมเดลเดิมไม่ตรงกับการตั้งค่าปัจจุบัน จะเทรนใหม่ทั้งหมด")
+            return None
+        
+        return previous_model, previous_class_names
+    
+    def select_incremental_samples(self, previous_class_names):
+        """เลือกรูปสำหรับเทรนแบบ incremental: รูปทั้งหมดของสินค้าใหม่ + replay sample ของสินค้าเดิม
+        
+        ลำดับคลาสมาจาก label registry (สินค้าใหม่ได้ ID ต่อท้าย) index เดิมจึงไม่เปลี่ยน
+        คืนค่า ((paths, labels, class_names), new_classes)
+        """
+        paths, labels, class_names = self.collect_image_paths()
+        
+        previous = set(previous_class_names)
+        active = set(self.label_registry.active())
+        new_classes = [c for c in class_names if c not in previous and c in active]
+        
+        rng = np.random.default_rng(42)
+        keep = []
+        for class_idx, barcode in enumerate(class_names):
+            idx = np.flatnonzero(labels == class_idx)
+            if barcode in previous and len(idx) > self.replay_per_class:
+                idx = rng.choice(idx, self.replay_per_class, replace=False)
+            keep.extend(idx.tolist())
+        keep = np.sort(np.array(keep, dtype=np.int64))
+        
+        print(f"สินค้าใหม่: {len(new_classes)} รายการ, รูปที่ใช้เทรน: {len(keep)} รูป")
+        
+        return ([paths[i] for i in keep], labels[keep], class_names), new_classes
+    
+    def transfer_weights(self, previous_model, previous_class_names, model, class_names):
+        """คัดลอกน้ำหนักจากโมเดลเดิม โดย map แถวของ output layer ตาม barcode"""
+        for old_layer, new_layer in zip(previous_model.layers[:-1], model.layers[:-1]):
+            new_layer.set_weights(old_layer.get_weights())
+        
+        old_kernel, old_bias = previous_model.layers[-1].get_weights()
+        new_kernel, new_bias = model.layers[-1].get_weights()
+        
+        previous_index = {barcode: i for i, barcode in enumerate(previous_class_names)}
+        for new_idx, barcode in enumerate(class_names):
+            old_idx = previous_index.get(barcode)
+            if old_idx is not None:
+                new_kernel[:, new_idx] = old_kernel[:, old_idx]
+                new_bias[new_idx] = old_bias[old_idx]
+        
+        model.layers[-1].set_weights([new_kernel, new_bias])
+    
+    def compute_bottleneck_features(self, model, paths):
+        """คำนวณ pooled features ของ backbone สำหรับทุกรูป (ใช้แคชถ้าเคยคำนวณแล้ว)"""
+        base_model = model.layers[0]
+        feature_extractor = tf.keras.Sequential([base_model, model.layers[1]])
+        feature_dim = int(base_model.output.shape[-1])
+        
+        def _compute(chunk_paths):
+            images, ok = self.load_images_uint8(chunk_paths)
+            features = np.zeros((len(chunk_paths), feature_dim), dtype=np.float32)
+            if ok.any():
+                x = preprocess_input(images[ok].astype(np.float32))
+                features[ok] = feature_extractor.predict(x, batch_size=self.batch_size, verbose=0)
+            return features, ok
+        
+        return self.bottleneck_cache.get(paths, _compute)
+    
+    def train_head_on_bottleneck(self, model, epochs, callbacks, class_weight, initial_epoch=0):
+        """เทรน Dense head บน bottleneck features ที่คำนวณไว้ (ใช้แทนรอบที่ 1)
+        
+        head ใช้ layer ชุดเดียวกับ model น้ำหนักที่เทรนได้จึงส่งต่อให้รอบ fine-tune ทันที
+        หมายเหตุ: features คำนวณจากรูปที่ไม่ได้ทำ augmentation
+        """
+        train_paths, y_train = self.split['train']
+        val_paths, y_val = self.split['val']
+        
+        train_features, train_ok = self.compute_bottleneck_features(model, train_paths)
+        val_features, val_ok = self.compute_bottleneck_features(model, val_paths)
+        
+        head = tf.keras.Sequential(
+            [tf.keras.Input(shape=(train_features.shape[1],))] + model.layers[2:]
+        )
+        self.compile_model(head, self.learning_rate)
+        
+        return head.fit(
+            train_features[train_ok],
+            y_train[train_ok],
+            batch_size=self.batch_size,
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            validation_data=(val_features[val_ok], y_val[val_ok]),
+            callbacks=callbacks,
+            class_weight=class_weight,
+            shuffle=True,
+            verbose=1
+        )
+    
     def convert_to_tflite(self, model, quantize=True):
-        """แปลงโมเดลเป็น TensorFlow Lite"""
-        print("กำลังแปลงโมเดลเป็น TensorFlow Lite...")
+        """แปลงโมเดลเป็น TensorFlow Lite
+        
+        โหมด quantization (self.quantization):
+        - 'none': float32 ทั้งโมเดล
+        - 'dynamic': dynamic-range (weights เป็น int8, input/output เป็น float32)
+        - 'float16': weights เป็น float16
+        - 'int8': full-integer ทุก op เป็น int8 และ input/output เป็น uint8/int8 (self.int8_io)
+        """
+        mode = self.quantization if quantize else 'none'
+        print(f"กำลังแปลงโมเดลเป็น TensorFlow Lite (quantization: {mode})...")
+        
+        # โมเดลที่เทรนด้วย bfloat16 ถูกสร้างใหม่เป็น float32 ก่อน export (TFLite ไม่รองรับ bfloat16)
+        if self.mixed_precision != 'none':
+            model = self.float32_copy(model)
         
         # สร้าง TFLite converter
         converter = tf.lite.TFLiteConverter.from_keras_model(model)
         
-        if quantize:
-            # เปิดใช้งาน quantization เพื่อลดขนาดไฟล์
+        if mode == 'dynamic':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        
+        elif mode == 'float16':
             converter.optimizations = [tf.lite.Optimize.DEFAULT]
-            
-            # ใช้ dynamic range quantization
-            converter.representative_dataset = self.representative_data_gen
             converter.target_spec.supported_types = [tf.float16]
         
+        elif mode == 'int8':
+            # full-integer quantization ต้องใช้ representative dataset เพื่อหาช่วงค่าของ activation
+            io_type = tf.uint8 if self.int8_io == 'uint8' else tf.int8
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = self.representative_data_gen
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = io_type
+            converter.inference_output_type = io_type
+        
+        elif mode != 'none':
+            raise ValueError(f"ไม่รู้จักโหมด quantization: {mode}")
+        
         # แปลงโมเดล
         tflite_model = converter.convert()
         
         # บันทึกไฟล์ .tflite
-        tflite_path = os.path.join(self.model_dir, "product_classifier.tflite")
+        tflite_path = os.path.join(self.output_dir, "product_classifier.tflite")
         with open(tflite_path, "wb") as f:
             f.write(tflite_model)
         
         print(f"บันทึกโมเดล TFLite ที่: {tflite_path}")
         print(f"ขนาดไฟล์: {len(tflite_model) / 1024:.1f} KB")
         
+        if mode == 'int8':
+            self.save_quantization_info(tflite_model)
+        
         return tflite_path
     
-    def representative_data_gen(self):
-        """สร้างข้อมูลตัวอย่างสำหรับ quantization"""
-        products_data = self.load_products_data()
+    def float32_copy(self, model):
+        """สร้างโมเดลเดียวกันแบบ float32 ล้วนและคัดลอก weights (weights ของ mixed precision เป็น float32 อยู่แล้ว)"""
+        mixed_precision = self.mixed_precision
+        self.mixed_precision = 'none'
+        try:
+            copy = self.create_model(model.output_shape[-1])
+        finally:
+            self.mixed_precision = mixed_precision
+        copy.set_weights(model.get_weights())
+        return copy
+    
+    def save_run_report(self, status):
+        """บันทึกเวลาของแต่ละขั้นตอนเป็น run_report.json ในโฟลเดอร์ของรุ่น (models/runs/<run_id>/)"""
+        self.report.status = status
+        self.report.info['decode_errors'] = len(self.decode_errors)
+        report_path = self.report.save(os.path.join(self.output_dir, "run_report.json"))
+        print(f"บันทึกรายงานเวลาการเทรนที่: {report_path}")
+        return report_path
+    
+    def save_quantization_info(self, tflite_model):
+        """บันทึก scale/zero point ของ input/output เพื่อให้แอปแปลงค่าได้ถูกต้อง"""
+        interpreter = tf.lite.Interpreter(model_content=tflite_model)
         
-        # เลือกรูปภาพตัวอย่างจากแต่ละคลาส
-        sample_images = []
-        for barcode, product in products_data.items():
-            if product['images']:
-                img_path = product['images'][0]  # เอารูปแรก
-                img = self.load_and_preprocess_image(img_path)
-                if img is not None:
-                    sample_images.append(img)
-                    if len(sample_images) >= 100:  # เอา 100 รูปพอ
+        def _details(detail):
+            scale, zero_point = detail['quantization']
+            return {
+                'dtype': np.dtype(detail['dtype']).name,
+                'shape': [int(d) for d in detail['shape']],
+                'scale': float(scale),
+                'zero_point': int(zero_point),
+            }
+        
+        info = {
+            'quantization': 'int8',
+            'input': _details(interpreter.get_input_details()[0]),
+            'output': _details(interpreter.get_output_details()[0]),
+        }
+        
+        info_path = os.path.join(self.output_dir, "quantization.json")
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        
+        print(f"Input: {info['input']['dtype']} scale={info['input']['scale']:.6f} "
+              f"zero_point={info['input']['zero_point']}")
+        print(f"บันทึกข้อมูล quantization ที่: {info_path}")
+    
+    def select_calibration_paths(self):
+        """เลือกรูปสำหรับ calibration แบบ stratified (วนทีละคลาสจนครบ calibration_samples รูป)"""
+        if getattr(self, 'split', None):
+            paths, labels = self.split['train']
+        else:
+            paths, labels, _ = self.collect_image_paths()
+        
+        rng = np.random.default_rng(42)
+        classes = rng.permutation(np.unique(labels))
+        per_class = [rng.permutation(np.flatnonzero(labels == c)) for c in classes]
+        
+        selected = []
+        depth = 0
+        max_depth = max(len(idx) for idx in per_class)
+        while len(selected) < self.calibration_samples and depth < max_depth:
+            for idx in per_class:
+                if depth < len(idx):
+                    selected.append(paths[idx[depth]])
+                    if len(selected) >= self.calibration_samples:
                         break
+            depth += 1
+        
+        return selected
+    
+    def load_calibration_images(self):
+        """โหลดชุด calibration (uint8) โดยใช้ไฟล์แคชถ้าชุดรูปและไฟล์ต้นฉบับไม่เปลี่ยน"""
+        paths = self.select_calibration_paths()
+        signatures = [[os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths]
+        cache_path = os.path.join(
+            self.data_dir, '.image_cache',
+            f"calibration_{self.img_size[0]}x{self.img_size[1]}.npz"
+        )
+        
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if (data['paths'].tolist() == paths
+                            and data['signatures'].tolist() == signatures):
+                        print(f"ใช้ชุด calibration จากแคช {len(paths)} รูป")
+                        return data['images']
+            except Exception as e:
+                print(f"ไม่สามารถอ่านแคชชุด calibration: {e}")
+        
+        images, ok = self.load_images_uint8(paths)
+        images = images[ok]
+        
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, paths=np.array(paths), signatures=np.array(signatures, dtype=np.int64),
+                 images=images)
+        os.replace(tmp_path, cache_path)
         
-        for img in sample_images:
-            yield [np.expand_dims(img, axis=0).astype(np.float32)]
+        print(f"เตรียมชุด calibration {len(images)} รูป")
+        return images
+    
+    def representative_data_gen(self):
+        """สร้างข้อมูลตัวอย่างสำหรับ quantization (stratified ตามคลาส)"""
+        images = self.load_calibration_images()
+        
+        for img in images:
+            x = preprocess_input(img.astype(np.float32))
+            yield [np.expand_dims(x, axis=0)]
     
     def save_training_plots(self, history):
         """บันทึกกราฟผลการเทรน"""
@@ -330,7 +1418,7 @@ class ProductClassifierTrainer:
         ax2.legend()
         
         # บันทึกกราฟ
-        plots_path = os.path.join(self.model_dir, "training_plots.png")
+        plots_path = os.path.join(self.output_dir, "training_plots.png")
         plt.tight_layout()
         plt.savefig(plots_path, dpi=300, bbox_inches='tight')
         plt.close()
@@ -338,37 +1426,55 @@ class ProductClassifierTrainer:
         print(f"บันทึกกราฟการเทรนที่: {plots_path}")
     
     def evaluate_model(self, model, X_val, y_val, class_names):
-        """ประเมินผลโมเดล"""
-        print("กำลังประเมินผลโมเดล...")
+        """ประเมินผลโมเดลในรอบเดียว (loss, top-1/top-5, confusion matrix และ metrics ต่อคลาส)
         
-        # ประเมินผล
-        loss, accuracy = model.evaluate(X_val, y_val, verbose=0)
-        print(f"Validation Loss: {loss:.4f}")
-        print(f"Validation Accuracy: {accuracy:.4f}")
+        X_val เป็น array หรือ validation dataset (โหมด streaming) ในโหมด streaming
+        label อ่านจาก dataset เอง (รูปที่อ่านไม่ได้ถูกข้ามไป จึงไม่ใช้ y_val ที่ส่งเข้ามา)
+        """
+        print("กำลังประเมินผลโมเดล...")
         
-        # สร้าง predictions
-        predictions = model.predict(X_val)
-        predicted_classes = np.argmax(predictions, axis=1)
+        if isinstance(X_val, tf.data.Dataset):
+            batches = X_val
+        else:
+            batches = ((X_val[i:i + self.batch_size], y_val[i:i + self.batch_size])
+                       for i in range(0, len(X_val), self.batch_size))
+        # คลาสที่ retired ไม่ถูกนับเป็นคำตอบ (เหมือนที่ inference server และแอปทำ)
+        evaluator = evaluate_keras(model, batches, len(class_names), retired=self.retired_mask(class_names))
+        metrics = evaluator.result()
         
-        # สร้าง classification report
-        from sklearn.metrics import classification_report, confusion_matrix
+        print(f"Validation Loss: {metrics['loss']:.4f}")
+        print(f"Validation Accuracy: {metrics['accuracy']:.4f}")
+        print(f"Validation Top-5 Accuracy: {metrics[f'top{evaluator.top_k}_accuracy']:.4f}")
         
-        # แปลง class indices เป็นชื่อสินค้า
-        target_names = [class_names[i] for i in range(len(class_names))]
+        # สร้าง classification report จาก label/คลาสที่ทำนายที่เก็บไว้ (ไม่ต้องรันโมเดลซ้ำ)
+        from sklearn.metrics import classification_report
         
-        report = classification_report(y_val, predicted_classes, target_names=target_names)
+        y_true, predicted_classes = evaluator.arrays()
+        report = classification_report(
+            y_true, predicted_classes, labels=np.arange(len(class_names)),
+            target_names=class_names, zero_division=0
+        )
         print("Classification Report:")
         print(report)
         
+        # metrics ต่อคลาสและ confusion matrix เก็บเป็น array ใน evaluation_metrics.npz
+        metrics_path = evaluator.save(os.path.join(self.output_dir, "evaluation_metrics.npz"), class_names)
+        
         # บันทึก evaluation results
         eval_results = {
-            'validation_loss': float(loss),
-            'validation_accuracy': float(accuracy),
+            'validation_loss': float(metrics['loss']),
+            'validation_accuracy': float(metrics['accuracy']),
+            'validation_top5_accuracy': float(metrics[f'top{evaluator.top_k}_accuracy']),
+            'macro_precision': metrics['macro_precision'],
+            'macro_recall': metrics['macro_recall'],
+            'num_images': metrics['num_images'],
+            'worst_classes': evaluator.worst_classes(class_names),
+            'metrics_path': os.path.basename(metrics_path),
             'classification_report': report,
             'class_names': class_names
         }
         
-        eval_path = os.path.join(self.model_dir, "evaluation_results.json")
+        eval_path = os.path.join(self.output_dir, "evaluation_results.json")
         with open(eval_path, 'w', encoding='utf-8') as f:
             json.dump(eval_results, f, ensure_ascii=False, indent=2)
         
@@ -377,10 +1483,23 @@ class ProductClassifierTrainer:
         return eval_results
 
 
-def train_model(log_callback=None):
-    """ฟังก์ชันหลักสำหรับเทรนโมเดล"""
+def load_model_info(model_dir):
+    """อ่าน model_info.json ของโมเดล (backbone, alpha, img_size) คืนค่า None ถ้าไม่มี (โมเดลรุ่นเก่า)"""
+    info_path = os.path.join(model_dir, "model_info.json")
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def train_model(log_callback=None, **trainer_options):
+    """ฟังก์ชันหลักสำหรับเทรนโมเดล (trainer_options ส่งต่อให้ ProductClassifierTrainer)
+    
+    ฟังก์ชันนี้ไม่แตะ GUI โดยตรง จึงเรียกจาก worker thread ได้ (ส่ง cancel_event เพื่อยกเลิก)
+    """
+    trainer = None
     try:
-        trainer = ProductClassifierTrainer()
+        trainer = ProductClassifierTrainer(**trainer_options)
         
         if log_callback:
             log_callback("เริ่มการเทรนโมเดล...")
@@ -392,16 +1511,25 @@ def train_model(log_callback=None):
             log_callback("การเทรนเสร็จสิ้น!")
         
         # ประเมินผลโมเดล โดยใช้ข้อมูลที่ได้มา
-        eval_results = trainer.evaluate_model(model, X_val, y_val, class_names)
+        trainer.check_cancelled()
+        with trainer.report.stage('evaluate'):
+            eval_results = trainer.evaluate_model(model, X_val, y_val, class_names)
         
         if log_callback:
             log_callback(f"Validation Accuracy: {eval_results['validation_accuracy']:.4f}")
         
         # บันทึกกราฟการเทรน
-        trainer.save_training_plots(history)
+        with trainer.report.stage('plots'):
+            trainer.save_training_plots(history)
         
         # แปลงเป็น TFLite
-        tflite_path = trainer.convert_to_tflite(model)
+        trainer.check_cancelled()
+        with trainer.report.stage('tflite', quantization=trainer.quantization):
+            tflite_path = trainer.convert_to_tflite(model)
+        trainer.save_run_report('success')
+        
+        # publish หลังไฟล์ครบทุกไฟล์แล้วเท่านั้น ผู้ใช้โมเดลจะไม่เห็นไฟล์ของ run ที่ยังไม่เสร็จ
+        trainer.publish_run(eval_results)
         
         if log_callback:
             log_callback(f"โมเดล TFLite พร้อมใช้งาน: {tflite_path}")
@@ -410,23 +1538,134 @@ def train_model(log_callback=None):
         return {
             'success': True,
             'tflite_path': tflite_path,
+            'run_id': trainer.run_id,
             'accuracy': eval_results['validation_accuracy'],
             'class_names': class_names
         }
         
+    except TrainingCancelled as e:
+        if log_callback:
+            log_callback(str(e))
+        trainer.save_run_report('cancelled')
+        return {
+            'success': False,
+            'cancelled': True,
+            'error': str(e)
+        }
+        
     except Exception as e:
         error_msg = f"เกิดข้อผิดพลาดในการเทรน: {str(e)}"
         if log_callback:
             log_callback(error_msg)
+        if trainer is not None:
+            trainer.report.info['error'] = str(e)
+            trainer.save_run_report('failed')
         return {
             'success': False,
             'error': error_msg
         }
 
 
+def parse_args(argv=None):
+    """อ่าน argument จาก command line"""
+    parser = argparse.ArgumentParser(description="เทรนโมเดลจำแนกสินค้าและแปลงเป็น TFLite")
+    parser.add_argument('--data-dir', default=None, help="โฟลเดอร์ข้อมูลสินค้า (ค่าเริ่มต้น: data/)")
+    parser.add_argument('--model-dir', default=None, help="โฟลเดอร์สำหรับบันทึกโมเดล (ค่าเริ่มต้น: models/)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="อ่านรูปภาพแบบ streaming ผ่าน tf.data แทนการโหลดทั้งหมดลง RAM")
+    parser.add_argument('--no-image-cache', action='store_true',
+                        help="ไม่ใช้แคชรูปภาพที่ decode แล้ว (data/.image_cache)")
+    parser.add_argument('--bottleneck-features', action='store_true',
+                        help="รอบแรกเทรน head บน features ของ backbone ที่คำนวณครั้งเดียว (เร็วมากบน CPU)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="จำนวน process สำหรับ decode รูปภาพ (ค่าเริ่มต้น: ทุก core)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="เทรนต่อจากโมเดลครั้งก่อน โดยใช้รูปของสินค้าใหม่ทั้งหมด + รูปเดิมบางส่วน")
+    parser.add_argument('--replay-per-class', type=int, default=20,
+                        help="จำนวนรูปเดิมสูงสุดต่อสินค้าที่ใช้ทบทวนในโหมด incremental")
+    parser.add_argument('--incremental-epochs', type=int, default=10,
+                        help="จำนวน epochs ในโหมด incremental")
+    parser.add_argument('--quantization', choices=['none', 'dynamic', 'float16', 'int8'],
+                        default='dynamic', help="รูปแบบ quantization ของไฟล์ TFLite")
+    parser.add_argument('--int8-io', choices=['uint8', 'int8'], default='uint8',
+                        help="ชนิดข้อมูลของ input/output ในโหมด int8")
+    parser.add_argument('--calibration-samples', type=int, default=200,
+                        help="จำนวนรูป (stratified ตามคลาส) สำหรับ calibration ในโหมด int8")
+    parser.add_argument('--intra-op-threads', type=int, default=None,
+                        help="จำนวน thread ภายใน op (ค่าเริ่มต้น: TensorFlow เลือกเอง)")
+    parser.add_argument('--inter-op-threads', type=int, default=None,
+                        help="จำนวน op ที่รันพร้อมกัน (ค่าเริ่มต้น: TensorFlow เลือกเอง)")
+    parser.add_argument('--jit-compile', action='store_true',
+                        help="compile train step ด้วย XLA")
+    parser.add_argument('--mixed-precision', choices=['none', 'bfloat16'], default='none',
+                        help="เทรนด้วย mixed precision แบบ bfloat16 (ถ้า CPU รองรับ)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--learning-rate', type=float, default=1e-3, help="learning rate ของรอบแรก (เฉพาะ head)")
+    parser.add_argument('--fine-tune-learning-rate', type=float, default=1e-5)
+    parser.add_argument('--dropout', type=float, default=0.2)
+    parser.add_argument('--fine-tune-layers', type=int, default=40,
+                        help="จำนวนชั้นท้ายของ backbone ที่ fine-tune ในรอบที่ 2")
+    parser.add_argument('--backbone', choices=sorted(BACKBONES), default='mobilenet_v2')
+    parser.add_argument('--alpha', type=float, default=1.0,
+                        help="width multiplier ของ backbone (MobileNetV2: 0.35-1.4, MobileNetV3: 0.75 หรือ 1.0)")
+    parser.add_argument('--img-size', type=int, default=224,
+                        help="ขนาดรูป input (เช่น 128, 160, 192, 224)")
+    parser.add_argument('--augmentation-placement', choices=['pipeline', 'model', 'auto'], default='pipeline',
+                        help="ทำ augmentation ใน tf.data หลัง batch, ในกราฟของโมเดล หรือวัดความเร็วแล้วเลือกเอง (auto)")
+    parser.add_argument('--tfrecords', action='store_true',
+                        help="อ่านข้อมูลจาก TFRecord แบบแบ่ง shard ใน data/.tfrecords (export อัตโนมัติเฉพาะ shard ที่เปลี่ยน)")
+    parser.add_argument('--tfrecord-shards', type=int, default=64)
+    parser.add_argument('--tfrecord-format', choices=['jpeg', 'raw'], default='jpeg')
+    parser.add_argument('--no-versioning', action='store_true',
+                        help="เขียนไฟล์ผลลัพธ์ทับใน models/ แทนการสร้าง models/runs/<run_id>/")
+    parser.add_argument('--checkpoint-every', type=int, default=1,
+                        help="บันทึก checkpoint ทุกกี่ epoch ใน models/checkpoints (0 = ไม่บันทึก)")
+    parser.add_argument('--resume', action='store_true',
+                        help="เทรนต่อจาก checkpoint ล่าสุด (ถ้าการตั้งค่าและข้อมูลยังเหมือนเดิม)")
+    parser.add_argument('--profile-batches', type=int, nargs=2, default=None, metavar=('START', 'END'),
+                        help="เก็บ trace ของ TensorFlow profiler ช่วง batch START-END ของรอบแรก (ดูด้วย TensorBoard)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
     # เรียกใช้งานโดยตรง
-    result = train_model()
+    args = parse_args()
+    result = train_model(
+        data_dir=args.data_dir,
+        model_dir=args.model_dir,
+        streaming=args.streaming,
+        use_image_cache=not args.no_image_cache,
+        bottleneck_features=args.bottleneck_features,
+        decode_workers=args.workers,
+        incremental=args.incremental,
+        replay_per_class=args.replay_per_class,
+        incremental_epochs=args.incremental_epochs,
+        quantization=args.quantization,
+        int8_io=args.int8_io,
+        calibration_samples=args.calibration_samples,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        jit_compile=args.jit_compile,
+        mixed_precision=args.mixed_precision,
+        profile_batches=tuple(args.profile_batches) if args.profile_batches else None,
+        augmentation_placement=args.augmentation_placement,
+        batch_size=args.batch_size,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        fine_tune_learning_rate=args.fine_tune_learning_rate,
+        dropout=args.dropout,
+        fine_tune_layers=args.fine_tune_layers,
+        backbone=args.backbone,
+        alpha=args.alpha,
+        img_size=args.img_size,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
+        tfrecords=args.tfrecords,
+        tfrecord_shards=args.tfrecord_shards,
+        tfrecord_format=args.tfrecord_format,
+        versioned=not args.no_versioning,
+    )
     if result['success']:
         print("เทรนโมเดลสำเร็จ!")
         print(f"ไฟล์ TFLite: {result['tflite_path']}")
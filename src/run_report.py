@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import platform
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows ไม่มีโมดูล resource
+    resource = None
+
+
+def peak_rss_mb():
+    """หน่วยความจำสูงสุดที่ process ใช้จนถึงตอนนี้ (MB) คืน None ถ้าระบบไม่รองรับ"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux รายงานเป็น KB ส่วน macOS รายงานเป็น bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class RunReport:
+    """เก็บเวลาของแต่ละขั้นตอนการเทรน (wall time, CPU time, peak RSS) และสถิติต่อ epoch
+
+    ใช้ stage() เป็น context manager ขั้นตอนที่ซ้อนกันจะมีชื่อเป็น parent.child
+    แล้วบันทึกทั้งหมดเป็น JSON ด้วย save()
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now().isoformat()
+        self.stages = []
+        self.epochs = []
+        self.info = {}
+        self.status = 'running'
+        self._stack = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """จับเวลาหนึ่งขั้นตอน (info เพิ่มข้อมูลประกอบ เช่น จำนวนรูป)"""
+        full_name = ".".join(self._stack + [name])
+        self._stack.append(name)
+        record = {'name': full_name, **info}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            self._stack.pop()
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            record['peak_rss_mb'] = peak_rss_mb()
+            self.stages.append(record)
+            print(f"[{full_name}] {record['wall_seconds']:.2f} s (CPU {record['cpu_seconds']:.2f} s)")
+
+    def add_epoch(self, record):
+        self.epochs.append(record)
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(),
+            'status': self.status,
+            'total_seconds': time.perf_counter() - self._start,
+            'peak_rss_mb': peak_rss_mb(),
+            'host': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+            },
+            'info': self.info,
+            'stages': self.stages,
+            'epochs': self.epochs,
+        }
+
+    def save(self, path):
+        """บันทึกรายงานเป็น JSON แบบ atomic"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
+
+try:
+    from src.model_trainer import ProductClassifierTrainer, load_model_info
+    from src.evaluation import prepare_tflite_input, dequantize_output
+    from src.model_registry import current_model_dir
+except ImportError:  # รันโดยตรงด้วย python src/tflite_benchmark.py
+    from model_trainer import ProductClassifierTrainer, load_model_info
+    from evaluation import prepare_tflite_input, dequantize_output
+    from model_registry import current_model_dir
+
+
+def trainer_for_model(model_path, trainer):
+    """trainer ที่ decode รูปตามขนาด input ของโมเดลที่จะประเมิน
+
+    อ่าน backbone/alpha/img_size จาก model_info.json ข้างไฟล์โมเดล ถ้าไม่มี (โมเดลรุ่นเก่า) ใช้ขนาดจาก
+    input tensor ของ .tflite คืนค่า trainer เดิมถ้าขนาดตรงกันอยู่แล้ว
+    """
+    info = load_model_info(os.path.dirname(os.path.abspath(model_path)))
+    if info is not None:
+        options = {'backbone': info['backbone'], 'alpha': info['alpha'], 'img_size': tuple(info['img_size'])}
+    elif model_path.endswith('.tflite'):
+        shape = tf.lite.Interpreter(model_path=model_path).get_input_details()[0]['shape']
+        options = {'img_size': (int(shape[1]), int(shape[2]))}
+    else:
+        return trainer
+    if tuple(trainer.img_size) == options['img_size'] and \
+            all(getattr(trainer, key) == value for key, value in options.items() if key != 'img_size'):
+        return trainer
+    return ProductClassifierTrainer(data_dir=trainer.data_dir, model_dir=trainer.model_dir, **options)
+
+
+def load_validation_split(trainer, model_class_names, max_images=None, model_dir=None):
+    """คืนค่า (paths, labels) ของ validation split แบบเดียวกับที่ใช้ตอนเทรน
+
+    ใช้ validation_split.json ใน model_dir (รูปที่ใช้จริงตอนเทรน) ถ้ามี ไม่เช่นนั้นแบ่งจากแคตตาล็อกใหม่
+    label ถูก map ตาม class_names ของโมเดล (ลำดับคลาสอาจต่างจากแคตตาล็อก
+    เช่น หลังเทรนแบบ incremental) รูปของสินค้าที่โมเดลไม่รู้จักจะถูกข้าม
+    """
+    model_index = {barcode: i for i, barcode in enumerate(model_class_names)}
+    split_path = os.path.join(model_dir, "validation_split.json") if model_dir else None
+    if split_path and os.path.exists(split_path):
+        with open(split_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        items = [(path, model_index[barcode]) for path, barcode in zip(saved['paths'], saved['barcodes'])
+                 if barcode in model_index]
+        if max_images:
+            items = items[:max_images]
+        return [path for path, _ in items], np.array([label for _, label in items], dtype=np.int64)
+
+    paths, labels, class_names = trainer.collect_image_paths()
+    if trainer.image_cache is not None:
+        # ตัดรูปที่อ่านไม่ได้ออกก่อนแบ่ง เหมือนกับ prepare_data
+        ok = trainer.ensure_cached(paths) >= 0
+        paths = [p for p, loaded in zip(paths, ok) if loaded]
+        labels = labels[ok]
+    _, val_idx = trainer.split_indices(labels)
+
+    remap = np.array([model_index.get(barcode, -1) for barcode in class_names])
+    val_idx = val_idx[remap[labels[val_idx]] >= 0]
+    if max_images:
+        val_idx = val_idx[:max_images]
+    return [paths[i] for i in val_idx], remap[labels[val_idx]]
+
+
+def iter_batches(trainer, paths, labels, chunk_size=256):
+    """อ่านรูป validation ทีละ chunk (ไม่โหลดทั้งหมดลง RAM) yield (images_uint8, labels)"""
+    for start in range(0, len(paths), chunk_size):
+        chunk_paths = paths[start:start + chunk_size]
+        images, ok = trainer.load_images_uint8(chunk_paths)
+        yield images[ok], labels[start:start + chunk_size][ok]
+
+
+def _prepare_input(images_uint8, input_detail):
+    """แปลงรูป uint8 เป็น input ของ interpreter (รองรับ input แบบ float และแบบ quantized)"""
+    return prepare_tflite_input(preprocess_input(images_uint8.astype(np.float32)), input_detail)
+
+
+def benchmark_interpreter(tflite_path, batches, num_threads, warmup=10):
+    """รัน interpreter ทีละรูปและวัดเวลา invoke คืนค่า dict ของผลลัพธ์"""
+    interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+
+    latencies = []
+    top1 = 0
+    top5 = 0
+    total = 0
+    warmed_up = False
+    wall_start = time.perf_counter()
+
+    for images, labels in batches:
+        x = _prepare_input(images, input_detail)
+
+        if not warmed_up and len(x) > 0:
+            for _ in range(warmup):
+                interpreter.set_tensor(input_detail['index'], x[:1])
+                interpreter.invoke()
+            warmed_up = True
+            wall_start = time.perf_counter()
+
+        for i in range(len(x)):
+            interpreter.set_tensor(input_detail['index'], x[i:i + 1])
+            start = time.perf_counter()
+            interpreter.invoke()
+            latencies.append(time.perf_counter() - start)
+
+            scores = dequantize_output(interpreter.get_tensor(output_detail['index'])[0], output_detail)
+            top_k = np.argsort(scores)[::-1][:5]
+            top1 += int(top_k[0] == labels[i])
+            top5 += int(labels[i] in top_k)
+            total += 1
+
+    wall_time = time.perf_counter() - wall_start
+    if total == 0:
+        raise ValueError("ไม่พบรูปภาพสำหรับ benchmark")
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'threads': num_threads,
+        'num_images': total,
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'images_per_sec': float(total / latencies_ms.sum() * 1000),
+        'wall_images_per_sec': float(total / wall_time),
+        'top1_accuracy': top1 / total,
+        'top5_accuracy': top5 / total,
+    }
+
+
+def benchmark_tflite(tflite_path=None, thread_counts=(1, 2, 4), max_images=None, trainer=None):
+    """Benchmark ไฟล์ .tflite บน validation split ที่หลายจำนวน thread แล้วบันทึกผลเป็น JSON"""
+    trainer = trainer or ProductClassifierTrainer()
+    tflite_path = tflite_path or os.path.join(current_model_dir(trainer.model_dir), "product_classifier.tflite")
+    if not os.path.exists(tflite_path):
+        raise FileNotFoundError(f"ไม่พบไฟล์โมเดล {tflite_path}")
+    trainer = trainer_for_model(tflite_path, trainer)
+
+    class_names_path = os.path.join(os.path.dirname(tflite_path), "class_names.json")
+    with open(class_names_path, 'r', encoding='utf-8') as f:
+        class_names = json.load(f)
+
+    paths, labels = load_validation_split(trainer, class_names, max_images, os.path.dirname(tflite_path))
+    print(f"Benchmark {tflite_path} บน validation set {len(paths)} รูป")
+
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    input_detail = interpreter.get_input_details()[0]
+
+    results = []
+    for num_threads in thread_counts:
+        result = benchmark_interpreter(tflite_path, iter_batches(trainer, paths, labels), num_threads)
+        results.append(result)
+        print(f"threads={num_threads}: p50={result['p50_ms']:.2f} ms, p95={result['p95_ms']:.2f} ms, "
+              f"p99={result['p99_ms']:.2f} ms, {result['images_per_sec']:.1f} รูป/วินาที, "
+              f"top-1={result['top1_accuracy']:.4f}, top-5={result['top5_accuracy']:.4f}")
+
+    report = {
+        'model_path': tflite_path,
+        'model_size_kb': os.path.getsize(tflite_path) / 1024,
+        'input_dtype': np.dtype(input_detail['dtype']).name,
+        'input_shape': [int(d) for d in input_detail['shape']],
+        'num_classes': len(class_names),
+        'created_at': datetime.now().isoformat(),
+        'results': results,
+    }
+
+    report_path = os.path.join(os.path.dirname(tflite_path), "benchmark_results.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"บันทึกผล benchmark ที่: {report_path}")
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วัดความเร็วและความแม่นยำของไฟล์ .tflite")
+    parser.add_argument('--model', default=None,
+                        help="path ของไฟล์ .tflite (ค่าเริ่มต้น: product_classifier.tflite ของรุ่น CURRENT)")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4],
+                        help="จำนวน thread ของ interpreter ที่ต้องการทดสอบ")
+    parser.add_argument('--max-images', type=int, default=None,
+                        help="จำกัดจำนวนรูปจาก validation set")
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--model-dir', default=None)
+    args = parser.parse_args(argv)
+
+    trainer = ProductClassifierTrainer(data_dir=args.data_dir, model_dir=args.model_dir)
+    benchmark_tflite(args.model, args.threads, args.max_images, trainer)
+
+
+if __name__ == "__main__":
+    main()
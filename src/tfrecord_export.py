@@ -0,0 +1,280 @@
+import os
+import json
+import hashlib
+import argparse
+
+import cv2
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # type: ignore
+
+MANIFEST_VERSION = 2
+VAL_FRACTION = 0.2
+
+
+def shard_of(barcode, num_shards):
+    """shard ของสินค้า (รูปทุกรูปของบาร์โค้ดเดียวกันอยู่ shard เดียว แก้สินค้าหนึ่งเขียนใหม่เพียง shard เดียว)"""
+    return int(hashlib.sha1(barcode.encode('utf-8')).hexdigest()[:8], 16) % num_shards
+
+
+def validation_paths(paths, val_fraction=VAL_FRACTION):
+    """เลือกรูป validation ของสินค้าหนึ่งรายการ (stratified: val_fraction ของรูปในแต่ละสินค้า)
+
+    เรียงรูปตาม hash ของ path แล้วเลือกส่วนแรก ผลจึงเหมือนเดิมทุกครั้งโดยไม่ต้องเก็บ split แยก
+    สินค้าที่มีรูปตั้งแต่ 2 รูปมีรูป validation อย่างน้อย 1 รูปเสมอ
+    """
+    if len(paths) < 2:
+        return set()
+    count = max(1, int(round(len(paths) * val_fraction)))
+    ranked = sorted(paths, key=lambda p: hashlib.sha1(p.encode('utf-8')).hexdigest())
+    return set(ranked[:count])
+
+
+def product_signature(paths):
+    """ลายเซ็นของรูปสินค้าหนึ่งรายการ (path, ขนาดไฟล์, mtime) ใช้ตรวจว่าต้องเขียน shard ใหม่หรือไม่"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        except OSError:
+            digest.update(f"{path}\0missing\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _bytes_feature(value):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+class TFRecordExporter:
+    """แปลงแคตตาล็อกเป็นไฟล์ TFRecord แบบแบ่ง shard (รูปที่ resize แล้ว + บาร์โค้ด)
+
+    ไฟล์อยู่ใน data/.tfrecords/<HxW>/ แต่ละ shard มีไฟล์ .train และ .val แยกกัน
+    manifest.json เก็บลายเซ็นของแต่ละสินค้า export ครั้งถัดไปเขียนใหม่เฉพาะ shard ที่มีสินค้าเปลี่ยน
+    label ไม่ได้เก็บในไฟล์ (map จากบาร์โค้ดตอนอ่าน) ลำดับคลาสจึงเปลี่ยนได้โดยไม่ต้อง export ใหม่
+    """
+
+    def __init__(self, trainer, num_shards=64, image_format='jpeg', quality=95, output_dir=None):
+        if image_format not in ('jpeg', 'raw'):
+            raise ValueError(f"ไม่รู้จักรูปแบบรูปภาพ: {image_format}")
+        self.trainer = trainer
+        self.num_shards = num_shards
+        self.image_format = image_format
+        self.quality = quality
+        size_tag = f"{trainer.img_size[0]}x{trainer.img_size[1]}"
+        self.output_dir = output_dir or os.path.join(trainer.data_dir, '.tfrecords', size_tag)
+        self.manifest_path = os.path.join(self.output_dir, "manifest.json")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """โหลด manifest (ถ้าจำนวน shard หรือรูปแบบเปลี่ยน จะเริ่มใหม่และเขียนทุก shard)"""
+        empty = {
+            'version': MANIFEST_VERSION,
+            'num_shards': self.num_shards,
+            'img_size': list(self.trainer.img_size),
+            'format': self.image_format,
+            'val_fraction': VAL_FRACTION,
+            'shards': {},
+        }
+        if not os.path.exists(self.manifest_path):
+            return empty
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"ไม่สามารถอ่าน manifest ของ TFRecord: {e}")
+            return empty
+        if any(manifest.get(key) != empty[key] for key in ('version', 'num_shards', 'img_size', 'format')):
+            print("การตั้งค่า TFRecord เปลี่ยนไป จะเขียนทุก shard ใหม่")
+            return empty
+        return manifest
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def shard_path(self, index, split):
+        return os.path.join(self.output_dir, f"shard-{index:05d}-of-{self.num_shards:05d}.{split}.tfrecord")
+
+    def _encode(self, img):
+        if self.image_format == 'raw':
+            return img.tobytes()
+        ok, encoded = cv2.imencode('.jpg', cv2.cvtColor(img, cv2.COLOR_RGB2BGR),
+                                   [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("เข้ารหัส JPEG ไม่สำเร็จ")
+        return encoded.tobytes()
+
+    def _write_shard(self, index, products):
+        """เขียน shard หนึ่ง (ไฟล์ .train และ .val) คืนค่าข้อมูลของ shard สำหรับ manifest"""
+        items = [(barcode, path) for barcode, paths in products.items() for path in paths]
+        images, ok = self.trainer.load_images_uint8([path for _, path in items])
+        # split ต่อสินค้าจากรูปที่อ่านได้ (รูปเสียไม่ทำให้สัดส่วน validation เพี้ยน)
+        loaded_paths = {}
+        for (barcode, path), loaded in zip(items, ok):
+            if loaded:
+                loaded_paths.setdefault(barcode, []).append(path)
+        val_paths = set()
+        for paths in loaded_paths.values():
+            val_paths |= validation_paths(paths)
+
+        entries = {barcode: {'signature': product_signature(paths), 'train': [], 'val': []}
+                   for barcode, paths in products.items()}
+        writers = {}
+        try:
+            for split in ('train', 'val'):
+                writers[split] = tf.io.TFRecordWriter(self.shard_path(index, split) + ".tmp")
+            for (barcode, path), img, loaded in zip(items, images, ok):
+                if not loaded:
+                    continue
+                split = 'val' if path in val_paths else 'train'
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'image': _bytes_feature(self._encode(img)),
+                    'barcode': _bytes_feature(barcode.encode('utf-8')),
+                    'path': _bytes_feature(path.encode('utf-8')),
+                }))
+                writers[split].write(example.SerializeToString())
+                entries[barcode][split].append(path)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        for split in ('train', 'val'):
+            os.replace(self.shard_path(index, split) + ".tmp", self.shard_path(index, split))
+        return {'products': entries, 'images': int(ok.sum()), 'skipped': int((~ok).sum())}
+
+    def export(self, products_data=None):
+        """เขียน shard ที่มีสินค้าเพิ่ม/ลบ/แก้ไข (shard อื่นใช้ไฟล์เดิม) คืนค่า dict สรุปผล"""
+        products_data = products_data if products_data is not None else self.trainer.load_products_data()
+        grouped = {}
+        for barcode, product in products_data.items():
+            paths = [p for p in product['images'] if os.path.exists(p)]
+            if paths:
+                grouped.setdefault(shard_of(barcode, self.num_shards), {})[barcode] = paths
+
+        shards = self.manifest['shards']
+        written = 0
+        removed = 0
+        for index in range(self.num_shards):
+            key = str(index)
+            products = grouped.get(index, {})
+            signatures = {barcode: product_signature(paths) for barcode, paths in products.items()}
+            previous = shards.get(key, {}).get('products', {})
+            files_exist = all(os.path.exists(self.shard_path(index, split)) for split in ('train', 'val'))
+            if files_exist and signatures == {b: e['signature'] for b, e in previous.items()}:
+                continue
+
+            if not products:
+                stale = [self.shard_path(index, split) for split in ('train', 'val')
+                         if os.path.exists(self.shard_path(index, split))]
+                if key not in shards and not stale:
+                    continue  # shard ว่างที่ไม่เคยมีไฟล์
+                # ไม่มีสินค้าเหลือใน shard นี้แล้ว
+                for path in stale:
+                    os.remove(path)
+                shards.pop(key, None)
+                removed += 1
+            else:
+                shards[key] = self._write_shard(index, products)
+                written += 1
+            # บันทึก manifest หลังทุก shard (ถ้าถูกขัดจังหวะ ครั้งถัดไปทำต่อจาก shard ที่ค้าง)
+            self._save_manifest()
+
+        if not os.path.exists(self.manifest_path):
+            self._save_manifest()
+        summary = {
+            'shards_total': len(shards),
+            'shards_written': written,
+            'shards_removed': removed,
+            'images': sum(s['images'] for s in shards.values()),
+            'skipped': sum(s['skipped'] for s in shards.values()),
+        }
+        print(f"TFRecord: เขียนใหม่ {written} shard, ลบ {removed} shard (ทั้งหมด {len(shards)} shard), "
+              f"รูปทั้งหมด {summary['images']} รูป")
+        return summary
+
+    def split_items(self, split, class_names):
+        """(paths, labels) ของชุด train หรือ val ตาม manifest (ข้ามสินค้าที่ไม่อยู่ใน class_names)"""
+        class_index = {barcode: i for i, barcode in enumerate(class_names)}
+        paths = []
+        labels = []
+        for key in sorted(self.manifest['shards'], key=int):
+            for barcode, entry in self.manifest['shards'][key]['products'].items():
+                if barcode in class_index:
+                    paths.extend(entry[split])
+                    labels.extend([class_index[barcode]] * len(entry[split]))
+        return paths, np.array(labels, dtype=np.int64)
+
+    def shard_files(self, split):
+        return [self.shard_path(int(key), split) for key in sorted(self.manifest['shards'], key=int)]
+
+    def make_dataset(self, split, class_names, training=False, seed=42, cycle_length=16):
+        """อ่าน shard แบบ parallel interleave แล้ว decode และ map บาร์โค้ดเป็น label
+
+        ผลลัพธ์เป็น (image float32 [-1, 1], label) ยังไม่ batch รูปของสินค้าที่ไม่อยู่ใน class_names ถูกข้าม
+        """
+        files = self.shard_files(split)
+        table = tf.lookup.StaticHashTable(
+            tf.lookup.KeyValueTensorInitializer(
+                tf.constant(class_names, dtype=tf.string),
+                tf.range(len(class_names), dtype=tf.int64)
+            ),
+            default_value=-1
+        )
+        img_size = tuple(self.manifest['img_size'])
+        image_format = self.manifest['format']
+        feature_spec = {
+            'image': tf.io.FixedLenFeature([], tf.string),
+            'barcode': tf.io.FixedLenFeature([], tf.string),
+        }
+
+        def _parse(record):
+            features = tf.io.parse_single_example(record, feature_spec)
+            if image_format == 'raw':
+                img = tf.reshape(tf.io.decode_raw(features['image'], tf.uint8), (*img_size, 3))
+            else:
+                img = tf.io.decode_jpeg(features['image'], channels=3)
+                img.set_shape((*img_size, 3))
+            img = preprocess_input(tf.cast(img, tf.float32))
+            return img, table.lookup(features['barcode'])
+
+        dataset = tf.data.Dataset.from_tensor_slices(files)
+        if training:
+            dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.interleave(
+            tf.data.TFRecordDataset,
+            cycle_length=min(cycle_length, max(1, len(files))),
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=not training,
+        )
+        if training:
+            # รูปใน shard เรียงตามสินค้า จึงต้อง shuffle หลัง interleave
+            dataset = dataset.shuffle(4096, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(_parse, num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.filter(lambda img, label: label >= 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="export แคตตาล็อกเป็นไฟล์ TFRecord แบบแบ่ง shard")
+    parser.add_argument('--num-shards', type=int, default=64)
+    parser.add_argument('--format', choices=['jpeg', 'raw'], default='jpeg',
+                        help="jpeg (ไฟล์เล็ก) หรือ raw (uint8 ไม่ต้อง decode ตอนอ่าน ไฟล์ใหญ่กว่า)")
+    parser.add_argument('--quality', type=int, default=95, help="คุณภาพ JPEG")
+    parser.add_argument('--img-size', type=int, default=224)
+    parser.add_argument('--data-dir', default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        from src.model_trainer import ProductClassifierTrainer
+    except ImportError:  # รันโดยตรงด้วย python src/tfrecord_export.py
+        from model_trainer import ProductClassifierTrainer
+
+    trainer = ProductClassifierTrainer(data_dir=args.data_dir, img_size=args.img_size)
+    exporter = TFRecordExporter(trainer, args.num_shards, args.format, args.quality)
+    exporter.export()
+
+
+if __name__ == "__main__":
+    main()
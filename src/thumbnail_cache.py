@@ -0,0 +1,144 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+try:
+    from src.image_store import file_sha256
+except ImportError:  # รันโดยตรงจากโฟลเดอร์ src
+    from image_store import file_sha256
+
+
+class ThumbnailCache:
+    """แคชภาพย่อ (thumbnail) บนดิสก์ ใช้ hash ของเนื้อไฟล์เป็น key
+
+    รูปเดียวกันที่อยู่คนละ path (เช่น รูปที่เลือกมาและรูปที่คัดลอกเข้า data/ แล้ว)
+    ใช้ภาพย่อร่วมกัน hash ของแต่ละ path ถูกจำไว้พร้อมขนาดไฟล์และ mtime
+    จึงไม่ต้องอ่านไฟล์ทั้งไฟล์ซ้ำถ้าไฟล์ไม่เปลี่ยนแปลง
+    การ decode ทำบน thread pool ผ่าน request() ซึ่งไม่บล็อก UI
+    """
+
+    MEMORY_ITEMS = 256  # จำนวนภาพย่อที่เก็บไว้ในหน่วยความจำ (LRU)
+    FLUSH_EVERY = 64  # บันทึก hashes.json ทุก ๆ กี่ hash ใหม่ (ไม่รอถึงตอนปิดโปรแกรม ถ้าโปรแกรมล่มจะเสียไม่เกินนี้)
+
+    def __init__(self, cache_dir, size=(120, 120), workers=4):
+        self.cache_dir = cache_dir
+        self.size = tuple(size)
+        self.hashes_path = os.path.join(cache_dir, "hashes.json")
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # ให้การเขียน hashes.json เป็นลำดับ (snapshot ใหม่ไม่ถูกของเก่าทับ)
+        self._memory = OrderedDict()
+        self._pending = 0  # จำนวน hash ใหม่ที่ยังไม่บันทึก
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.hashes = {}
+        if os.path.exists(self.hashes_path):
+            try:
+                with open(self.hashes_path, 'r', encoding='utf-8') as f:
+                    self.hashes = json.load(f)
+            except Exception as e:
+                print(f"ไม่สามารถอ่าน index ของแคชภาพย่อ: {e}")
+
+    def flush(self):
+        """บันทึก hash ของไฟล์ที่คำนวณแล้วลงดิสก์แบบ atomic"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                hashes = dict(self.hashes)
+                self._pending = 0
+            tmp_path = f"{self.hashes_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(hashes, f, ensure_ascii=False)
+            os.replace(tmp_path, self.hashes_path)
+
+    def close(self):
+        """ยกเลิกงานที่ยังไม่เริ่มและบันทึก index"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.flush()
+
+    def file_hash(self, img_path):
+        """sha256 ของเนื้อไฟล์ (ใช้ค่าที่จำไว้ถ้าขนาดไฟล์และ mtime ไม่เปลี่ยน)"""
+        key = os.path.abspath(img_path)
+        st = os.stat(img_path)
+        with self._lock:
+            entry = self.hashes.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        file_hash = file_sha256(img_path)
+
+        with self._lock:
+            self.hashes[key] = [st.st_size, st.st_mtime_ns, file_hash]
+            self._pending += 1
+            flush = self._pending >= self.FLUSH_EVERY
+        if flush:
+            # เรียกจาก worker thread ของ request() จึงไม่บล็อก UI
+            self.flush()
+        return file_hash
+
+    def _thumbnail_path(self, file_hash):
+        return os.path.join(
+            self.cache_dir, file_hash[:2], f"{file_hash}_{self.size[0]}x{self.size[1]}.jpg"
+        )
+
+    def _remember(self, file_hash, image):
+        with self._lock:
+            self._memory[file_hash] = image
+            self._memory.move_to_end(file_hash)
+            while len(self._memory) > self.MEMORY_ITEMS:
+                self._memory.popitem(last=False)
+
+    def get(self, img_path):
+        """คืนค่าภาพย่อ (PIL Image) ของรูป สร้างและเก็บลงแคชถ้ายังไม่มี"""
+        file_hash = self.file_hash(img_path)
+        with self._lock:
+            image = self._memory.get(file_hash)
+        if image is not None:
+            return image
+
+        thumb_path = self._thumbnail_path(file_hash)
+        if os.path.exists(thumb_path):
+            try:
+                image = Image.open(thumb_path)
+                image.load()
+            except Exception:
+                image = None
+
+        if image is None:
+            image = Image.open(img_path)
+            # ให้ JPEG decode ที่ความละเอียดต่ำตั้งแต่แรก (เร็วกว่า decode เต็มขนาดแล้วค่อยย่อมาก)
+            image.draft('RGB', self.size)
+            image = image.convert('RGB')
+            image.thumbnail(self.size)
+
+            thumb_dir = os.path.dirname(thumb_path)
+            if not os.path.exists(thumb_dir):
+                os.makedirs(thumb_dir, exist_ok=True)
+            tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, format='JPEG', quality=85)
+            os.replace(tmp_path, thumb_path)
+
+        self._remember(file_hash, image)
+        return image
+
+    def request(self, img_path, callback):
+        """สร้างภาพย่อบน thread pool แล้วเรียก callback(img_path, image, error) จาก worker thread
+
+        คืนค่า Future (เรียก cancel() ได้ถ้ารูปเลื่อนออกนอกจอก่อนเริ่มทำงาน)
+        """
+        def task():
+            try:
+                image = self.get(img_path)
+            except Exception as e:
+                callback(img_path, None, str(e))
+            else:
+                callback(img_path, image, None)
+
+        return self._executor.submit(task)